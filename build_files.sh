@@ -15,4 +15,12 @@ python3 manage.py collectstatic --noinput --clear
 echo "Running migrations..."
 python3 manage.py migrate --noinput
 
+# Create the cache table (only does something when CACHE_BACKEND=db)
+python3 manage.py createcachetable
+
+# Backfill the materialized journeys and rollups on first deploy
+echo "Building journeys and rollups..."
+python3 manage.py rebuild_journeys --if-empty
+python3 manage.py rebuild_rollups --if-empty
+
 echo "Build End"
@@ -8,6 +8,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
 from dashboard.models import TruckPerformanceData
+from dashboard.bulk_upsert import save_with_derived_metrics
 
 def calculate_missing_time_and_efficiency():
     """Calculate missing total time and efficiency values"""
@@ -20,7 +21,7 @@ def calculate_missing_time_and_efficiency():
     
     print(f"Found {records_to_update.count()} records needing time calculations")
     
-    updated_count = 0
+    calculated = []
     
     for record in records_to_update:
         try:
@@ -60,16 +61,14 @@ def calculate_missing_time_and_efficiency():
                 else:
                     record.efficiency_score = None  # Invalid efficiency
             
-            record.save()
-            updated_count += 1
-            
-            if updated_count % 100 == 0:
-                print(f"Updated {updated_count} records...")
+            calculated.append(record)
                 
         except Exception as e:
             print(f"Error updating record {record.load_number}: {e}")
             continue
     
+    # Write the estimates and the recalculated derived metrics in batches instead of one save() per record
+    updated_count = save_with_derived_metrics(calculated, fields=['total_time', 'efficiency_score'])
     print(f"Time and efficiency calculations completed. Updated {updated_count} records.")
     
     # Show statistics
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import CSVUpload, TruckPerformanceData, ProductivitySummary
+from .bulk_upsert import refresh_derived_data
+from .models import CSVUpload, ExportJob, Journey, TruckPerformanceData, ProductivitySummary, VehicleRegistration
 
 
 @admin.register(CSVUpload)
@@ -19,9 +20,51 @@ class TruckPerformanceDataAdmin(admin.ModelAdmin):
     ordering = ['-create_date']
     readonly_fields = ['created_at', 'updated_at', 'total_distance', 'total_time', 'efficiency_score']
 
+    # Edits reach the journeys, rollups and charts like uploads do
+    def save_model(self, request, obj, form, change):
+        previous = TruckPerformanceData.objects.filter(pk=obj.pk).values('load_number', 'create_date').first()
+        super().save_model(request, obj, form, change)
+        load_numbers, dates = {obj.load_number}, {obj.create_date}
+        if previous:
+            load_numbers.add(previous['load_number'])
+            dates.add(previous['create_date'])
+        refresh_derived_data(load_numbers, dates)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_derived_data({obj.load_number}, {obj.create_date})
+
+    def delete_queryset(self, request, queryset):
+        keys = list(queryset.values_list('load_number', 'create_date'))
+        super().delete_queryset(request, queryset)
+        refresh_derived_data({load_number for load_number, _ in keys}, {create_date for _, create_date in keys})
+
+
+@admin.register(Journey)
+class JourneyAdmin(admin.ModelAdmin):
+    list_display = ['load_number', 'truck_number', 'create_date', 'driver_name', 'customer_name', 'current_status', 'is_reportable']
+    list_filter = ['is_reportable', 'current_status', 'transporter']
+    search_fields = ['load_number', 'truck_number', 'driver_name', 'customer_name']
+    date_hierarchy = 'create_date'
+    readonly_fields = ['updated_at']
+
+
+@admin.register(VehicleRegistration)
+class VehicleRegistrationAdmin(admin.ModelAdmin):
+    list_display = ['driver_key', 'load_key', 'truck_number']
+    search_fields = ['driver_key', 'load_key', 'truck_number']
+    raw_id_fields = ['journey']
+
 
 @admin.register(ProductivitySummary)
 class ProductivitySummaryAdmin(admin.ModelAdmin):
     list_display = ['date_range_start', 'date_range_end', 'transporter', 'total_loads', 'avg_efficiency_score']
     list_filter = ['transporter', 'date_range_start']
     readonly_fields = ['created_at']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'rows_written', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['fingerprint', 'data_version', 'created_at', 'started_at', 'finished_at']
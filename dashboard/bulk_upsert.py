@@ -0,0 +1,209 @@
+"""
+Bulk upsert layer for TruckPerformanceData.
+
+Replaces one ``get_or_create``/``update_or_create`` plus ``save()`` per CSV row
+with one query to load the existing rows for a file's key set and a handful
+of batched writes.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .ingestion import PLACEHOLDER_VALUES
+from .metrics import DERIVED_FIELDS, apply_derived_metrics
+from .models import TruckPerformanceData
+from .rollups import refresh_rollups
+
+
+UNIQUE_KEY_FIELDS = ('load_number', 'create_date', 'truck_number')
+BATCH_SIZE = 500
+LOOKUP_CHUNK_SIZE = 900  # keeps IN (...) lists under SQLite's bound-parameter limit
+
+
+def is_real_value(value):
+    """The merge rule: only overwrite with real data, never with 'Unknown …' placeholders."""
+    return bool(value) and str(value) not in PLACEHOLDER_VALUES
+
+
+def _key(data, fields):
+    """Match key of a record dict."""
+    return tuple(data.get(field) for field in fields)
+
+
+def _dedupe_records(records, match_fields, merge):
+    """Collapse rows sharing a key within one file the same way sequential row writes would."""
+    deduped = {}
+    for data in records:
+        key = _key(data, match_fields)
+        if key not in deduped:
+            deduped[key] = dict(data)
+        elif merge:
+            deduped[key].update({field: value for field, value in data.items() if is_real_value(value)})
+        else:
+            deduped[key].update(data)
+    return deduped
+
+
+def load_existing_records(keys, match_fields):
+    """Fetch every existing row whose match key appears in ``keys``, keyed by that match key."""
+    load_numbers = sorted({key[match_fields.index('load_number')] for key in keys})
+    existing = {}
+    for start in range(0, len(load_numbers), LOOKUP_CHUNK_SIZE):
+        chunk = load_numbers[start:start + LOOKUP_CHUNK_SIZE]
+        for obj in TruckPerformanceData.objects.filter(load_number__in=chunk).order_by('id'):
+            key = tuple(getattr(obj, field) for field in match_fields)
+            if key in keys:
+                # Several rows can share a partial key; keep the oldest, as .get() would have matched one
+                existing.setdefault(key, obj)
+    return existing
+
+
+def _supports_upsert(match_fields):
+    """True when the whole write can be a single INSERT ... ON CONFLICT DO UPDATE per batch."""
+    return (
+        tuple(match_fields) == UNIQUE_KEY_FIELDS
+        and connection.vendor != 'sqlite'
+        and connection.features.supports_update_conflicts_with_target
+    )
+
+
+def batched_update(objs, field_names, batch_size=BATCH_SIZE):
+    """
+    Write loaded rows back by primary key with one prepared UPDATE run through executemany.
+
+    Used where INSERT ... ON CONFLICT is not available for the key (SQLite, partial match keys);
+    unlike QuerySet.bulk_update it does not build a CASE expression per field and row.
+    """
+    meta = TruckPerformanceData._meta
+    fields = [meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        quote(meta.db_table),
+        ', '.join('%s = %%s' % quote(field.column) for field in fields),
+        quote(meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+                for obj in objs[start:start + batch_size]
+            ])
+
+
+def bulk_upsert_performance_data(records, csv_upload=None, match_fields=UNIQUE_KEY_FIELDS,
+                                 merge=True, protected_fields=None, batch_size=BATCH_SIZE, previous_dates=None):
+    """
+    Insert or update TruckPerformanceData rows for one uploaded file.
+
+    records: field dicts as produced by ``ingestion.frame_to_records``.
+    match_fields: fields used to find an existing row (the model's unique key by default).
+    merge: when True existing rows are only overwritten with real (non-placeholder) values,
+        as ``process_customer_timestamps`` did; when False every supplied field is written,
+        as ``update_or_create`` did.
+    protected_fields: fields never overwritten on an existing row (defaults to the match fields).
+    previous_dates: a set that receives the old create_date of every existing row the write
+        moved to another date, so the rollups of the date it left can be refreshed too.
+
+    Returns (created_count, updated_count).
+    """
+    match_fields = tuple(match_fields)
+    protected = set(match_fields if protected_fields is None else protected_fields)
+    if csv_upload is not None:
+        records = [dict(data, csv_upload=csv_upload) for data in records]
+    deduped = _dedupe_records(records, match_fields, merge)
+    if not deduped:
+        return 0, 0
+
+    written_fields = {field for data in deduped.values() for field in data}
+    update_fields = sorted((written_fields | set(DERIVED_FIELDS) | {'updated_at'}) - protected - {'id', 'created_at'})
+
+    with transaction.atomic():
+        existing = load_existing_records(set(deduped), match_fields)
+        now = timezone.now()
+        to_create, to_update = [], []
+        for key, data in deduped.items():
+            obj = existing.get(key)
+            if obj is None:
+                obj = TruckPerformanceData(**data)
+                to_create.append(obj)
+            else:
+                old_date = obj.create_date
+                for field, value in data.items():
+                    if field in protected:
+                        continue
+                    if not merge or is_real_value(value):
+                        setattr(obj, field, value)
+                if previous_dates is not None and obj.create_date != old_date:
+                    previous_dates.add(old_date)
+                obj.updated_at = now
+                to_update.append(obj)
+
+        apply_derived_metrics(to_create + to_update, now=now)
+
+        if _supports_upsert(match_fields):
+            rows = to_create + [_detached_copy(obj) for obj in to_update]
+            TruckPerformanceData.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=list(UNIQUE_KEY_FIELDS),
+                update_fields=[field for field in update_fields if field not in UNIQUE_KEY_FIELDS],
+            )
+        else:
+            TruckPerformanceData.objects.bulk_create(to_create, batch_size=batch_size)
+            batched_update(to_update, update_fields, batch_size=batch_size)
+
+    return len(to_create), len(to_update)
+
+
+def _detached_copy(obj):
+    """Copy of a loaded row without its primary key so it can go through the ON CONFLICT path."""
+    values = {
+        field.attname: getattr(obj, field.attname)
+        for field in TruckPerformanceData._meta.concrete_fields
+        if not field.primary_key
+    }
+    return TruckPerformanceData(**values)
+
+
+def save_with_derived_metrics(objs, fields=(), batch_size=BATCH_SIZE, now=None, reset_deltas=True):
+    """
+    Recalculate the derived metrics of loaded rows in one vectorized pass and write
+    them back in batches, instead of calling save() on every object.
+
+    The journeys of the rows' loads, the rollup buckets of their dates and the data
+    version are refreshed (see ``refresh_derived_data``), so the dashboard, charts and
+    exports do not keep the old values.
+
+    fields: any other fields the caller changed on the objects.
+    now: the time statuses are derived at and stored as ``updated_at`` (default: the current time).
+    reset_deltas: see ``cache.bump_data_version``; callers writing small batches in id order
+        can keep the tracking pollers on deltas.
+    """
+    if not objs:
+        return 0
+    now = now or timezone.now()
+    apply_derived_metrics(objs, now=now)
+    for obj in objs:
+        obj.updated_at = now
+    with transaction.atomic():
+        batched_update(objs, sorted(set(fields) | set(DERIVED_FIELDS) | {'updated_at'}), batch_size=batch_size)
+        refresh_derived_data(
+            {obj.load_number for obj in objs}, {obj.create_date for obj in objs}, reset_deltas=reset_deltas,
+        )
+    return len(objs)
+
+
+def refresh_derived_data(load_numbers, dates, reset_deltas=True):
+    """
+    Bring the tables derived from TruckPerformanceData up to date after rows of
+    ``load_numbers`` on ``dates`` were written outside an upload: their journeys
+    (and vehicle registrations), the rollup buckets of the dates and the data version.
+    """
+    # journeys imports the batch sizes of this module
+    from .journeys import refresh_journeys
+
+    with transaction.atomic():
+        refresh_journeys(load_numbers)
+        refresh_rollups(dates)
+        bump_data_version(reset_deltas=reset_deltas)
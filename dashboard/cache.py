@@ -0,0 +1,68 @@
+"""
+Fragment cache for expensive dashboard output (the Plotly chart HTML).
+
+Entries are keyed by a data version token that ``bump_data_version`` replaces
+whenever the underlying data changes (an upload is processed, all data is
+cleared), so stale fragments are never served and need no explicit deletion.
+The fragments live in whatever ``CACHES['default']`` is configured to be, but
+the token itself is a DataVersion row: a bump made by another worker or by
+``manage.py run_upload_jobs`` must reach every process, which a per-process
+(locmem) cache would not.
+
+The row also holds the delta version of the tracking cursors (``tracking``):
+writes that can commit rows behind a cursor (uploads, clearing the data,
+bulk fixes in one long transaction) start one; writes that stamp their rows in
+id order in short transactions, like the fleet simulator, leave it alone.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DataVersion
+
+
+DATA_VERSION_ID = 1
+
+
+def _get_version(field):
+    versions = DataVersion.objects.filter(pk=DATA_VERSION_ID).values_list(field, flat=True)
+    version = versions.first()
+    if version is None:
+        bump_data_version()
+        version = versions.first()
+    return version
+
+
+def get_data_version():
+    """Current data version token; the first use starts a version."""
+    return _get_version('version')
+
+
+def get_delta_version():
+    """Current delta version token of the tracking cursors."""
+    return _get_version('delta_version')
+
+
+def bump_data_version(reset_deltas=True):
+    """
+    Start a new data version, invalidating every cached fragment.
+
+    reset_deltas: also start a new delta version, sending the tracking pollers a full snapshot.
+    """
+    version = uuid.uuid4().hex
+    defaults = {'version': version}
+    if reset_deltas:
+        defaults['delta_version'] = version
+    DataVersion.objects.update_or_create(pk=DATA_VERSION_ID, defaults=defaults)
+    return version
+
+
+def cached_fragment(name, builder, timeout=None):
+    """Return ``builder()`` cached under ``name`` for the current data version."""
+    key = f'dashboard:{name}:{get_data_version()}'
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = builder()
+        cache.set(key, fragment, timeout=timeout or settings.CHART_CACHE_TIMEOUT)
+    return fragment
@@ -0,0 +1,113 @@
+"""
+Datetime parsing for uploaded columns.
+
+``parse_datetime_column`` parses a whole column at once: repeated values are
+parsed only once (a column holds a handful of distinct dates across thousands
+of rows), the format is sniffed from a sample of the distinct values and applied
+to all of them in one vectorized ``pd.to_datetime`` call, and the result is
+converted to UTC a single time, so the values reach the database as aware
+datetimes without any per-value conversion.
+"""
+import warnings
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+
+# Tried (after the formats pandas guesses from the sample) when sniffing a column
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+]
+SNIFF_SAMPLE_SIZE = 50
+MISSING_TEXT = ['', 'nan', 'NaT', 'None', 'none']
+
+
+def _has_date(fmt):
+    """Time-only formats would pin every value to 1900-01-01; leave those to inference."""
+    return any(directive in fmt for directive in ('%d', '%m', '%Y', '%y', '%b', '%B'))
+
+
+def _parse(values, fmt):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return pd.to_datetime(values, errors='coerce', utc=True, format=fmt)
+
+
+def sniff_datetime_format(values, formats=None, exclude=()):
+    """
+    The format parsing the most of a sample of ``values`` (text), or None.
+
+    formats: the candidates, in order of preference; by default the formats pandas
+    guesses from the first values, then ``DATETIME_FORMATS``.
+    """
+    sample = values.head(SNIFF_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    if formats is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            guessed = [guess_datetime_format(value) for value in sample.head(3)]
+        formats = [fmt for fmt in guessed if fmt] + DATETIME_FORMATS
+    best, best_count = None, 0
+    for fmt in dict.fromkeys(formats):
+        if fmt in exclude or not _has_date(fmt):
+            continue
+        count = int(_parse(sample, fmt).notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best
+
+
+def _parse_distinct(values, format=None, formats=None):
+    """Parse distinct values: sniffed formats first, then per-value inference for the rest."""
+    text = values.astype(str)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    pending = ~text.isin(MISSING_TEXT)
+    tried = set()
+    fmt = format or sniff_datetime_format(text[pending], formats)
+    while fmt and pending.any():
+        tried.add(fmt)
+        result = _parse(text[pending], fmt)
+        matched = result.index[result.notna()]
+        parsed.loc[matched] = result.loc[matched]
+        pending.loc[matched] = False
+        # Columns mixing formats: sniff again among the values still unparsed
+        fmt = sniff_datetime_format(text[pending], formats, exclude=tried) if pending.any() else None
+    if pending.any():
+        parsed.loc[pending] = _parse(text[pending], 'mixed')
+    return parsed
+
+
+def parse_datetime_column(series, format=None, formats=None):
+    """
+    Parse a whole column to UTC timestamps (datetime64[ns, UTC]).
+
+    format: the format to try first instead of sniffing one; formats: the
+    candidates to sniff from (see ``sniff_datetime_format``). Naive values are UTC.
+    Values no candidate format matches are inferred individually, so mixed-format
+    exports still resolve; values that cannot be parsed become NaT.
+    """
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert('UTC')
+    if pd.api.types.is_datetime64_dtype(series):
+        return series.dt.tz_localize('UTC')
+    codes, distinct = pd.factorize(series)
+    parsed = _parse_distinct(pd.Series(distinct, dtype=object), format, formats)
+    # Missing values have code -1, which take() fills with NaT
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=series.index)
+
+
+def to_datetime_value(value):
+    """Python datetime of a parsed value, None for NaT."""
+    return None if pd.isna(value) else value.to_pydatetime()
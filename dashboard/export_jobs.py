@@ -0,0 +1,205 @@
+"""
+Background export jobs.
+
+``request_export`` records an ExportJob and hands it to a worker; the worker
+builds the file into a temporary spool, saves it to the default storage and
+keeps ``progress`` up to date for the status endpoint. Requests for the same
+kind, filters and data version reuse the job (and file) that already exists.
+
+Workers are selected with ``settings.EXPORT_JOB_RUNNER``:
+``'thread'`` runs jobs on a small in-process thread pool; ``'queue'`` only
+enqueues them in the database for ``manage.py run_export_jobs`` to pick up,
+which suits hosts that freeze the process once the response is sent, provided
+the default storage is shared by the worker and the web processes; ``'off'``
+disables background exports, for hosts where neither works (the reports page
+then links to the direct downloads).
+"""
+import csv
+import datetime
+import hashlib
+import io
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .cache import get_data_version
+from .models import CSVUpload, ExportJob, TruckPerformanceData
+
+
+PROGRESS_STEP = 500  # CSV rows between progress updates
+_executor = None
+
+
+def background_exports_enabled():
+    """False when ``settings.EXPORT_JOB_RUNNER`` is 'off'."""
+    return getattr(settings, 'EXPORT_JOB_RUNNER', 'thread') != 'off'
+
+
+def export_fingerprint(kind, params, data_version):
+    """Stable hash identifying an export of ``kind`` with ``params`` at ``data_version``."""
+    payload = json.dumps([kind, params, data_version], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_export(kind, params=None):
+    """
+    Return the job for this export, creating and dispatching it if needed.
+
+    A completed job with its file still in storage, or a queued/running one, for
+    the same fingerprint is returned as is; failed jobs are retried with a new job.
+    """
+    params = params or {}
+    data_version = get_data_version()
+    fingerprint = export_fingerprint(kind, params, data_version)
+    for job in ExportJob.objects.filter(fingerprint=fingerprint).exclude(status='failed'):
+        if job.status == 'completed':
+            if job.file and job.file.storage.exists(job.file.name):
+                return job
+        elif not _is_stale(job):
+            return job
+
+    job = ExportJob.objects.create(kind=kind, params=params, data_version=data_version, fingerprint=fingerprint)
+    if getattr(settings, 'EXPORT_JOB_RUNNER', 'thread') == 'thread':
+        _get_executor().submit(_run_in_thread, job.pk)
+    return job
+
+
+def _is_stale(job):
+    """Unfinished jobs past the timeout belong to a worker that died; they are not reused."""
+    timeout = datetime.timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 30 * 60))
+    return (job.started_at or job.created_at) < timezone.now() - timeout
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2), thread_name_prefix='export-job',
+        )
+    return _executor
+
+
+def _run_in_thread(job_id):
+    """Thread entry point: worker threads need their own database connections."""
+    close_old_connections()
+    try:
+        run_export_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running; False if another worker got it first."""
+    return ExportJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(),
+    ) == 1
+
+
+def run_export_job(job_id):
+    """Build the file of a queued job. Returns True when it completed."""
+    if not claim_job(job_id):
+        return False
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        builder = EXPORT_BUILDERS[job.kind]
+        with tempfile.TemporaryFile() as spool:
+            filename = builder(job, spool)
+            spool.seek(0)
+            job.file.save(f'{job.pk}_{filename}', File(spool), save=False)
+        job.status = 'completed'
+        job.progress = 100
+    except Exception as err:
+        print(f"Error running export job {job_id}: {str(err)}")
+        job.status = 'failed'
+        job.error = str(err)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'progress', 'error', 'finished_at', 'rows_written', 'total_rows'])
+    return job.status == 'completed'
+
+
+def _progress_callback(job):
+    """Callable recording ``rows_written`` and the matching percentage on ``job``."""
+    def progress(rows_written):
+        job.rows_written = rows_written
+        if job.total_rows:
+            # Stay below 100 until the file is actually stored
+            job.progress = min(99, rows_written * 100 // job.total_rows)
+        ExportJob.objects.filter(pk=job.pk).update(rows_written=job.rows_written, progress=job.progress)
+    return progress
+
+
+def build_excel_export(job, spool):
+    """Full Excel productivity report (same content as ``export_excel_report``)."""
+    from .export_utils import write_export_workbook
+
+    data = TruckPerformanceData.objects.all().order_by('create_date', 'load_number')
+    job.total_rows = data.count()
+    job.rows_written = write_export_workbook(data, spool, progress=_progress_callback(job))
+    return f"Truck_Productivity_Report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+
+def build_upload_csv_export(job, spool):
+    """CSV report of one processed upload (same content as ``download_report``)."""
+    from .views import report_rows, upload_report_queryset
+
+    upload = CSVUpload.objects.get(pk=job.params['upload_id'], processed=True)
+    data_qs = upload_report_queryset(upload)
+    job.total_rows = data_qs.count()
+    progress = _progress_callback(job)
+
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    rows = report_rows(data_qs)
+    writer.writerow(next(rows))
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        if written % PROGRESS_STEP == 0:
+            progress(written)
+    job.rows_written = written
+    text.flush()
+    text.detach()
+    return f"report_{upload.name.replace(' ', '_')}.csv"
+
+
+def build_summary_export(job, spool):
+    """Five-sheet summary report (executive, detailed, transporter, customer and driver sheets)."""
+    from .report_builder import write_summary_report
+
+    job.rows_written = job.total_rows = write_summary_report(spool)
+    return f"Truck_Productivity_Summary_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+
+EXPORT_BUILDERS = {
+    'excel': build_excel_export,
+    'upload_csv': build_upload_csv_export,
+    'summary': build_summary_export,
+}
+
+
+def run_queued_jobs(limit=None):
+    """Run queued jobs oldest first (the DB-backed queue). Returns how many completed."""
+    completed = 0
+    queued = ExportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)
+    for job_id in list(queued[:limit] if limit else queued):
+        if run_export_job(job_id):
+            completed += 1
+    return completed
+
+
+def purge_old_jobs(days):
+    """Delete finished jobs older than ``days`` together with their files."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    purged = 0
+    for job in ExportJob.objects.filter(status__in=['completed', 'failed'], created_at__lt=cutoff):
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        purged += 1
+    return purged
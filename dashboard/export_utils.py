@@ -10,14 +10,145 @@ def to_naive(dt):
     elif isinstance(dt, datetime.date):
         return dt.strftime('%Y-%m-%d')
     return str(dt)
-from django.http import HttpResponse
+import itertools
+import os
+import tempfile
+from typing import Any
+
+import pandas as pd
+
+from django.http import FileResponse
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils import timezone
 from openpyxl import Workbook
-from openpyxl.styles import Font
-from .models import TruckPerformanceData
-from typing import Any
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from .models import Journey, TruckPerformanceData
+from .vehicles import annotate_vehicle_reg
+
+# Parquet/Feather snapshots need pyarrow, which is optional (pip install pyarrow)
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = feather = pq = None
+
+EXPORT_CHUNK_SIZE = 2000
+# Column widths are sized from the header and this many leading rows, since a
+# write-only sheet needs them before the first row is written
+WIDTH_SAMPLE_ROWS = 1000
+
+HEADER_NAMES = [
+    'Create Date', 'Month Name', 'Transporter', 'Load Number', 'Mode Of Capture', 'Driver Name', 'Vehicle Reg', 'Customer Name',
+    'Vol Hl', 'Invoice Number', 'Mwarehouse', 'Budgeted Kms', 'PlannedDistanceToCustomer', 'Actual Km', 'Km Deviation', 'Comment', 'Clockin Time',
+    'Planned Departure Time', 'Dj Departure Time', 'Departure Deviation Min', 'Ave Departure', 'Comment Ave Departure',
+    'Arrival At Customer', 'Departure Time From Customer', 'Service Time At Customer', 'Comment Tat', 'Arrival At Depot',
+    'Clock Out', 'Ave Arrival Time', 'Comment Ave Arrival Time', 'Actual Days In Route', 'Bud Days In Route',
+    'Days In Route Deviation', 'Total Hour Route', 'Driver Rest Hours In Route', 'Total Wh', 'Tlp',
+    'D1', 'D2', 'D3', 'D4', 'Comment Ave Tir'
+]
+
+
+def build_export_row(item):
+    """One export row for a TruckPerformanceData instance annotated by ``annotate_vehicle_reg``."""
+    # Vehicle Reg resolved by (driver_name, load_number), then driver only, then load only, then fallback
+    truck_number = (
+        item.vehicle_reg
+        or (item.truck_number if item.truck_number and str(item.truck_number).strip().lower() != 'unknown' else '')
+    )
+
+    return [
+        item.create_date.strftime('%Y-%m-%d') if item.create_date else '',
+        item.month_name or '',
+        item.transporter or '',
+        item.load_number or '',
+        item.mode_of_capture or '',
+        item.driver_name or '',
+        truck_number or item.truck_number or '',
+        item.customer_name or '',
+        item.tlp_vol_hl or '',  # Vol Hl mapped
+        item.load_number or '',  # Invoice Number uses load_number
+        'OM',  # Mwarehouse set to OM
+        item.budgeted_kms or '',
+        getattr(item, 'PlannedDistanceToCustomer', None) or '',
+        '',  # Actual Km (not mapped in model)
+        item.km_deviation or '',
+        getattr(item, 'comment', '') or '',
+        to_naive(item.clockin_time) if item.clockin_time else '',
+        to_naive(item.planned_departure_time) if item.planned_departure_time else '',
+        to_naive(item.dj_departure_time) if item.dj_departure_time else '',
+        item.departure_deviation_min or '',
+        item.ave_departure or '',
+        '',
+        to_naive(item.arrival_at_customer) if item.arrival_at_customer else '',
+        to_naive(item.departure_time_from_customer) if item.departure_time_from_customer else '',
+        item.service_time_at_customer or '',
+        '',
+        to_naive(item.arrival_at_depot) if item.arrival_at_depot else '',
+        to_naive(item.clock_out) if item.clock_out else '',
+        item.ave_arrival_time or '',
+        '',
+        item.actual_days_in_route or '',
+        item.bud_days_in_route or '',
+        item.days_in_route_deviation or '',
+        item.total_hour_route or '',
+        item.driver_rest_hours_in_route or '',
+        item.total_wh or '',
+        item.tlp_vol_hl or '',
+        item.D1 or '',
+        item.D2 or '',
+        item.D3 or '',
+        item.D4 or '',
+        '',
+    ]
+
+
+def write_export_workbook(data, fileobj, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Write the export workbook for ``data`` to ``fileobj`` in openpyxl write-only mode.
+
+    Rows are fetched with ``.iterator()`` and appended as they arrive, so memory use
+    does not grow with the number of rows. ``progress(rows_written)`` is called after
+    every ``chunk_size`` rows. Returns the number of data rows written.
+    """
+    rows = (build_export_row(item) for item in annotate_vehicle_reg(data).iterator(chunk_size=chunk_size))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Truck Productivity Data')
+
+    # Auto-adjust column widths from the header and a leading sample of rows
+    sample = []
+    for row in rows:
+        sample.append(row)
+        if len(sample) >= WIDTH_SAMPLE_ROWS:
+            break
+    for index, column in enumerate(zip(HEADER_NAMES, *sample), 1):
+        length = max(len(str(value)) for value in column)
+        ws.column_dimensions[get_column_letter(index)].width = length + 2
+
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="FFD966", end_color="FFD966", fill_type="solid")
+    header = []
+    for name in HEADER_NAMES:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = header_font
+        cell.fill = header_fill
+        header.append(cell)
+    ws.append(header)
+
+    written = 0
+    for row in itertools.chain(sample, rows):
+        ws.append(row)
+        written += 1
+        if progress and written % chunk_size == 0:
+            progress(written)
+
+    wb.save(fileobj)
+    return written
+
 
 def export_excel_report(request) -> Any:
     """
@@ -29,108 +160,159 @@ def export_excel_report(request) -> Any:
         messages.error(request, 'No data available to export. Please upload and process CSV files first.')
         return redirect('dashboard:bulk_upload')
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Truck Productivity Data'
-
-    header_names = [
-        'Create Date', 'Month Name', 'Transporter', 'Load Number', 'Mode Of Capture', 'Driver Name', 'Vehicle Reg', 'Customer Name',
-        'Vol Hl', 'Invoice Number', 'Mwarehouse', 'Budgeted Kms', 'PlannedDistanceToCustomer', 'Actual Km', 'Km Deviation', 'Comment', 'Clockin Time',
-        'Planned Departure Time', 'Dj Departure Time', 'Departure Deviation Min', 'Ave Departure', 'Comment Ave Departure',
-        'Arrival At Customer', 'Departure Time From Customer', 'Service Time At Customer', 'Comment Tat', 'Arrival At Depot',
-        'Clock Out', 'Ave Arrival Time', 'Comment Ave Arrival Time', 'Actual Days In Route', 'Bud Days In Route',
-        'Days In Route Deviation', 'Total Hour Route', 'Driver Rest Hours In Route', 'Total Wh', 'Tlp',
-        'D1', 'D2', 'D3', 'D4', 'Comment Ave Tir'
-    ]
-    from openpyxl.styles import PatternFill
-    ws.append(header_names)
-    header_fill = PatternFill(start_color="FFD966", end_color="FFD966", fill_type="solid")
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-        cell.fill = header_fill
+    # Spool the workbook to a temporary file and stream it from there; the file is
+    # removed when the response closes it
+    spool = tempfile.TemporaryFile(suffix='.xlsx')
+    write_export_workbook(data, spool)
+    spool.seek(0)
 
-    # Build robust mapping from (driver_name, load_number) to truck_number from depot_departures
-    depot_departures = TruckPerformanceData.objects.filter(csv_upload__upload_type='depot_departures')
-    mapping = {}
-    for dep in depot_departures:
-        driver = dep.driver_name.strip().lower() if dep.driver_name else ''
-        load = dep.load_number.strip().lower() if dep.load_number else ''
-        truck = dep.truck_number.strip() if dep.truck_number else ''
-        if driver and load and truck and truck.lower() != 'unknown':
-            mapping[(driver, load)] = truck
-        # Also allow mapping by driver only if unique
-        if driver and truck and truck.lower() != 'unknown':
-            mapping[(driver, '')] = truck
-        if load and truck and truck.lower() != 'unknown':
-            mapping[('', load)] = truck
-
-    for item in data:
-        # Map Vehicle Reg using (driver_name, load_number)
-        driver = item.driver_name.strip().lower() if item.driver_name else ''
-        load = item.load_number.strip().lower() if item.load_number else ''
-        # Try full match, then driver only, then load only, then fallback
-        truck_number = (
-            mapping.get((driver, load))
-            or mapping.get((driver, ''))
-            or mapping.get(('', load))
-            or (item.truck_number if item.truck_number and str(item.truck_number).strip().lower() != 'unknown' else '')
-        )
-
-        row = [
-            item.create_date.strftime('%Y-%m-%d') if item.create_date else '',
-            item.month_name or '',
-            item.transporter or '',
-            item.load_number or '',
-            item.mode_of_capture or '',
-            item.driver_name or '',
-            truck_number or item.truck_number or '',
-            item.customer_name or '',
-            item.tlp_vol_hl or '',  # Vol Hl mapped
-            item.load_number or '',  # Invoice Number uses load_number
-            'OM',  # Mwarehouse set to OM
-            item.budgeted_kms or '',
-            getattr(item, 'PlannedDistanceToCustomer', None) or '',
-            '',  # Actual Km (not mapped in model)
-            item.km_deviation or '',
-            getattr(item, 'comment', '') or '',
-            to_naive(item.clockin_time) if item.clockin_time else '',
-            to_naive(item.planned_departure_time) if item.planned_departure_time else '',
-            to_naive(item.dj_departure_time) if item.dj_departure_time else '',
-            item.departure_deviation_min or '',
-            item.ave_departure or '',
-            '',
-            to_naive(item.arrival_at_customer) if item.arrival_at_customer else '',
-            to_naive(item.departure_time_from_customer) if item.departure_time_from_customer else '',
-            item.service_time_at_customer or '',
-            '',
-            to_naive(item.arrival_at_depot) if item.arrival_at_depot else '',
-            to_naive(item.clock_out) if item.clock_out else '',
-            item.ave_arrival_time or '',
-            '',
-            item.actual_days_in_route or '',
-            item.bud_days_in_route or '',
-            item.days_in_route_deviation or '',
-            item.total_hour_route or '',
-            item.driver_rest_hours_in_route or '',
-            item.total_wh or '',
-            item.tlp_vol_hl or '',
-            item.D1 or '',
-            item.D2 or '',
-            item.D3 or '',
-            item.D4 or '',
-            '',
-        ]
-        ws.append(row)
+    filename = f"Truck_Productivity_Report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return FileResponse(
+        spool,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_summary_report(request) -> Any:
+    """
+    Generate and return the five-sheet summary report directly, for servers without
+    background exports (see ``export_jobs.background_exports_enabled``).
+    """
+    from .report_builder import write_summary_report
 
-    # Auto-adjust column widths
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value)) for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = length + 2
+    if not TruckPerformanceData.objects.exists():
+        messages.error(request, 'No data available to export. Please upload and process CSV files first.')
+        return redirect('dashboard:bulk_upload')
+
+    spool = tempfile.TemporaryFile(suffix='.xlsx')
+    write_summary_report(spool)
+    spool.seek(0)
 
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    filename = f"Truck_Productivity_Summary_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return FileResponse(
+        spool,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    filename = f"Truck_Productivity_Report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+
+
+# Journey columns of the columnar snapshot; dtypes follow the model fields
+SNAPSHOT_FIELDS = [
+    'create_date', 'month_name', 'transporter', 'load_number', 'truck_number', 'driver_name', 'customer_name',
+    'mode_of_capture', 'clockin_time', 'planned_departure_time', 'dj_departure_time', 'departure_deviation_min',
+    'ave_departure', 'arrival_at_customer', 'departure_time_from_customer', 'service_time_at_customer',
+    'arrival_at_depot', 'ave_arrival_time', 'd1', 'd2', 'd3', 'd4', 'comment_ave_tir', 'current_status',
+    'total_distance', 'total_time', 'delivery_time', 'efficiency_score', 'days_spent', 'is_reportable',
+]
+SNAPSHOT_FORMATS = ['parquet', 'feather']
+
+
+def snapshot_available():
+    """Whether pyarrow is installed, which the columnar snapshots need."""
+    return pa is not None
+
+
+def _typed_snapshot_frame(rows):
+    """DataFrame of snapshot ``rows`` with datetime, float and nullable integer columns."""
+    frame = pd.DataFrame.from_records(rows, columns=SNAPSHOT_FIELDS)
+    for name in SNAPSHOT_FIELDS:
+        internal_type = Journey._meta.get_field(name).get_internal_type()
+        if internal_type == 'DateTimeField':
+            frame[name] = pd.to_datetime(frame[name], utc=True)
+        elif internal_type == 'DateField':
+            frame[name] = pd.to_datetime(frame[name])
+        elif internal_type == 'FloatField':
+            frame[name] = frame[name].astype('float64')
+        elif internal_type == 'IntegerField':
+            frame[name] = frame[name].astype('Int64')
+        elif internal_type == 'BooleanField':
+            frame[name] = frame[name].astype('bool')
+        else:
+            frame[name] = frame[name].astype('string')
+    frame['month'] = frame['create_date'].dt.strftime('%Y-%m')
+    return frame
+
+
+def monthly_snapshot_frames(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield ``(month, frame)`` for the merged journeys, one typed frame per 'YYYY-MM' month.
+
+    Rows are streamed in create_date order, so only one month is held in memory.
+    """
+    if queryset is None:
+        queryset = Journey.objects.all()
+    rows = (
+        queryset.order_by('create_date', 'load_number', 'truck_number')
+        .values_list(*SNAPSHOT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for month, month_rows in itertools.groupby(rows, key=lambda row: row[0].strftime('%Y-%m')):
+        yield month, _typed_snapshot_frame(list(month_rows))
+
+
+def _arrow_table(frame):
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def write_snapshot_parquet(fileobj, queryset=None):
+    """
+    Write the journeys to ``fileobj`` as one Parquet file with a row group per month.
+
+    Returns the number of rows written.
+    """
+    written = 0
+    writer = None
+    try:
+        for _month, frame in monthly_snapshot_frames(queryset):
+            table = _arrow_table(frame)
+            if writer is None:
+                writer = pq.ParquetWriter(fileobj, table.schema, compression='snappy')
+            writer.write_table(table.cast(writer.schema))
+            written += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def write_snapshot_dataset(directory, fmt='parquet', queryset=None):
+    """
+    Write a full snapshot of the journeys under ``directory``, partitioned by month
+    (``month=YYYY-MM/part-0.parquet`` or ``.feather``), which ``pandas.read_parquet``
+    and ``pyarrow.dataset`` read back as one typed table.
+
+    Returns the number of rows written.
+    """
+    written = 0
+    for month, frame in monthly_snapshot_frames(queryset):
+        partition = os.path.join(directory, f'month={month}')
+        os.makedirs(partition, exist_ok=True)
+        table = _arrow_table(frame.drop(columns='month'))
+        if fmt == 'feather':
+            feather.write_feather(table, os.path.join(partition, 'part-0.feather'))
+        else:
+            pq.write_table(table, os.path.join(partition, 'part-0.parquet'), compression='snappy')
+        written += len(frame)
+    return written
+
+
+def export_parquet_report(request) -> Any:
+    """
+    Return the merged journeys as a Parquet file (typed columns, one row group per month).
+    """
+    if not snapshot_available():
+        messages.error(request, 'Parquet export needs the pyarrow package, which is not installed on this server.')
+        return redirect('dashboard:reports')
+    if not Journey.objects.exists():
+        messages.error(request, 'No data available to export. Please upload and process CSV files first.')
+        return redirect('dashboard:bulk_upload')
+
+    spool = tempfile.TemporaryFile(suffix='.parquet')
+    write_snapshot_parquet(spool)
+    spool.seek(0)
+
+    filename = f"Truck_Productivity_Journeys_{timezone.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+    return FileResponse(spool, as_attachment=True, filename=filename, content_type='application/vnd.apache.parquet')
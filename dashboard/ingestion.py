@@ -0,0 +1,198 @@
+"""
+Columnar ingestion engine for uploaded CSV files.
+
+Each builder reads its upload type's columns through the schema registry
+(``schemas.SCHEMAS``), which resolves the header once per file and parses every
+datetime/numeric column in a single vectorized pass (see ``datetimes``), and
+returns a DataFrame whose columns are ``TruckPerformanceData`` field names,
+ready to persist.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from .schemas import SCHEMAS, read_columns
+
+
+PLACEHOLDER_VALUES = ['Unknown', 'Unknown Customer', 'Unknown Driver', 'Unknown Vehicle']
+
+
+def _schedule_frame(values, fields):
+    """Frame of ``fields`` taken from the schema ``values``, plus month_name from the schedule date."""
+    frame = pd.DataFrame({field: values[field] for field in fields})
+    frame.insert(0, 'month_name', values['schedule_date'].dt.strftime('%B'))
+    frame.insert(3, 'mode_of_capture', 'DJ')
+    return frame
+
+
+def _create_dates_from_month(month_names):
+    """Derive create_date as the first of the month in 2025, as the upload views always have."""
+    parsed = pd.to_datetime(month_names + ' 2025', format='%B %Y', errors='coerce')
+    return parsed.dt.date
+
+
+def _drop_missing_identifiers(frame):
+    """Drop rows where neither a load number nor a truck number could be resolved."""
+    return frame[~((frame['load_number'] == 'Unknown') & (frame['truck_number'] == 'Unknown'))]
+
+
+def driver_vehicle_map(df):
+    """Last usable vehicle reg of each driver in ``df``, as a Series indexed by stripped driver name."""
+    values = read_columns(df, 'depot_departures', ['driver_name', 'vehicle_reg'])
+    driver_key = values['driver_name'].str.strip()
+    vehicle_reg = values['vehicle_reg'].str.strip()
+    usable = (
+        (vehicle_reg != '') & (vehicle_reg.str.lower() != 'unknown')
+        & (driver_key != '') & ~driver_key.str.lower().isin(['nan', 'unknown'])
+    )
+    return (
+        pd.DataFrame({'driver': driver_key[usable], 'vehicle': vehicle_reg[usable]})
+        .drop_duplicates('driver', keep='last')
+        .set_index('driver')['vehicle']
+    )
+
+
+def build_depot_departures_frame(df, driver_vehicles=None):
+    """
+    File Type 1: Depot Departures Information.
+
+    driver_vehicles: driver → vehicle reg map of the whole file when ``df`` is one
+    chunk of it (see ``driver_vehicle_map``); defaults to the map of ``df`` itself.
+    """
+    values = read_columns(df, 'depot_departures')
+    frame = _schedule_frame(values, [
+        'transporter', 'load_number', 'driver_name', 'truck_number', 'dj_departure_time',
+        'departure_deviation_min', 'tlp_vol_hl', 'planned_arrival_time', 'planned_departure_time',
+    ])
+    frame.insert(6, 'customer_name', 'Unknown Customer')
+
+    # Attach the last known vehicle reg of each driver, as the row-wise mapping did
+    if driver_vehicles is None:
+        driver_vehicles = driver_vehicle_map(df)
+    mapped = values['driver_name'].str.strip().map(driver_vehicles)
+    frame['truck_number'] = mapped.where(mapped.notna(), frame['truck_number'])
+    frame['create_date'] = _create_dates_from_month(frame['month_name'])
+    return frame
+
+
+def build_customer_timestamps_frame(df):
+    """File Type 2: Customer Timestamps (time values are in minutes)."""
+    values = read_columns(df, 'customer_timestamps')
+    frame = _schedule_frame(values, [
+        'transporter', 'load_number', 'driver_name', 'truck_number', 'customer_name',
+        'arrival_at_customer', 'service_time_at_customer', 'ave_arrival_time', 'd1', 'd2',
+    ])
+    frame['create_date'] = _create_dates_from_month(frame['month_name'])
+    return frame
+
+
+def build_distance_info_frame(df):
+    """File Type 3: Distance Information."""
+    values = read_columns(df, 'distance_info')
+    frame = _schedule_frame(values, [
+        'transporter', 'load_number', 'driver_name', 'truck_number', 'customer_name',
+        'budgeted_kms', 'km_deviation', 'd1', 'd4',
+    ])
+    frame['create_date'] = _create_dates_from_month(frame['month_name'])
+    # Rows without a load number cannot be matched to a journey
+    return frame[frame['load_number'] != 'Unknown']
+
+
+def _build_dated_frame(df, upload_type, mode_of_capture='DJ'):
+    """Layout of the files whose rows carry their own date (today when missing)."""
+    values = read_columns(df, upload_type)
+    dates = values.pop('schedule_date').fillna(pd.Timestamp(datetime.now().date(), tz='UTC'))
+    frame = pd.DataFrame({
+        'create_date': dates.dt.date,
+        'month_name': dates.dt.strftime('%B'),
+        'transporter': values.pop('transporter'),
+        'load_number': values.pop('load_number'),
+        'mode_of_capture': mode_of_capture,
+    }, index=df.index)
+    for field, series in values.items():
+        frame[field] = series
+    return _drop_missing_identifiers(frame)
+
+
+def build_timestamps_duration_frame(df):
+    """File Type 4: Timestamps and Duration."""
+    return _build_dated_frame(df, 'timestamps_duration')
+
+
+def build_avg_time_route_frame(df):
+    """File Type 5: Average Time in Route (ave_arrival_time in minutes)."""
+    return _build_dated_frame(df, 'avg_time_route', mode_of_capture='Average Time')
+
+
+def build_time_route_info_frame(df):
+    """File Type 6: Time in Route Information."""
+    return _build_dated_frame(df, 'time_route_info')
+
+
+def build_generic_frame(df):
+    """Generic CSV file with best-effort field mapping."""
+    return _build_dated_frame(df, 'other')
+
+
+# Header names each upload type reads (matched case-insensitively by the streaming reader)
+UPLOAD_COLUMNS = {upload_type: schema.header_names() for upload_type, schema in SCHEMAS.items()}
+
+FRAME_BUILDERS = {
+    'depot_departures': build_depot_departures_frame,
+    'customer_timestamps': build_customer_timestamps_frame,
+    'distance_info': build_distance_info_frame,
+    'timestamps_duration': build_timestamps_duration_frame,
+    'avg_time_route': build_avg_time_route_frame,
+    'time_route_info': build_time_route_info_frame,
+}
+
+
+def build_upload_frame(df, upload_type, **options):
+    """Build the ready-to-persist frame of TruckPerformanceData field values for an upload (or a chunk of one)."""
+    builder = FRAME_BUILDERS.get(upload_type, build_generic_frame)
+    return builder(df, **options)
+
+
+MERGE_KEY = ['load_number', 'schedule_date']
+MERGE_FIELDS = [
+    'transporter', 'driver_name', 'truck_number', 'customer_name', 'dj_departure_time',
+    'arrival_at_depot', 'ave_arrival_time', 'd1', 'd2', 'd3', 'd4', 'comment_ave_tir',
+]
+
+
+def merge_upload_files(files):
+    """
+    Outer-join raw upload files of different types on load number and schedule date.
+
+    files: (upload_type, DataFrame) pairs, read through each type's schema. A field
+    several files carry takes its first real (non-placeholder) value in file order.
+    Returns one row per key with the MERGE_KEY and MERGE_FIELDS columns.
+    """
+    merged = pd.DataFrame(columns=MERGE_KEY)
+    for upload_type, df in files:
+        values = read_columns(df, upload_type)
+        part = pd.DataFrame({name: values[name] for name in MERGE_KEY + MERGE_FIELDS if name in values})
+        part = part.mask(part.isin(PLACEHOLDER_VALUES + ['nan']))
+        part['schedule_date'] = part['schedule_date'].dt.normalize()
+        part = part.dropna(subset=['load_number']).drop_duplicates(MERGE_KEY, keep='last')
+        merged = merged.merge(part, on=MERGE_KEY, how='outer', suffixes=('', '_next'))
+        for name in part.columns:
+            if f'{name}_next' in merged.columns:
+                merged[name] = merged[name].combine_first(merged.pop(f'{name}_next'))
+    for name in MERGE_FIELDS:
+        if name not in merged.columns:
+            merged[name] = None
+    return merged[MERGE_KEY + MERGE_FIELDS].reset_index(drop=True)
+
+
+def frame_to_records(frame):
+    """Convert a built frame into field dicts with Python values and None for missing data."""
+    columns = {}
+    for name in frame.columns:
+        series = frame[name]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = pd.Series(series.array.to_pydatetime(), index=series.index, dtype=object)
+        else:
+            values = series.astype(object)
+        columns[name] = values.where(series.notna(), None)
+    return pd.DataFrame(columns, index=frame.index).to_dict('records')
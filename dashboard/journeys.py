@@ -0,0 +1,155 @@
+"""
+Journey merge engine.
+
+A journey is a depot-departure row completed with the values the other upload
+types recorded for the same (load_number, truck_number). The merged journeys are
+materialized in the ``Journey`` table and refreshed per upload, so the dashboard
+and the exports read them with a plain indexed query.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .bulk_upsert import BATCH_SIZE, LOOKUP_CHUNK_SIZE
+from .metrics import PENDING
+from .models import Journey, TruckPerformanceData
+from .vehicles import refresh_vehicle_registrations, registration_keys
+
+
+MERGE_FIELDS = [
+    'arrival_at_customer', 'service_time_at_customer', 'ave_arrival_time',
+    'd1', 'd2', 'd3', 'd4', 'arrival_at_depot', 'customer_name',
+    'planned_departure_time', 'departure_deviation_min', 'ave_departure',
+    'comment_ave_tir', 'current_status', 'efficiency_score', 'total_distance',
+    'total_time', 'delivery_time', 'mode_of_capture', 'driver_name', 'truck_number',
+]
+# Journey columns copied from the merged depot departure
+JOURNEY_FIELDS = [
+    'load_number', 'truck_number', 'create_date', 'month_name', 'transporter', 'driver_name',
+    'customer_name', 'mode_of_capture', 'dj_departure_time', 'clockin_time', 'planned_departure_time',
+    'departure_deviation_min', 'ave_departure', 'arrival_at_customer', 'departure_time_from_customer',
+    'service_time_at_customer', 'arrival_at_depot', 'ave_arrival_time', 'd1', 'd2', 'd3', 'd4',
+    'comment_ave_tir', 'current_status', 'total_distance', 'total_time', 'delivery_time', 'efficiency_score',
+]
+PLACEHOLDER_STRINGS = ['None', 'Unknown', 'Unknown Customer', 'Unknown Driver', 'Unknown Vehicle', 'nan', '']
+
+
+def is_placeholder(value):
+    """True for empty values and the 'Unknown …'/'nan' placeholders written by the processors."""
+    return not value or str(value) in PLACEHOLDER_STRINGS
+
+
+def merge_journey_values(journey, related_values):
+    """Fill placeholder fields on ``journey`` from related rows, preferring the latest create_date first."""
+    for values in related_values:
+        for field in MERGE_FIELDS:
+            rel_val = values[field]
+            if is_placeholder(getattr(journey, field, None)) and not is_placeholder(rel_val):
+                setattr(journey, field, rel_val)
+    return journey
+
+
+def is_reportable_journey(journey):
+    """Filter out Unknown Driver/TRUCK_999 rows, Unknown Customer rows and pending departures."""
+    return not (
+        (journey.driver_name and journey.driver_name.strip() == 'Unknown Driver' and journey.truck_number and str(journey.truck_number).strip() == 'TRUCK_999') or
+        (journey.customer_name and journey.customer_name.strip() == 'Unknown Customer') or
+        journey.current_status == PENDING
+    )
+
+
+def build_journeys(depot_departures):
+    """
+    Merge every depot departure with the rows of the other upload types in one pass.
+
+    All candidate rows are fetched with a single ``values()`` query and grouped by
+    (load_number, truck_number) in memory, instead of one query per departure.
+    Returns the merged depot-departure instances, annotated with ``driver_vehicle``
+    and ``days_spent``, including the ones the dashboard hides.
+    """
+    bases = list(depot_departures)
+    load_numbers = {base.load_number for base in bases}
+
+    related_by_key = defaultdict(list)
+    if load_numbers:
+        candidates = (
+            TruckPerformanceData.objects
+            .filter(load_number__in=depot_departures.values('load_number'))
+            .order_by('-create_date')
+            .values('load_number', *[field for field in MERGE_FIELDS if field != 'load_number'])
+        )
+        for values in candidates:
+            related_by_key[(values['load_number'], values['truck_number'])].append(values)
+
+    journeys = []
+    for base in bases:
+        merged = merge_journey_values(base, related_by_key[(base.load_number, base.truck_number)])
+        # Map driver to vehicle name (if available)
+        merged.driver_vehicle = f"{merged.driver_name} ({merged.truck_number})"
+        # Calculate days spent in journey (if both departure and arrival at depot exist)
+        if merged.dj_departure_time and merged.arrival_at_depot:
+            merged.days_spent = (merged.arrival_at_depot - merged.dj_departure_time).days
+        else:
+            merged.days_spent = ''
+        journeys.append(merged)
+    return journeys
+
+
+def journey_from_departure(merged):
+    """Journey row for one merged depot departure returned by ``build_journeys``."""
+    values = {field: getattr(merged, field) for field in JOURNEY_FIELDS}
+    values['days_spent'] = merged.days_spent if merged.days_spent != '' else None
+    return Journey(departure_id=merged.pk, is_reportable=is_reportable_journey(merged), **values)
+
+
+def refresh_journeys(load_numbers, batch_size=BATCH_SIZE):
+    """
+    Rebuild the Journey rows of the given load numbers from their per-file rows.
+
+    Journeys are refreshed per load number rather than per exact
+    (load_number, truck_number, create_date) key because distance and timing files
+    match on the load number alone and may move rows between trucks; every other
+    journey is left untouched. The vehicle registrations of the affected drivers and
+    loads are re-resolved along the way. Returns the number of journeys written.
+    """
+    load_numbers = sorted(set(load_numbers))
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(load_numbers), LOOKUP_CHUNK_SIZE):
+            chunk = load_numbers[start:start + LOOKUP_CHUNK_SIZE]
+            old_driver_keys, old_load_keys = registration_keys(chunk)
+            Journey.objects.filter(load_number__in=chunk).delete()
+            depot_departures = TruckPerformanceData.objects.filter(
+                csv_upload__upload_type='depot_departures', load_number__in=chunk,
+            ).order_by('load_number', '-create_date')
+            journeys = [journey_from_departure(merged) for merged in build_journeys(depot_departures)]
+            Journey.objects.bulk_create(journeys, batch_size=batch_size)
+            written += len(journeys)
+            # Re-resolve the vehicle regs of every driver and load these journeys had or now have
+            driver_keys, load_keys = registration_keys(chunk)
+            refresh_vehicle_registrations(old_driver_keys | driver_keys, old_load_keys | load_keys)
+    return written
+
+
+def refresh_journeys_for_upload(csv_upload):
+    """Refresh the journeys touched by a processed upload (its rows now point at it)."""
+    load_numbers = (
+        TruckPerformanceData.objects
+        .filter(csv_upload=csv_upload)
+        .values_list('load_number', flat=True)
+        .distinct()
+    )
+    return refresh_journeys(load_numbers)
+
+
+def rebuild_all_journeys():
+    """Rebuild the whole Journey table, e.g. after the table was added or data was deleted."""
+    with transaction.atomic():
+        Journey.objects.all().delete()
+        load_numbers = (
+            TruckPerformanceData.objects
+            .filter(csv_upload__upload_type='depot_departures')
+            .values_list('load_number', flat=True)
+            .distinct()
+        )
+        return refresh_journeys(load_numbers)
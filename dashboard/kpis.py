@@ -0,0 +1,72 @@
+"""
+Headline KPIs of TruckPerformanceData in a single SQL statement.
+
+Every metric is an aggregate over the same rows (distinct counts and conditional
+counts via ``filter=``), so ``kpi_summary`` reads the table once instead of once
+per metric. Used by the dashboard cards, the executive summary sheet and
+``production_summary.py``.
+"""
+from django.db.models import Avg, Case, Count, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import TruckPerformanceData
+
+
+# Efficiency score recorded when no real timing was available
+ESTIMATED_EFFICIENCY = 45.0
+
+# (label, key, condition) of the efficiency bands reported by production_summary.py
+EFFICIENCY_CATEGORIES = [
+    ('Excellent (40-80 km/h)', 'excellent_efficiency', Q(efficiency_score__gte=40, efficiency_score__lte=80)),
+    ('Good (20-40 km/h)', 'good_efficiency', Q(efficiency_score__gte=20, efficiency_score__lt=40)),
+    ('Moderate (10-20 km/h)', 'moderate_efficiency', Q(efficiency_score__gte=10, efficiency_score__lt=20)),
+    ('Poor (5-10 km/h)', 'poor_efficiency', Q(efficiency_score__gte=5, efficiency_score__lt=10)),
+    ('Critical (<5 km/h)', 'critical_efficiency', Q(efficiency_score__lt=5, efficiency_score__gt=0)),
+    ('Estimated (45 km/h)', 'estimated_efficiency', Q(efficiency_score=ESTIMATED_EFFICIENCY)),
+]
+
+# (label, key, condition) of the data quality counts
+QUALITY_METRICS = [
+    ('Records with complete timing', 'complete_timing', Q(dj_departure_time__isnull=False, arrival_at_depot__isnull=False)),
+    ('Records with customer data', 'with_customer', ~Q(customer_name__icontains='unknown')),
+    ('Records with driver info', 'with_driver', ~Q(driver_name__icontains='unknown')),
+    ('Records with distance data', 'with_distance', Q(total_distance__isnull=False)),
+]
+
+
+def distinct_count(field):
+    """
+    Number of distinct values of ``field`` as one aggregate.
+
+    ``Count(distinct=True)`` skips NULL, whereas ``.values(field).distinct().count()``
+    counts it as one more value; the missing-value group is added back so both agree.
+    """
+    has_null = Max(Case(When(**{f'{field}__isnull': True}, then=Value(1)), default=Value(0)))
+    return Count(field, distinct=True) + Coalesce(has_null, 0)
+
+
+KPI_AGGREGATES = {
+    'total_loads': Count('id'),
+    'total_trucks': distinct_count('truck_number'),
+    'total_drivers': distinct_count('driver_name'),
+    'total_customers': distinct_count('customer_name'),
+    'avg_efficiency': Avg('efficiency_score'),
+    'total_distance_km': Sum('total_distance'),
+    'records_with_efficiency': Count('id', filter=Q(efficiency_score__isnull=False)),
+    'real_efficiency_records': Count(
+        'id', filter=Q(efficiency_score__isnull=False) & ~Q(efficiency_score=ESTIMATED_EFFICIENCY),
+    ),
+    **{key: Count('id', filter=condition) for _label, key, condition in EFFICIENCY_CATEGORIES},
+    **{key: Count('id', filter=condition) for _label, key, condition in QUALITY_METRICS},
+}
+
+
+def kpi_summary(queryset=None):
+    """
+    All headline metrics of ``queryset`` (all TruckPerformanceData by default) in one query.
+
+    Returns a dict keyed like KPI_AGGREGATES; averages and sums are None on an empty table.
+    """
+    if queryset is None:
+        queryset = TruckPerformanceData.objects.all()
+    return queryset.aggregate(**KPI_AGGREGATES)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.export_utils import SNAPSHOT_FORMATS, snapshot_available, write_snapshot_dataset
+from dashboard.models import Journey
+
+class Command(BaseCommand):
+    help = 'Write a full columnar snapshot of the merged journeys, partitioned by month (needs pyarrow)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='Directory to write the month=YYYY-MM partitions to')
+        parser.add_argument('--format', choices=SNAPSHOT_FORMATS, default='parquet', help='File format of the partitions')
+        parser.add_argument('--reportable-only', action='store_true', help='Leave out the journeys the dashboard hides')
+
+    def handle(self, *args, **options):
+        if not snapshot_available():
+            raise CommandError('Snapshots need the pyarrow package: pip install pyarrow')
+        journeys = Journey.objects.all()
+        if options['reportable_only']:
+            journeys = journeys.filter(is_reportable=True)
+        written = write_snapshot_dataset(options['output_dir'], fmt=options['format'], queryset=journeys)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} journeys to {options['output_dir']} ({options['format']}, partitioned by month)."
+        ))
@@ -1,9 +1,11 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils.dateparse import parse_datetime, parse_date
 import pandas as pd
+import itertools
 import os
 from datetime import datetime
 from dashboard.models import TruckPerformanceData, CSVUpload
+from dashboard.readers import read_upload_chunks
 
 
 class Command(BaseCommand):
@@ -17,6 +19,7 @@ class Command(BaseCommand):
             default=0,
             help='Sheet name or index (default: 0 for first sheet)'
         )
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows read per chunk (default: UPLOAD_CHUNK_SIZE)')
 
     def clean_datetime_string(self, dt_str):
         """Clean and parse datetime strings from Excel"""
@@ -81,7 +84,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         excel_file = options['excel_file']
-        sheet = options['sheet']
+        sheet = int(options['sheet']) if str(options['sheet']).isdigit() else options['sheet']
         
         if not os.path.exists(excel_file):
             raise CommandError(f'File "{excel_file}" does not exist.')
@@ -89,29 +92,28 @@ class Command(BaseCommand):
         self.stdout.write(f'Reading Excel file: {excel_file}')
         
         try:
-            # Read the file - handle both Excel and CSV
-            if excel_file.lower().endswith('.csv'):
-                df = pd.read_csv(excel_file)
-            else:
-                df = pd.read_excel(excel_file, sheet_name=sheet)
-            self.stdout.write(f'Found {len(df)} rows in file')
-            
+            # Stream the file (CSV or Excel) in chunks instead of loading the whole sheet
+            chunks = read_upload_chunks(excel_file, chunk_size=options['chunk_size'], sheet=sheet)
+            first_chunk = next(chunks)
+
             # Display column names
             self.stdout.write('Columns in file:')
-            for i, col in enumerate(df.columns):
+            for i, col in enumerate(first_chunk.columns):
                 self.stdout.write(f'{i+1}. {col}')
 
             # Create a CSV upload record to track this import
             csv_upload = CSVUpload.objects.create(
                 name=f'Data Import - {os.path.basename(excel_file)}',
                 upload_type='other',
-                processed=True
+                processed=True,
+                status='completed'
             )
 
             successful_imports = 0
             errors = []
     
-            for index, row in df.iterrows():
+            rows = (row for df in itertools.chain([first_chunk], chunks) for row in df.iterrows())
+            for index, row in rows:
                 try:
                     # Check if record already exists (avoid duplicates)
                     existing = TruckPerformanceData.objects.filter(
@@ -199,6 +201,4 @@ class Command(BaseCommand):
             
         except Exception as e:
             raise CommandError(f'Error reading Excel file: {str(e)}')
-        return successful_imports, errors
-        except pd.errors.EmptyDataError:
             
\ No newline at end of file
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from dashboard.journeys import rebuild_all_journeys
+from dashboard.models import Journey, VehicleRegistration
+from dashboard.vehicles import rebuild_vehicle_registrations
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized Journey table (and its vehicle registrations) from all processed depot departures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true', help='Only rebuild when the Journey table is empty')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and Journey.objects.exists():
+            if not VehicleRegistration.objects.exists():
+                written = rebuild_vehicle_registrations()
+                self.stdout.write(self.style.SUCCESS(f'Resolved {written} vehicle registrations.'))
+                return
+            self.stdout.write(self.style.NOTICE('Journey table already populated, nothing to do.'))
+            return
+        written = rebuild_all_journeys()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} journeys.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from dashboard.models import ProductivitySummary
+from dashboard.rollups import rebuild_all_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the day/week/month ProductivitySummary rollups from all performance data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true', help='Only rebuild when there are no rollups yet')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and ProductivitySummary.objects.exists():
+            self.stdout.write(self.style.NOTICE('Rollups already populated, nothing to do.'))
+            return
+        written = rebuild_all_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup rows.'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from dashboard.status_engine import refresh_statuses
+
+class Command(BaseCommand):
+    help = 'Recompute the current status of every journey from its timestamps (only changed rows are written)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing instead of exiting')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between refreshes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            updated = refresh_statuses()
+            changed = ', '.join(f'{count} {name}' for name, count in updated.items() if count)
+            if changed:
+                self.stdout.write(self.style.SUCCESS(f'Updated statuses: {changed}.'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
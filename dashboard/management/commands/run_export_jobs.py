@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from dashboard.export_jobs import purge_old_jobs, run_queued_jobs
+
+class Command(BaseCommand):
+    help = 'Run queued background export jobs (the database-backed export queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Run at most this many jobs')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+        parser.add_argument('--purge-days', type=int, default=getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7),
+                            help='Delete finished jobs and their files older than this many days')
+
+    def handle(self, *args, **options):
+        purged = purge_old_jobs(options['purge_days'])
+        if purged:
+            self.stdout.write(self.style.NOTICE(f'Purged {purged} old export jobs.'))
+        while True:
+            completed = run_queued_jobs(limit=options['limit'])
+            if completed:
+                self.stdout.write(self.style.SUCCESS(f'Completed {completed} export jobs.'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from dashboard.upload_jobs import run_queued_uploads
+
+class Command(BaseCommand):
+    help = 'Process queued uploads (the database-backed upload queue), depot departures first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Process at most this many uploads')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'UPLOAD_JOB_WORKERS', 1),
+                            help='Uploads processed in parallel once their prerequisites are done')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            completed = run_queued_uploads(limit=options['limit'], workers=options['workers'])
+            if completed:
+                self.stdout.write(self.style.SUCCESS(f'Processed {completed} uploads.'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
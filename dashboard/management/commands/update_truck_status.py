@@ -1,67 +1,28 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from dashboard.models import TruckPerformanceData
 import random
-from datetime import timedelta
+import time
 
+from django.core.management.base import BaseCommand
+from dashboard.simulation import SIMULATION_BATCH_SIZE, simulate_tick
 
 class Command(BaseCommand):
-    help = 'Update truck statuses dynamically for demo purposes'
+    help = 'Simulate the fleet: move trucks along their journeys for demos and tracking load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (the same seed and data make the same moves)')
+        parser.add_argument('--advance', type=float, default=0.3, help='Chance of each truck advancing per tick')
+        parser.add_argument('--ticks', type=int, default=1, help='Number of ticks to run')
+        parser.add_argument('--loop', action='store_true', help='Keep ticking until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between ticks')
+        parser.add_argument('--batch-size', type=int, default=SIMULATION_BATCH_SIZE, help='Trucks read and written per batch')
 
     def handle(self, *args, **options):
-        # Get trucks that are not completed
-        active_trucks = TruckPerformanceData.objects.exclude(current_status='journey_completed')
-        
-        status_progression = [
-            'pending_departure',
-            'departed_depot', 
-            'in_transit',
-            'at_customer',
-            'servicing_customer',
-            'returning_depot',
-            'journey_completed'
-        ]
-        
-        updated_count = 0
-        
-        for truck in active_trucks:
-            # Get current status index
-            try:
-                current_index = status_progression.index(truck.current_status)
-            except ValueError:
-                current_index = 0
-            
-            # Randomly decide whether to advance this truck's status
-            if random.random() < 0.3:  # 30% chance to advance
-                if current_index < len(status_progression) - 1:
-                    new_status = status_progression[current_index + 1]
-                    truck.current_status = new_status
-                    
-                    # Update corresponding timestamp fields
-                    now = timezone.now()
-                    
-                    if new_status == 'departed_depot':
-                        truck.dj_departure_time = now
-                    elif new_status == 'at_customer':
-                        truck.arrival_at_customer = now
-                    elif new_status == 'servicing_customer':
-                        truck.service_start_time = now
-                    elif new_status == 'returning_depot':
-                        truck.departure_time_from_customer = now
-                    elif new_status == 'journey_completed':
-                        truck.arrival_at_depot = now
-                    
-                    truck.save()
-                    updated_count += 1
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Updated {truck.load_number} to {new_status}'
-                        )
-                    )
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully updated {updated_count} trucks'
-            )
-        )
+        rng = random.Random(options['seed'])
+        tick = 0
+        while True:
+            tick += 1
+            reached = simulate_tick(rng, advance=options['advance'], batch_size=options['batch_size'])
+            summary = ', '.join(f'{count} {status}' for status, count in sorted(reached.items())) or 'no trucks moved'
+            self.stdout.write(self.style.SUCCESS(f'Tick {tick}: {summary}.'))
+            if not options['loop'] and tick >= options['ticks']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,309 @@
+"""
+Derived metrics for TruckPerformanceData.
+
+``derive_record_metrics`` computes the derived fields of a single record and is
+what ``TruckPerformanceData.save()`` uses; ``derive_frame_metrics`` computes the
+same fields for a whole DataFrame at once so bulk ingestion and the maintenance
+scripts can skip per-object ``save()``. Both produce identical values: sums are
+accumulated in field order, durations go through whole microseconds exactly
+like ``timedelta.total_seconds()`` and rounding uses Python's ``round``.
+"""
+import datetime
+
+import pandas as pd
+
+
+DISTANCE_FIELDS = ['d1', 'd2', 'd3', 'd4']
+DATETIME_FIELDS = [
+    'dj_departure_time', 'arrival_at_customer', 'departure_time_from_customer', 'arrival_at_depot',
+    'clock_out', 'planned_departure_time', 'planned_arrival_time',
+]
+INPUT_FIELDS = DISTANCE_FIELDS + DATETIME_FIELDS + [
+    'budgeted_kms', 'service_time_at_customer',
+    # Derived fields that are kept when they cannot be recalculated
+    'total_distance', 'total_time', 'delivery_time', 'efficiency_score',
+]
+DERIVED_FIELDS = [
+    'total_distance', 'km_deviation', 'dj_departure_time', 'arrival_at_depot', 'arrival_at_customer',
+    'planned_departure_time', 'clock_out', 'planned_arrival_time', 'total_time', 'delivery_time',
+    'efficiency_score', 'clockin_time', 'actual_days_in_route', 'bud_days_in_route',
+    'days_in_route_deviation', 'total_hour_route', 'total_working_hours', 'driver_rest_hours_in_route',
+    'current_status',
+]
+
+CLOCKIN_OFFSET = datetime.timedelta(minutes=30)
+WORKING_HOURS_PER_DAY = 11
+
+# Journey statuses (TruckPerformanceData.STATUS_CHOICES); see status_engine for the bulk refresh
+PENDING = 'pending'
+DEPARTED = 'departed'
+IN_TRANSIT = 'in_transit'
+AT_CUSTOMER = 'at_customer'
+SERVICING = 'servicing'
+RETURNING = 'returning'
+COMPLETED = 'completed'
+DELAYED = 'delayed'
+
+# Progress bar percentage of each status
+STATUS_PROGRESS = {
+    PENDING: 0,
+    DEPARTED: 20,
+    IN_TRANSIT: 40,
+    AT_CUSTOMER: 60,
+    SERVICING: 70,
+    RETURNING: 85,
+    COMPLETED: 100,
+    DELAYED: 50,
+}
+
+# Index of the active tracking step (TruckPerformanceData.PROGRESS_STEPS) of each status;
+# a delayed truck has not left the depot yet
+STATUS_STEP = {
+    PENDING: 0,
+    DELAYED: 0,
+    DEPARTED: 1,
+    IN_TRANSIT: 2,
+    AT_CUSTOMER: 3,
+    SERVICING: 3,
+    RETURNING: 4,
+    COMPLETED: 5,
+}
+
+
+def make_aware_utc(dt):
+    """Treat naive datetimes as UTC; aware datetimes are returned unchanged."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None or dt.tzinfo.utcoffset(dt) is None:
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def derive_status(dj_departure_time, arrival_at_customer, departure_time_from_customer,
+                  arrival_at_depot, service_time_at_customer, now):
+    """Status implied by the journey timestamps at ``now`` (all datetimes timezone-aware)."""
+    # If no departure time is set, status is pending
+    if not dj_departure_time:
+        return PENDING
+    # If journey is complete (returned to depot)
+    if arrival_at_depot:
+        return COMPLETED
+    # If delayed (departure time is set but in the future)
+    if dj_departure_time > now:
+        return DELAYED
+    # If departed from customer but not yet at depot
+    if departure_time_from_customer:
+        return RETURNING
+    # If at customer location
+    if arrival_at_customer:
+        if service_time_at_customer and service_time_at_customer > 0:
+            return SERVICING
+        return AT_CUSTOMER
+    # Departed from depot but not yet at customer
+    return IN_TRANSIT
+
+
+def derive_record_metrics(values, now=None):
+    """
+    Compute the derived fields for one record.
+
+    values: mapping of INPUT_FIELDS to their current values (missing keys count as None).
+    Returns a dict of DERIVED_FIELDS to their new values.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    get = values.get
+    result = {}
+
+    # Total distance from d1, d2, d3, d4 (kept as-is when no distance is known)
+    valid_distances = [get(field) for field in DISTANCE_FIELDS if get(field) is not None]
+    total_distance = sum(valid_distances) if valid_distances else get('total_distance')
+    result['total_distance'] = total_distance
+    budgeted_kms = get('budgeted_kms')
+    if budgeted_kms is not None and total_distance is not None:
+        result['km_deviation'] = budgeted_kms - total_distance
+    else:
+        result['km_deviation'] = None
+
+    # Make all datetime fields timezone-aware (UTC)
+    times = {field: make_aware_utc(get(field)) for field in DATETIME_FIELDS}
+    result.update(times)
+    departure = times['dj_departure_time']
+    depot = times['arrival_at_depot']
+    customer = times['arrival_at_customer']
+
+    # Total time from departure to depot, or delivery time when the depot arrival is missing
+    total_time = get('total_time')
+    delivery_time = get('delivery_time')
+    if departure and depot:
+        total_time = (depot - departure).total_seconds() / 3600
+    elif departure and customer:
+        delivery_time = (customer - departure).total_seconds() / 3600
+    result['total_time'] = total_time
+    result['delivery_time'] = delivery_time
+
+    # Efficiency score (km per hour)
+    efficiency_score = get('efficiency_score')
+    if total_distance and total_time and total_time > 0:
+        efficiency_score = total_distance / total_time
+    result['efficiency_score'] = efficiency_score
+
+    # Clock-in is DJ Departure minus 30 minutes
+    result['clockin_time'] = departure - CLOCKIN_OFFSET if departure else None
+
+    # Days and hours in route, ending at clock-out or depot arrival
+    end_time = times['clock_out'] or depot
+    if departure and end_time:
+        route_seconds = (end_time - departure).total_seconds()
+        actual_days = round(route_seconds / 86400, 2)
+        total_hour_route = round(route_seconds / 3600, 2)
+    else:
+        actual_days = None
+        total_hour_route = None
+    result['actual_days_in_route'] = actual_days
+    result['total_hour_route'] = total_hour_route
+
+    planned_departure = times['planned_departure_time']
+    planned_arrival = times['planned_arrival_time']
+    if planned_departure and planned_arrival:
+        bud_days = round((planned_arrival - planned_departure).total_seconds() / 86400, 2)
+    else:
+        bud_days = None
+    result['bud_days_in_route'] = bud_days
+
+    if actual_days is not None and bud_days is not None:
+        result['days_in_route_deviation'] = round(actual_days - bud_days, 2)
+    else:
+        result['days_in_route_deviation'] = None
+
+    total_working_hours = round(actual_days * WORKING_HOURS_PER_DAY, 2) if actual_days is not None else None
+    result['total_working_hours'] = total_working_hours
+    if total_hour_route is not None and total_working_hours is not None:
+        result['driver_rest_hours_in_route'] = round(total_hour_route - total_working_hours, 2)
+    else:
+        result['driver_rest_hours_in_route'] = None
+
+    result['current_status'] = derive_status(
+        departure, customer, times['departure_time_from_customer'], depot,
+        get('service_time_at_customer'), now,
+    )
+    return result
+
+
+def _frame_column(frame, field):
+    if field in frame.columns:
+        return frame[field]
+    return pd.Series(None, index=frame.index, dtype=object)
+
+
+def _float_column(frame, field):
+    return pd.to_numeric(_frame_column(frame, field), errors='coerce').astype('float64')
+
+
+def _datetime_column(frame, field):
+    """Column as UTC datetime64; naive values are treated as UTC like ``make_aware_utc``."""
+    column = _frame_column(frame, field)
+    if isinstance(column.dtype, pd.DatetimeTZDtype):
+        return column.dt.tz_convert('UTC')
+    if pd.api.types.is_datetime64_dtype(column):
+        return column.dt.tz_localize('UTC')
+    return pd.to_datetime(column, utc=True)
+
+
+def _total_seconds(delta):
+    """Vectorized ``timedelta.total_seconds()``: whole microseconds divided by 10**6."""
+    microseconds = pd.Series(delta.dt.as_unit('us').to_numpy().view('int64'), index=delta.index)
+    return (microseconds / 10**6).where(delta.notna())
+
+
+def _round(series, digits=2):
+    """Python's ``round`` (correctly rounded decimal), which numpy's round is not."""
+    return series.map(lambda value: value if pd.isna(value) else round(value, digits))
+
+
+def derive_frame_metrics(frame, now=None):
+    """
+    Compute the derived fields for every row of a DataFrame at once.
+
+    frame: DataFrame with (a subset of) INPUT_FIELDS as columns; missing columns count as None.
+    Returns a DataFrame indexed like ``frame`` with one column per DERIVED_FIELDS entry;
+    datetimes are UTC-aware and missing values are NaN/NaT.
+    """
+    now = pd.Timestamp(now or datetime.datetime.now(datetime.timezone.utc)).tz_convert('UTC')
+    result = pd.DataFrame(index=frame.index)
+
+    distances = [_float_column(frame, field) for field in DISTANCE_FIELDS]
+    any_distance = pd.concat(distances, axis=1).notna().any(axis=1)
+    summed = distances[0].fillna(0.0)
+    for distance in distances[1:]:
+        summed = summed + distance.fillna(0.0)
+    total_distance = summed.where(any_distance, _float_column(frame, 'total_distance'))
+    result['total_distance'] = total_distance
+    result['km_deviation'] = _float_column(frame, 'budgeted_kms') - total_distance
+
+    times = {field: _datetime_column(frame, field) for field in DATETIME_FIELDS}
+    for field, column in times.items():
+        result[field] = column
+    departure = times['dj_departure_time']
+    depot = times['arrival_at_depot']
+    customer = times['arrival_at_customer']
+
+    has_trip = departure.notna() & depot.notna()
+    has_delivery = ~has_trip & departure.notna() & customer.notna()
+    total_time = _float_column(frame, 'total_time')
+    total_time = (_total_seconds(depot - departure) / 3600).where(has_trip, total_time)
+    delivery_time = _float_column(frame, 'delivery_time')
+    delivery_time = (_total_seconds(customer - departure) / 3600).where(has_delivery, delivery_time)
+    result['total_time'] = total_time
+    result['delivery_time'] = delivery_time
+
+    can_score = (total_distance.fillna(0) != 0) & (total_time.fillna(0) > 0)
+    result['efficiency_score'] = (total_distance / total_time).where(can_score, _float_column(frame, 'efficiency_score'))
+
+    result['clockin_time'] = departure - CLOCKIN_OFFSET
+
+    end_time = times['clock_out'].fillna(depot)
+    route_seconds = _total_seconds(end_time - departure)
+    actual_days = _round(route_seconds / 86400)
+    total_hour_route = _round(route_seconds / 3600)
+    result['actual_days_in_route'] = actual_days
+    result['total_hour_route'] = total_hour_route
+
+    bud_days = _round(_total_seconds(times['planned_arrival_time'] - times['planned_departure_time']) / 86400)
+    result['bud_days_in_route'] = bud_days
+    result['days_in_route_deviation'] = _round(actual_days - bud_days)
+
+    total_working_hours = _round(actual_days * WORKING_HOURS_PER_DAY)
+    result['total_working_hours'] = total_working_hours
+    result['driver_rest_hours_in_route'] = _round(total_hour_route - total_working_hours)
+
+    result['current_status'] = derive_frame_status(
+        departure, customer, times['departure_time_from_customer'], depot,
+        _float_column(frame, 'service_time_at_customer'), now,
+    )
+    return result[DERIVED_FIELDS]
+
+
+def derive_frame_status(dj_departure_time, arrival_at_customer, departure_time_from_customer,
+                        arrival_at_depot, service_time_at_customer, now):
+    """Vectorized ``derive_status`` over aligned UTC datetime columns."""
+    status = pd.Series(IN_TRANSIT, index=dj_departure_time.index, dtype=object)
+    at_customer = arrival_at_customer.notna()
+    status = status.mask(at_customer, AT_CUSTOMER)
+    status = status.mask(at_customer & (service_time_at_customer.fillna(0) > 0), SERVICING)
+    status = status.mask(departure_time_from_customer.notna(), RETURNING)
+    status = status.mask(dj_departure_time > now, DELAYED)
+    status = status.mask(arrival_at_depot.notna(), COMPLETED)
+    status = status.mask(dj_departure_time.isna(), PENDING)
+    return status
+
+
+def apply_derived_metrics(objs, now=None):
+    """Vectorized ``calculate_derived_fields()`` for a list of TruckPerformanceData instances."""
+    from .ingestion import frame_to_records
+
+    if not objs:
+        return
+    frame = pd.DataFrame([{field: getattr(obj, field) for field in INPUT_FIELDS} for obj in objs])
+    for obj, values in zip(objs, frame_to_records(derive_frame_metrics(frame, now=now))):
+        for field, value in values.items():
+            setattr(obj, field, value)
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_truckperformancedata_employee_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Journey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_number', models.CharField(max_length=50)),
+                ('truck_number', models.CharField(max_length=50)),
+                ('create_date', models.DateField()),
+                ('month_name', models.CharField(max_length=20)),
+                ('transporter', models.CharField(max_length=100)),
+                ('driver_name', models.CharField(max_length=100)),
+                ('customer_name', models.CharField(max_length=200)),
+                ('mode_of_capture', models.CharField(blank=True, max_length=50, null=True)),
+                ('dj_departure_time', models.DateTimeField(blank=True, null=True)),
+                ('clockin_time', models.DateTimeField(blank=True, null=True)),
+                ('planned_departure_time', models.DateTimeField(blank=True, null=True)),
+                ('departure_deviation_min', models.IntegerField(blank=True, null=True)),
+                ('ave_departure', models.IntegerField(blank=True, null=True)),
+                ('arrival_at_customer', models.DateTimeField(blank=True, null=True)),
+                ('departure_time_from_customer', models.DateTimeField(blank=True, null=True)),
+                ('service_time_at_customer', models.IntegerField(blank=True, null=True)),
+                ('arrival_at_depot', models.DateTimeField(blank=True, null=True)),
+                ('ave_arrival_time', models.IntegerField(blank=True, null=True)),
+                ('d1', models.FloatField(blank=True, null=True)),
+                ('d2', models.FloatField(blank=True, null=True)),
+                ('d3', models.FloatField(blank=True, null=True)),
+                ('d4', models.FloatField(blank=True, null=True)),
+                ('comment_ave_tir', models.TextField(blank=True, null=True)),
+                ('current_status', models.CharField(choices=[('pending', 'Pending Departure'), ('departed', 'Departed from Depot'), ('in_transit', 'In Transit to Customer'), ('at_customer', 'At Customer Location'), ('servicing', 'Servicing Customer'), ('returning', 'Returning to Depot'), ('completed', 'Journey Completed'), ('delayed', 'Delayed')], default='pending', max_length=20)),
+                ('total_distance', models.FloatField(blank=True, null=True)),
+                ('total_time', models.FloatField(blank=True, null=True)),
+                ('delivery_time', models.FloatField(blank=True, null=True)),
+                ('efficiency_score', models.FloatField(blank=True, null=True)),
+                ('days_spent', models.IntegerField(blank=True, help_text='Days from DJ departure to depot arrival', null=True)),
+                ('is_reportable', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('departure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journeys', to='dashboard.truckperformancedata')),
+            ],
+            options={
+                'ordering': ['load_number', '-create_date'],
+                'indexes': [models.Index(fields=['is_reportable', 'load_number'], name='journey_reportable_load_idx')],
+                'unique_together': {('load_number', 'truck_number', 'create_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0018_journey'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='journey',
+            name='journey_reportable_load_idx',
+        ),
+        migrations.AddIndex(
+            model_name='journey',
+            index=models.Index(fields=['is_reportable', '-create_date', 'load_number', 'truck_number'], name='journey_page_idx'),
+        ),
+    ]
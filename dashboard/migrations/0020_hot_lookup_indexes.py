@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+# Columns searched with icontains (truck_tracking_view, dashboard load search).
+# Django compiles icontains to UPPER("col"::text) LIKE UPPER(...) on PostgreSQL,
+# so the trigram indexes are built on that same expression.
+TRIGRAM_COLUMNS = [
+    ('dashboard_truckperformancedata', 'load_number', 'perf_load_trgm_idx'),
+    ('dashboard_truckperformancedata', 'truck_number', 'perf_truck_trgm_idx'),
+    ('dashboard_truckperformancedata', 'driver_name', 'perf_driver_trgm_idx'),
+    ('dashboard_truckperformancedata', 'customer_name', 'perf_customer_trgm_idx'),
+    ('dashboard_journey', 'load_number', 'journey_load_trgm_idx'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """pg_trgm GIN indexes on PostgreSQL; other backends rely on the B-tree indexes above."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column, name in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _table, _column, name in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0019_journey_page_index'),
+    ]
+
+    operations = [
+        # The dashboard filters on is_reportable with a bare boolean term, which only a partial index matches
+        migrations.RemoveIndex(
+            model_name='journey',
+            name='journey_page_idx',
+        ),
+        migrations.AddIndex(
+            model_name='journey',
+            index=models.Index(condition=models.Q(('is_reportable', True)), fields=['-create_date', 'load_number', 'truck_number'], name='journey_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='csvupload',
+            index=models.Index(fields=['upload_type'], name='csvupload_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['load_number', 'truck_number'], name='perf_load_truck_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['truck_number'], name='perf_truck_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['driver_name'], name='perf_driver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['customer_name'], name='perf_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['create_date', 'load_number'], name='perf_date_load_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['-created_at'], name='perf_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['current_status', '-arrival_at_depot'], name='perf_status_depot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(condition=models.Q(('current_status', 'completed'), _negated=True), fields=['-dj_departure_time'], name='perf_active_departure_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0020_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productivitysummary',
+            name='period',
+            field=models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], default='month', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='productivitysummary',
+            name='scored_loads',
+            field=models.IntegerField(default=0, help_text='Loads with an efficiency score (weight of the average)'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productivitysummary',
+            unique_together={('period', 'date_range_start', 'transporter', 'customer_name')},
+        ),
+    ]
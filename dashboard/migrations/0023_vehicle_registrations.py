@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:24
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0022_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleRegistration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_key', models.CharField(blank=True, help_text='Trimmed, lowercased driver name', max_length=100)),
+                ('load_key', models.CharField(blank=True, help_text='Trimmed, lowercased load number', max_length=50)),
+                ('truck_number', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='journey',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('driver_name')), name='journey_driver_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journey',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('load_number')), name='journey_load_key_idx'),
+        ),
+        migrations.AddField(
+            model_name='vehicleregistration',
+            name='journey',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registrations', to='dashboard.journey'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicleregistration',
+            index=models.Index(fields=['load_key'], name='vehiclereg_load_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vehicleregistration',
+            unique_together={('driver_key', 'load_key')},
+        ),
+    ]
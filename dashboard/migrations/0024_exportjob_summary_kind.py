@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0023_vehicle_registrations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='kind',
+            field=models.CharField(choices=[('excel', 'Excel Productivity Report'), ('upload_csv', 'Upload CSV Report'), ('summary', 'Summary Report')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+def set_existing_status(apps, schema_editor):
+    """Uploads before the queue were processed during the request; none of them is waiting."""
+    CSVUpload = apps.get_model('dashboard', 'CSVUpload')
+    CSVUpload.objects.filter(processed=True).update(status='completed', progress=100)
+    CSVUpload.objects.filter(processed=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0024_exportjob_summary_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvupload',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Percent complete'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='row_count',
+            field=models.IntegerField(default=0, help_text='Rows processed'),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='csvupload',
+            name='total_rows',
+            field=models.IntegerField(blank=True, help_text='Estimated rows in the file', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='csvupload',
+            index=models.Index(fields=['status', 'id'], name='csvupload_status_idx'),
+        ),
+        migrations.RunPython(set_existing_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0025_csvupload_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(fields=['updated_at', 'id'], name='perf_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0026_truck_status_delta_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='truckperformancedata',
+            name='perf_active_departure_idx',
+        ),
+        migrations.AddIndex(
+            model_name='truckperformancedata',
+            index=models.Index(condition=models.Q(('current_status', 'completed'), _negated=True), fields=['-dj_departure_time', '-id'], name='perf_active_departure_idx'),
+        ),
+    ]
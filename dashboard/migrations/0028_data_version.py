@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:05
+
+import uuid
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    """Start with a version so readers never have to create the row."""
+    DataVersion = apps.get_model('dashboard', 'DataVersion')
+    DataVersion.objects.get_or_create(pk=1, defaults={'version': uuid.uuid4().hex})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0027_tracking_page_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
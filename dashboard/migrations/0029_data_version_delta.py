@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+def copy_version(apps, schema_editor):
+    """Cursors handed out so far carry the data version."""
+    DataVersion = apps.get_model('dashboard', 'DataVersion')
+    DataVersion.objects.update(delta_version=models.F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0028_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='delta_version',
+            field=models.CharField(default='', help_text='Changes only when delta cursors must start over', max_length=32),
+        ),
+        migrations.RunPython(copy_version, migrations.RunPython.noop),
+    ]
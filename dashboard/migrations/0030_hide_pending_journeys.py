@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:31
+
+from django.db import migrations
+
+
+def hide_pending_journeys(apps, schema_editor):
+    """Journeys written while is_reportable compared against the status label missed pending ones."""
+    Journey = apps.get_model('dashboard', 'Journey')
+    Journey.objects.filter(current_status='pending', is_reportable=True).update(is_reportable=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0029_data_version_delta'),
+    ]
+
+    operations = [
+        migrations.RunPython(hide_pending_journeys, migrations.RunPython.noop),
+    ]
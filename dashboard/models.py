@@ -3,9 +3,16 @@
 
 
 from django.db import models
+from django.db.models.functions import Lower, Trim
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 
+from . import metrics
+from .metrics import INPUT_FIELDS, STATUS_PROGRESS, STATUS_STEP, derive_record_metrics, derive_status, make_aware_utc
+
+# Every status except completed
+UNTIL_COMPLETED = frozenset(STATUS_STEP) - {metrics.COMPLETED}
+
 
 class CSVUpload(models.Model):
     """Model to store uploaded CSV files"""
@@ -17,6 +24,12 @@ class CSVUpload(models.Model):
         ('time_route_info', '6. Time in Route Information'),
         ('other', 'Other CSV File')
     ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
 
     name = models.CharField(max_length=200)
     upload_type = models.CharField(max_length=50, choices=UPLOAD_TYPES)
@@ -27,6 +40,21 @@ class CSVUpload(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
 
+    # Background processing (see upload_jobs)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    row_count = models.IntegerField(default=0, help_text="Rows processed")
+    total_rows = models.IntegerField(null=True, blank=True, help_text="Estimated rows in the file")
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['upload_type'], name='csvupload_type_idx'),
+            models.Index(fields=['status', 'id'], name='csvupload_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.get_upload_type_display()}"
 
@@ -116,17 +144,29 @@ class TruckPerformanceData(models.Model):
     
     # Status tracking for progress display
     STATUS_CHOICES = [
-        ('pending', 'Pending Departure'),
-        ('departed', 'Departed from Depot'),
-        ('in_transit', 'In Transit to Customer'),
-        ('at_customer', 'At Customer Location'),
-        ('servicing', 'Servicing Customer'),
-        ('returning', 'Returning to Depot'),
-        ('completed', 'Journey Completed'),
-        ('delayed', 'Delayed'),
+        (metrics.PENDING, 'Pending Departure'),
+        (metrics.DEPARTED, 'Departed from Depot'),
+        (metrics.IN_TRANSIT, 'In Transit to Customer'),
+        (metrics.AT_CUSTOMER, 'At Customer Location'),
+        (metrics.SERVICING, 'Servicing Customer'),
+        (metrics.RETURNING, 'Returning to Depot'),
+        (metrics.COMPLETED, 'Journey Completed'),
+        (metrics.DELAYED, 'Delayed'),
+    ]
+    
+    # Tracking steps: (name, icon, status, timestamp field, statuses the step is not completed in)
+    PROGRESS_STEPS = [
+        ('Pending Departure', 'fas fa-clock', metrics.PENDING, None, {metrics.PENDING}),
+        ('Departed from Depot', 'fas fa-truck', metrics.DEPARTED, 'dj_departure_time', {metrics.PENDING}),
+        ('In Transit', 'fas fa-route', metrics.IN_TRANSIT, None, {metrics.PENDING, metrics.DEPARTED}),
+        ('At Customer', 'fas fa-map-marker-alt', metrics.AT_CUSTOMER, 'arrival_at_customer',
+         {metrics.PENDING, metrics.DEPARTED, metrics.IN_TRANSIT}),
+        ('Returning to Depot', 'fas fa-undo', metrics.RETURNING, 'departure_time_from_customer', UNTIL_COMPLETED),
+        ('Journey Completed', 'fas fa-check-circle', metrics.COMPLETED, 'arrival_at_depot', UNTIL_COMPLETED),
     ]
     
-    current_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Derived from the timestamps on write and refreshed in bulk by status_engine
+    current_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=metrics.PENDING)
     
     # Calculated fields
     total_distance = models.FloatField(null=True, blank=True, help_text="Total Distance (D1+D2+D3+D4)")
@@ -141,233 +181,72 @@ class TruckPerformanceData(models.Model):
     class Meta:
         unique_together = ['load_number', 'create_date', 'truck_number']
         ordering = ['-create_date', 'transporter', 'load_number']
+        # Hot lookups of the dashboard, tracking and export queries. The icontains searches
+        # get pg_trgm GIN indexes on PostgreSQL in migration 0020.
+        indexes = [
+            models.Index(fields=['load_number', 'truck_number'], name='perf_load_truck_idx'),
+            models.Index(fields=['truck_number'], name='perf_truck_idx'),
+            models.Index(fields=['driver_name'], name='perf_driver_idx'),
+            models.Index(fields=['customer_name'], name='perf_customer_idx'),
+            models.Index(fields=['create_date', 'load_number'], name='perf_date_load_idx'),
+            models.Index(fields=['-created_at'], name='perf_created_at_idx'),
+            models.Index(fields=['current_status', '-arrival_at_depot'], name='perf_status_depot_idx'),
+            models.Index(
+                fields=['-dj_departure_time', '-id'], name='perf_active_departure_idx',
+                condition=~models.Q(current_status=metrics.COMPLETED),
+            ),
+            # Delta polls of the tracking status API (see tracking.status_page)
+            models.Index(fields=['updated_at', 'id'], name='perf_updated_idx'),
+        ]
         verbose_name = "Truck Performance Data"
         verbose_name_plural = "Truck Performance Data"
     
     def save(self, *args, **kwargs):
         """Override save to calculate derived fields and set clock-in time as DJ Departure minus 30 minutes."""
-        from datetime import timedelta
-        from django.utils import timezone
-        # Calculate total distance from D1, D2, D3, D4 properties
-        # Calculate total distance from d1, d2, d3, d4
-        distances = [self.d1, self.d2, self.d3, self.d4]
-        valid_distances = [d for d in distances if d is not None]
-        if valid_distances:
-            self.total_distance = sum(valid_distances)
-        # Calculate km_deviation as budgeted_kms - total_distance
-        if self.budgeted_kms is not None and self.total_distance is not None:
-            self.km_deviation = self.budgeted_kms - self.total_distance
-        else:
-            self.km_deviation = None
-        # Make all datetime fields timezone-aware (UTC)
-        def make_aware_if_needed(dt):
-            if dt is None:
-                return None
-            if timezone.is_naive(dt):
-                import datetime
-                return timezone.make_aware(dt, timezone=datetime.timezone.utc)
-            return dt
-        if hasattr(self, 'dj_departure_time') and self.dj_departure_time:
-            self.dj_departure_time = make_aware_if_needed(self.dj_departure_time)
-        if hasattr(self, 'arrival_at_depot') and self.arrival_at_depot:
-            self.arrival_at_depot = make_aware_if_needed(self.arrival_at_depot)
-        if hasattr(self, 'arrival_at_customer') and self.arrival_at_customer:
-            self.arrival_at_customer = make_aware_if_needed(self.arrival_at_customer)
-        if hasattr(self, 'planned_departure_time') and self.planned_departure_time:
-            self.planned_departure_time = make_aware_if_needed(self.planned_departure_time)
-        # Calculate total time using multiple time combinations
-        if self.dj_departure_time and self.arrival_at_depot:
-            time_diff = self.arrival_at_depot - self.dj_departure_time
-            self.total_time = time_diff.total_seconds() / 3600  # Convert to hours
-        elif self.dj_departure_time and self.arrival_at_customer:
-            # Calculate delivery time if depot arrival not available
-            time_diff = self.arrival_at_customer - self.dj_departure_time
-            self.delivery_time = time_diff.total_seconds() / 3600
-        # Calculate efficiency score (km per hour)
-        if self.total_distance and self.total_time and self.total_time > 0:
-            self.efficiency_score = self.total_distance / self.total_time
-        # Always set clockin_time to DJ Departure minus 30 minutes if DJ Departure is present
-        if self.dj_departure_time:
-            try:
-                self.clockin_time = make_aware_if_needed(self.dj_departure_time - timedelta(minutes=30))
-            except Exception:
-                self.clockin_time = None
-        else:
-            self.clockin_time = None
-        # Calculate actual_days_in_route
-        if self.dj_departure_time:
-            end_time = self.clock_out or self.arrival_at_depot
-            if end_time:
-                delta = end_time - self.dj_departure_time
-                self.actual_days_in_route = round(delta.total_seconds() / 86400, 2)
-            else:
-                self.actual_days_in_route = None
-        else:
-            self.actual_days_in_route = None
-
-        # Calculate bud_days_in_route
-        if hasattr(self, 'planned_departure_time') and hasattr(self, 'planned_arrival_time'):
-            if self.planned_departure_time and self.planned_arrival_time:
-                delta = self.planned_arrival_time - self.planned_departure_time
-                self.bud_days_in_route = round(delta.total_seconds() / 86400, 2)
-            else:
-                self.bud_days_in_route = None
-        else:
-            self.bud_days_in_route = None
-        # Calculate days_in_route_deviation
-        if self.actual_days_in_route is not None and self.bud_days_in_route is not None:
-            self.days_in_route_deviation = round(self.actual_days_in_route - self.bud_days_in_route, 2)
-        else:
-            self.days_in_route_deviation = None
-
-        # Calculate total_hour_route
-        if self.dj_departure_time:
-            end_time = self.clock_out or self.arrival_at_depot
-            if end_time:
-                delta = end_time - self.dj_departure_time
-                self.total_hour_route = round(delta.total_seconds() / 3600, 2)
-            else:
-                self.total_hour_route = None
-        else:
-            self.total_hour_route = None
-
-        # Calculate total_working_hours as actual_days_in_route * 11
-        if self.actual_days_in_route is not None:
-            self.total_working_hours = round(self.actual_days_in_route * 11, 2)
-        else:
-            self.total_working_hours = None
-
-        # Calculate driver_rest_hours_in_route
-        if self.total_hour_route is not None and self.total_working_hours is not None:
-            self.driver_rest_hours_in_route = round(self.total_hour_route - self.total_working_hours, 2)
-        else:
-            self.driver_rest_hours_in_route = None
-        # Auto-determine status based on timestamps
-        self.current_status = self.determine_current_status()
+        self.calculate_derived_fields()
         super().save(*args, **kwargs)
-    
+
+    def calculate_derived_fields(self, now=None):
+        """Calculate derived fields and status in place without saving (used by save() and bulk writes)."""
+        values = {field: getattr(self, field) for field in INPUT_FIELDS}
+        for field, value in derive_record_metrics(values, now=now).items():
+            setattr(self, field, value)
+
     def determine_current_status(self):
         """Determine current status based on available timestamps"""
-        from dashboard.views import make_naive
-        now = timezone.now()
-        now_naive = make_naive(now)
-        dj_departure_time_naive = make_naive(self.dj_departure_time) if self.dj_departure_time else None
-        arrival_at_depot_naive = make_naive(self.arrival_at_depot) if self.arrival_at_depot else None
-        arrival_at_customer_naive = make_naive(self.arrival_at_customer) if self.arrival_at_customer else None
-        departure_time_from_customer_naive = make_naive(self.departure_time_from_customer) if self.departure_time_from_customer else None
-        # If no departure time is set, status is pending
-        if not dj_departure_time_naive:
-            return 'pending'
-        # If journey is complete (returned to depot)
-        if arrival_at_depot_naive:
-            return 'completed'
-        # If delayed (departure time is set but in the future or very recent)
-        if dj_departure_time_naive and dj_departure_time_naive > now_naive:
-            return 'delayed'
-
-        # If departed from customer but not yet at depot
-        if departure_time_from_customer_naive:
-            return 'returning'
-
-        # If at customer location
-        if arrival_at_customer_naive and not departure_time_from_customer_naive:
-            if self.service_time_at_customer and self.service_time_at_customer > 0:
-                return 'servicing'
-            else:
-                return 'at_customer'
-        
-        # If departed from depot but not yet at customer
-        if dj_departure_time_naive and not arrival_at_customer_naive:
-            return 'in_transit'
-        
-        # If departure time is set but in the future or very recent
-        if dj_departure_time_naive:
-            return 'departed'
-        
-        # Default status
-        return 'pending'
+        return derive_status(
+            make_aware_utc(self.dj_departure_time),
+            make_aware_utc(self.arrival_at_customer),
+            make_aware_utc(self.departure_time_from_customer),
+            make_aware_utc(self.arrival_at_depot),
+            self.service_time_at_customer,
+            timezone.now(),
+        )
     
     def get_progress_percentage(self):
         """Calculate progress percentage based on status"""
-        status_progress = {
-            'pending': 0,
-            'departed': 20,
-            'in_transit': 40,
-            'at_customer': 60,
-            'servicing': 70,
-            'returning': 85,
-            'completed': 100,
-            'delayed': 50,  # Arbitrary value for delayed
-        }
-        return status_progress.get(self.current_status, 0)
+        return STATUS_PROGRESS.get(self.current_status, 0)
     
     def get_progress_steps(self):
         """Get progress steps for display"""
-        steps = [
-            {
-                'name': 'Pending Departure',
-                'icon': 'fas fa-clock',
-                'status': 'pending',
-                'completed': self.current_status != 'pending',
-                'active': self.current_status == 'pending',
-                'timestamp': None,
-            },
-            {
-                'name': 'Departed from Depot',
-                'icon': 'fas fa-truck',
-                'status': 'departed',
-                'completed': self.current_status not in ['pending'],
-                'active': self.current_status == 'departed',
-                'timestamp': self.dj_departure_time,
-            },
-            {
-                'name': 'In Transit',
-                'icon': 'fas fa-route',
-                'status': 'in_transit',
-                'completed': self.current_status not in ['pending', 'departed'],
-                'active': self.current_status == 'in_transit',
-                'timestamp': None,
-            },
-            {
-                'name': 'At Customer',
-                'icon': 'fas fa-map-marker-alt',
-                'status': 'at_customer',
-                'completed': self.current_status not in ['pending', 'departed', 'in_transit'],
-                'active': self.current_status in ['at_customer', 'servicing'],
-                'timestamp': self.arrival_at_customer,
-            },
+        return [
             {
-                'name': 'Returning to Depot',
-                'icon': 'fas fa-undo',
-                'status': 'returning',
-                'completed': self.current_status == 'completed',
-                'active': self.current_status == 'returning',
-                'timestamp': self.departure_time_from_customer,
-            },
-            {
-                'name': 'Journey Completed',
-                'icon': 'fas fa-check-circle',
-                'status': 'completed',
-                'completed': self.current_status == 'completed',
-                'active': self.current_status == 'completed',
-                'timestamp': self.arrival_at_depot,
-            },
+                'name': name,
+                'icon': icon,
+                'status': status,
+                'completed': self.current_status not in not_completed,
+                # Servicing trucks are still at the customer
+                'active': self.current_status == status or (
+                    status == metrics.AT_CUSTOMER and self.current_status == metrics.SERVICING
+                ),
+                'timestamp': getattr(self, timestamp_field) if timestamp_field else None,
+            }
+            for name, icon, status, timestamp_field, not_completed in self.PROGRESS_STEPS
         ]
-        return steps
     
     def calculate_progress_percentage(self):
         """Calculate progress percentage based on current status"""
-        status_progress = {
-            'pending': 0,
-            'departed': 20,
-            'in_transit': 40,
-            'at_customer': 60,
-            'servicing': 70,
-            'returning': 85,
-            'completed': 100,
-            'delayed': 50,
-        }
-        return status_progress.get(self.current_status, 0)
+        return STATUS_PROGRESS.get(self.current_status, 0)
     
     def __str__(self):
         return f"{self.load_number} - {self.truck_number} - {self.driver_name}"
@@ -378,8 +257,105 @@ class TruckPerformanceData(models.Model):
         return f"{self.month_name} {self.create_date.year}"
 
 
+class Journey(models.Model):
+    """
+    Materialized journey: a depot-departure row completed with the values the other
+    upload types recorded for the same (load_number, truck_number).
+    Maintained by ``journeys.refresh_journeys`` whenever an upload is processed.
+    """
+    departure = models.ForeignKey(TruckPerformanceData, on_delete=models.CASCADE, related_name='journeys')
+
+    # Journey key
+    load_number = models.CharField(max_length=50)
+    truck_number = models.CharField(max_length=50)
+    create_date = models.DateField()
+
+    month_name = models.CharField(max_length=20)
+    transporter = models.CharField(max_length=100)
+    driver_name = models.CharField(max_length=100)
+    customer_name = models.CharField(max_length=200)
+    mode_of_capture = models.CharField(max_length=50, null=True, blank=True)
+
+    # Merged timings
+    dj_departure_time = models.DateTimeField(null=True, blank=True)
+    clockin_time = models.DateTimeField(null=True, blank=True)
+    planned_departure_time = models.DateTimeField(null=True, blank=True)
+    departure_deviation_min = models.IntegerField(null=True, blank=True)
+    ave_departure = models.IntegerField(null=True, blank=True)
+    arrival_at_customer = models.DateTimeField(null=True, blank=True)
+    departure_time_from_customer = models.DateTimeField(null=True, blank=True)
+    service_time_at_customer = models.IntegerField(null=True, blank=True)
+    arrival_at_depot = models.DateTimeField(null=True, blank=True)
+    ave_arrival_time = models.IntegerField(null=True, blank=True)
+
+    # Merged distances and metrics
+    d1 = models.FloatField(null=True, blank=True)
+    d2 = models.FloatField(null=True, blank=True)
+    d3 = models.FloatField(null=True, blank=True)
+    d4 = models.FloatField(null=True, blank=True)
+    comment_ave_tir = models.TextField(null=True, blank=True)
+    current_status = models.CharField(max_length=20, choices=TruckPerformanceData.STATUS_CHOICES, default=metrics.PENDING)
+    total_distance = models.FloatField(null=True, blank=True)
+    total_time = models.FloatField(null=True, blank=True)
+    delivery_time = models.FloatField(null=True, blank=True)
+    efficiency_score = models.FloatField(null=True, blank=True)
+    days_spent = models.IntegerField(null=True, blank=True, help_text="Days from DJ departure to depot arrival")
+
+    # False for Unknown Driver/TRUCK_999, Unknown Customer and pending rows hidden on the dashboard
+    is_reportable = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['load_number', 'truck_number', 'create_date']
+        ordering = ['load_number', '-create_date']
+        # Serves the dashboard's keyset pages (see pagination.JOURNEY_ORDERING)
+        indexes = [
+            models.Index(
+                fields=['-create_date', 'load_number', 'truck_number'], name='journey_page_idx',
+                condition=models.Q(is_reportable=True),
+            ),
+            # Normalized keys the vehicle registration refresh selects journeys by
+            models.Index(Lower(Trim('driver_name')), name='journey_driver_key_idx'),
+            models.Index(Lower(Trim('load_number')), name='journey_load_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.load_number} - {self.truck_number} - {self.create_date}"
+
+    @property
+    def driver_vehicle(self):
+        """Driver name with the vehicle in brackets, as shown on the dashboard."""
+        return f"{self.driver_name} ({self.truck_number})"
+
+
+class VehicleRegistration(models.Model):
+    """
+    Resolved vehicle reg per normalized (driver, load) key, plus driver-only
+    (load_key '') and load-only (driver_key '') fallbacks.
+    Maintained from the Journey table by ``vehicles.refresh_vehicle_registrations``.
+    """
+    driver_key = models.CharField(max_length=100, blank=True, help_text="Trimmed, lowercased driver name")
+    load_key = models.CharField(max_length=50, blank=True, help_text="Trimmed, lowercased load number")
+    truck_number = models.CharField(max_length=50)
+    journey = models.ForeignKey(Journey, on_delete=models.CASCADE, related_name='registrations')
+
+    class Meta:
+        unique_together = ['driver_key', 'load_key']
+        indexes = [models.Index(fields=['load_key'], name='vehiclereg_load_idx')]
+
+    def __str__(self):
+        return f"{self.driver_key or '*'} / {self.load_key or '*'} -> {self.truck_number}"
+
+
 class ProductivitySummary(models.Model):
     """Model to store aggregated productivity metrics"""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, default='month')
     date_range_start = models.DateField()
     date_range_end = models.DateField()
     transporter = models.CharField(max_length=100, blank=True, null=True)
@@ -389,6 +365,7 @@ class ProductivitySummary(models.Model):
     total_distance = models.FloatField(null=True, blank=True)
     total_time = models.FloatField(null=True, blank=True)
     avg_efficiency_score = models.FloatField(null=True, blank=True)
+    scored_loads = models.IntegerField(default=0, help_text="Loads with an efficiency score (weight of the average)")
     
     # Performance metrics
     on_time_deliveries = models.IntegerField(default=0)
@@ -399,6 +376,54 @@ class ProductivitySummary(models.Model):
     
     class Meta:
         ordering = ['-date_range_end']
+        unique_together = ['period', 'date_range_start', 'transporter', 'customer_name']
     
     def __str__(self):
         return f"Summary {self.date_range_start} to {self.date_range_end}"
+
+
+class ExportJob(models.Model):
+    """A report export built in the background and served from storage once finished"""
+    KIND_CHOICES = [
+        ('excel', 'Excel Productivity Report'),
+        ('upload_csv', 'Upload CSV Report'),
+        ('summary', 'Summary Report'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True, help_text="Export filters, e.g. the upload id")
+    data_version = models.CharField(max_length=64, help_text="Data version the file was built from")
+    fingerprint = models.CharField(max_length=64, db_index=True, help_text="Hash of kind, params and data version")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    rows_written = models.IntegerField(default=0)
+    total_rows = models.IntegerField(null=True, blank=True)
+    file = models.FileField(upload_to='exports/', null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+
+class DataVersion(models.Model):
+    """The current data version tokens (see ``cache.get_data_version``), a single row every process reads"""
+    version = models.CharField(max_length=32)
+    delta_version = models.CharField(max_length=32, default='', help_text="Changes only when delta cursors must start over")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.version
@@ -0,0 +1,97 @@
+"""
+Keyset (cursor) pagination for the journey table.
+
+Pages are ordered by (-create_date, load_number, truck_number) — the Journey key,
+so the order is total — and each page is fetched with a ``WHERE`` on the last key
+seen instead of an ``OFFSET``, which keeps every page an index range scan no
+matter how deep the user pages.
+"""
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+
+JOURNEY_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+JOURNEY_ORDERING = ('-create_date', 'load_number', 'truck_number')
+REVERSE_JOURNEY_ORDERING = ('create_date', '-load_number', '-truck_number')
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by ``encode_cursor``."""
+
+
+def encode_cursor(journey):
+    """Opaque cursor for the position of ``journey`` (a Journey or a values() dict)."""
+    get = journey.get if isinstance(journey, dict) else lambda field: getattr(journey, field)
+    key = [get('create_date').isoformat(), get('load_number'), get('truck_number')]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(create_date, load_number, truck_number) of an ``encode_cursor`` value."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        create_date, load_number, truck_number = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.date.fromisoformat(create_date), str(load_number), str(truck_number)
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from err
+
+
+def _after(key):
+    """Rows that come after ``key`` in JOURNEY_ORDERING."""
+    create_date, load_number, truck_number = key
+    return (
+        Q(create_date__lt=create_date)
+        | Q(create_date=create_date, load_number__gt=load_number)
+        | Q(create_date=create_date, load_number=load_number, truck_number__gt=truck_number)
+    )
+
+
+def _before(key):
+    """Rows that come before ``key`` in JOURNEY_ORDERING."""
+    create_date, load_number, truck_number = key
+    return (
+        Q(create_date__gt=create_date)
+        | Q(create_date=create_date, load_number__lt=load_number)
+        | Q(create_date=create_date, load_number=load_number, truck_number__lt=truck_number)
+    )
+
+
+def parse_page_size(value, default=JOURNEY_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Page size from a query parameter, clamped to 1..maximum."""
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(queryset, after=None, before=None, page_size=JOURNEY_PAGE_SIZE):
+    """
+    One page of ``queryset`` in JOURNEY_ORDERING.
+
+    after/before: cursor of the row the page starts after / ends before (at most one).
+    Works on model and ``values()`` querysets alike; the values must include the key fields.
+
+    Returns a dict with ``rows``, ``next_cursor`` and ``previous_cursor`` (None at either end).
+    """
+    if before:
+        rows = list(queryset.filter(_before(decode_cursor(before))).order_by(*REVERSE_JOURNEY_ORDERING)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after:
+            queryset = queryset.filter(_after(decode_cursor(after)))
+        rows = list(queryset.order_by(*JOURNEY_ORDERING)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = bool(after)
+
+    return {
+        'rows': rows,
+        'next_cursor': encode_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': encode_cursor(rows[0]) if rows and has_previous else None,
+    }
@@ -0,0 +1,171 @@
+"""
+Streaming readers for uploaded files.
+
+``read_upload_chunks`` yields an upload as DataFrames of at most
+``settings.UPLOAD_CHUNK_SIZE`` rows, so a large file never has to fit in memory
+at once. Only the columns the upload type's builder reads are kept (see
+``schemas.SCHEMAS``) and every kept column is read as text: the
+ingestion parsers do the typing, and no per-chunk dtype inference can make two
+chunks of the same file disagree. ``.xlsx`` files are read row by row with
+openpyxl's read-only mode. Uploads are read from their storage through
+``local_upload_path``, so workers on another host can process them when the
+media storage is shared.
+"""
+import contextlib
+import math
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+
+from .ingestion import UPLOAD_COLUMNS, driver_vehicle_map
+from .schemas import SCHEMAS
+
+
+def upload_chunk_size():
+    """Rows per chunk (``settings.UPLOAD_CHUNK_SIZE``)."""
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 5000)
+
+
+@contextlib.contextmanager
+def local_upload_path(field_file):
+    """
+    Local path of the stored file ``field_file`` for the duration of the block.
+
+    Files that are not on this machine's disk (e.g. in S3) are copied to a temporary
+    file with the same extension, which is removed afterwards.
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path is not None and os.path.exists(path):
+        yield path
+        return
+    suffix = os.path.splitext(field_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as local, field_file.open('rb') as stored:
+        shutil.copyfileobj(stored, local)
+        local.flush()
+        yield local.name
+
+
+def column_filter(columns):
+    """``usecols`` callable keeping the header names in ``columns`` (case and surrounding spaces ignored)."""
+    if columns is None:
+        return None
+    wanted = {name.lower().strip() for name in columns}
+    return lambda header: str(header).lower().strip() in wanted
+
+
+def _cell_text(value):
+    """Excel cell value as the text ``read_csv(dtype=str)`` would have produced (NaN when empty)."""
+    if value is None or value == '':
+        return math.nan
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _frame(rows, names, offset):
+    """Chunk frame whose index continues from the previous chunk, like read_csv's."""
+    return pd.DataFrame(rows, columns=names, index=range(offset, offset + len(rows)), dtype=object)
+
+
+def _read_xlsx_chunks(path, usecols, chunk_size, sheet):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keep = [index for index, name in enumerate(header) if name is not None and (usecols is None or usecols(name))]
+        names = [str(header[index]) for index in keep]
+        batch, offset = [], 0
+        for row in rows:
+            # Blank lines are skipped, as read_csv does
+            if all(value is None for value in row):
+                continue
+            batch.append([_cell_text(row[index]) if index < len(row) else math.nan for index in keep])
+            if len(batch) >= chunk_size:
+                yield _frame(batch, names, offset)
+                batch, offset = [], offset + len(batch)
+        if batch:
+            yield _frame(batch, names, offset)
+    finally:
+        workbook.close()
+
+
+def _read_chunks(path, usecols, chunk_size, sheet):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xlsx':
+        yield from _read_xlsx_chunks(path, usecols, chunk_size, sheet)
+    elif extension == '.xls':
+        # Legacy workbooks have no streaming reader; read the sheet and hand it out in chunks
+        df = pd.read_excel(path, sheet_name=sheet, dtype=str, usecols=usecols)
+        for start in range(0, max(len(df), 1), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(path, dtype=str, usecols=usecols, chunksize=chunk_size)
+
+
+def read_upload_chunks(path, upload_type=None, chunk_size=None, columns=None, sheet=0):
+    """
+    Yield the rows of the CSV/Excel file at ``path`` as DataFrames of at most ``chunk_size`` rows.
+
+    Columns are limited to ``columns``, or to the ones ``upload_type`` consumes
+    (all columns for an unknown type); headers are stripped. At least one
+    (possibly empty) frame is yielded for a file with a header.
+    """
+    if columns is None:
+        columns = UPLOAD_COLUMNS.get(upload_type)
+    chunk_size = chunk_size or upload_chunk_size()
+    yielded = False
+    for chunk in _read_chunks(path, column_filter(columns), chunk_size, sheet):
+        chunk.columns = chunk.columns.str.strip()
+        yielded = True
+        yield chunk
+    if not yielded:
+        yield pd.DataFrame(columns=[])
+
+
+def file_driver_vehicles(path, chunk_size=None):
+    """Driver → vehicle reg map of a whole depot departures file, read two columns at a time."""
+    columns = SCHEMAS['depot_departures'].header_names('driver_name', 'vehicle_reg')
+    maps = [
+        driver_vehicle_map(chunk)
+        for chunk in read_upload_chunks(path, columns=columns, chunk_size=chunk_size)
+    ]
+    combined = pd.concat(maps) if maps else pd.Series(dtype=object)
+    # Later chunks win, so this is the last reg of each driver in the file
+    return combined[~combined.index.duplicated(keep='last')]
+
+
+def count_upload_rows(path, sheet=0):
+    """
+    Estimated number of data rows of the file at ``path`` (for progress reporting), or None.
+
+    CSV files are counted by line breaks without parsing (quoted line breaks and
+    blank lines count as rows); ``.xlsx`` files use the sheet's recorded dimensions.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xls':
+        return None
+    if extension == '.xlsx':
+        workbook = load_workbook(path, read_only=True)
+        try:
+            worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+            return max(worksheet.max_row - 1, 0) if worksheet.max_row else None
+        finally:
+            workbook.close()
+    lines, last = 0, b'\n'
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
@@ -0,0 +1,215 @@
+"""
+Multi-sheet productivity report.
+
+``load_report_frame`` reads every TruckPerformanceData column the report needs
+(and the resolved vehicle reg) in a single query; the executive summary, the
+detailed rows and the transporter, customer and driver summaries are all derived
+from that frame with grouped aggregation, so the report costs one table scan
+however many sheets it has.
+"""
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from .models import TruckPerformanceData
+from .vehicles import annotate_vehicle_reg
+
+
+REPORT_FRAME_FIELDS = [
+    'create_date', 'month_name', 'transporter', 'load_number', 'driver_name', 'truck_number',
+    'customer_name', 'clockin_time', 'dj_departure_time', 'arrival_at_depot', 'ave_arrival_time',
+    'd1', 'd2', 'd3', 'd4', 'comment_ave_tir', 'total_distance', 'total_time', 'efficiency_score',
+    'vehicle_reg',
+]
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def load_report_frame(queryset=None):
+    """All report columns of ``queryset`` (all rows by default), newest first, in one query."""
+    if queryset is None:
+        queryset = TruckPerformanceData.objects.all()
+    rows = (
+        annotate_vehicle_reg(queryset)
+        .order_by('-create_date', 'transporter', 'load_number')
+        .values_list(*REPORT_FRAME_FIELDS)
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=REPORT_FRAME_FIELDS)
+    # Keep missing values as None so the cells stay empty instead of NaN/NaT
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def _header(ws, names):
+    cells = []
+    for name in names:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+
+def _rounded(value):
+    return round(value or 0, 2)
+
+
+def _grouped(frame, keys, **aggregates):
+    """``frame`` aggregated per ``keys``, busiest first (NULL keys form their own group as in SQL)."""
+    grouped = frame.groupby(keys, dropna=False, sort=True).agg(**aggregates).reset_index()
+    return grouped.sort_values('total_loads', ascending=False, kind='stable')
+
+
+def _group_rows(grouped, columns):
+    """Rows of ``grouped`` as plain Python values, with NaN aggregates as None."""
+    grouped = grouped[columns].astype(object)
+    return grouped.where(grouped.notna(), None).itertuples(index=False, name=None)
+
+
+def create_executive_summary_sheet(ws, frame):
+    """Create executive summary sheet"""
+    title = WriteOnlyCell(ws, value='Truck Productivity Dashboard - Executive Summary')
+    title.font = Font(bold=True, size=16)
+    ws.append([title])
+    ws.append([])
+
+    avg_efficiency = frame['efficiency_score'].dropna().astype(float).mean()
+    total_distance = frame['total_distance'].dropna().astype(float).sum()
+    metrics = [
+        ['Total Loads', len(frame)],
+        ['Total Trucks', frame['truck_number'].nunique()],
+        ['Total Drivers', frame['driver_name'].nunique()],
+        ['Total Customers', frame['customer_name'].nunique()],
+        ['Average Efficiency Score', _rounded(None if pd.isna(avg_efficiency) else float(avg_efficiency))],
+        ['Total Distance (km)', _rounded(float(total_distance))],
+        ['Report Generated', datetime.now().strftime(DATETIME_FORMAT)],
+    ]
+    ws.append(_header(ws, ['Metric', 'Value']))
+    for row in metrics:
+        ws.append(row)
+
+
+def format_time_from_int(time_int):
+    """Minutes since midnight as HH:MM:00."""
+    if time_int is None:
+        return ''
+    try:
+        hours, minutes = divmod(int(time_int), 60)
+        return f"{hours:02d}:{minutes:02d}:00"
+    except (TypeError, ValueError):
+        return str(time_int) if time_int else ''
+
+
+def create_detailed_report_sheet(ws, frame):
+    """Create detailed report sheet with all truck performance data"""
+    ws.append(_header(ws, [
+        'Create Date', 'Month Name', 'Transporter', 'Load Number', 'Mode Of Capture',
+        'Driver Name', 'Truck Number', 'Customer Name', 'Clock-In', 'DJ Departure Time',
+        'Arrival At Depot', 'AVE Arrival Time',
+        'D1', 'D2', 'D3', 'D4', 'Comment Ave TIR',
+        'Total Distance', 'Total Time (hrs)', 'Efficiency (km/h)'
+    ]))
+
+    def timestamp(value):
+        return value.strftime(DATETIME_FORMAT) if value else ''
+
+    for item in frame.itertuples(index=False):
+        ws.append([
+            item.create_date.strftime('%Y-%m-%d') if item.create_date else '',
+            item.month_name or '',
+            item.transporter or '',
+            item.load_number or '',
+            'DJ',  # Set mode of capture to DJ as requested
+            item.driver_name or '',
+            item.vehicle_reg or '',  # Vehicle reg from the registration resolver, never Unknown
+            item.customer_name or '',
+            timestamp(item.clockin_time),
+            timestamp(item.dj_departure_time),
+            timestamp(item.arrival_at_depot),
+            format_time_from_int(item.ave_arrival_time),
+            item.d1 or '',
+            item.d2 or '',
+            item.d3 or '',
+            item.d4 or '',
+            item.comment_ave_tir or '',
+            item.total_distance or '',
+            f"{item.total_time:.2f}" if item.total_time is not None else '',
+            f"{item.efficiency_score:.2f}" if item.efficiency_score is not None else '',
+        ])
+
+
+def _numeric(frame):
+    """``frame`` with the aggregated columns as floats (NaN for missing)."""
+    return frame.assign(
+        total_distance=pd.to_numeric(frame['total_distance']),
+        efficiency_score=pd.to_numeric(frame['efficiency_score']),
+    )
+
+
+def create_transporter_summary_sheet(ws, frame):
+    """Create transporter summary sheet"""
+    ws.append(_header(ws, ['Transporter', 'Total Loads', 'Total Distance', 'Average Efficiency', 'Total Drivers']))
+    grouped = _grouped(
+        _numeric(frame), ['transporter'],
+        total_loads=('load_number', 'size'),
+        total_distance=('total_distance', 'sum'),
+        avg_efficiency=('efficiency_score', 'mean'),
+        total_drivers=('driver_name', 'nunique'),
+    )
+    columns = ['transporter', 'total_loads', 'total_distance', 'avg_efficiency', 'total_drivers']
+    for transporter, loads, distance, efficiency, drivers in _group_rows(grouped, columns):
+        ws.append([transporter, loads, _rounded(distance), _rounded(efficiency), drivers])
+
+
+def create_customer_summary_sheet(ws, frame):
+    """Create customer summary sheet"""
+    ws.append(_header(ws, ['Customer Name', 'Total Loads', 'Total Distance', 'Average Efficiency']))
+    grouped = _grouped(
+        _numeric(frame), ['customer_name'],
+        total_loads=('load_number', 'size'),
+        total_distance=('total_distance', 'sum'),
+        avg_efficiency=('efficiency_score', 'mean'),
+    )
+    columns = ['customer_name', 'total_loads', 'total_distance', 'avg_efficiency']
+    for customer, loads, distance, efficiency in _group_rows(grouped, columns):
+        ws.append([customer, loads, _rounded(distance), _rounded(efficiency)])
+
+
+def create_driver_performance_sheet(ws, frame):
+    """Create driver performance sheet"""
+    ws.append(_header(ws, [
+        'Driver Name', 'Truck Number', 'Total Loads', 'Total Distance', 'Average Efficiency', 'Total Customers',
+    ]))
+    grouped = _grouped(
+        _numeric(frame), ['driver_name', 'truck_number'],
+        total_loads=('load_number', 'size'),
+        total_distance=('total_distance', 'sum'),
+        avg_efficiency=('efficiency_score', 'mean'),
+        total_customers=('customer_name', 'nunique'),
+    )
+    columns = ['driver_name', 'truck_number', 'total_loads', 'total_distance', 'avg_efficiency', 'total_customers']
+    for driver, truck, loads, distance, efficiency, customers in _group_rows(grouped, columns):
+        ws.append([driver, truck, loads, _rounded(distance), _rounded(efficiency), customers])
+
+
+REPORT_SHEETS = [
+    ('Executive Summary', create_executive_summary_sheet),
+    ('Detailed Report', create_detailed_report_sheet),
+    ('Transporter Summary', create_transporter_summary_sheet),
+    ('Customer Summary', create_customer_summary_sheet),
+    ('Driver Performance', create_driver_performance_sheet),
+]
+
+
+def write_summary_report(fileobj, queryset=None):
+    """
+    Write the five-sheet report of ``queryset`` to ``fileobj`` (openpyxl write-only mode).
+
+    Returns the number of detailed rows written.
+    """
+    frame = load_report_frame(queryset)
+    wb = Workbook(write_only=True)
+    for title, create_sheet in REPORT_SHEETS:
+        create_sheet(wb.create_sheet(title), frame)
+    wb.save(fileobj)
+    return len(frame)
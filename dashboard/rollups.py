@@ -0,0 +1,161 @@
+"""
+Rollup engine for ProductivitySummary.
+
+TruckPerformanceData is aggregated per day, week and month × transporter × customer.
+After an upload only the buckets covering the dates that upload touched are
+recomputed; charts and summary sheets then aggregate the (much smaller) rollup
+table instead of the raw rows when ``settings.USE_PRODUCTIVITY_ROLLUPS`` is on.
+"""
+import calendar
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DateField, ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.functions import NullIf, Trunc
+
+from .models import ProductivitySummary, TruckPerformanceData
+
+
+PERIODS = ['day', 'week', 'month']
+# Arrivals at the depot within this margin of the planned arrival count as on time
+ON_TIME_TOLERANCE = datetime.timedelta(minutes=30)
+BUCKET_CHUNK_SIZE = 200
+
+
+def rollups_enabled():
+    """Whether charts and summary sheets read ProductivitySummary instead of raw rows."""
+    return getattr(settings, 'USE_PRODUCTIVITY_ROLLUPS', True)
+
+
+def bucket_bounds(period, day):
+    """(start, end) dates of the ``period`` bucket containing ``day``."""
+    if period == 'day':
+        return day, day
+    if period == 'week':
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=6)
+    start = day.replace(day=1)
+    return start, day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _bucket_rows(queryset, period):
+    """Rollup values of ``queryset`` per bucket × transporter × customer, keyed by summary field."""
+    planned = F('planned_arrival_time')
+    has_plan = Q(arrival_at_depot__isnull=False, planned_arrival_time__isnull=False)
+    aggregates = {
+        'total_loads': Count('id'),
+        'total_distance': Sum('total_distance'),
+        'total_time': Sum('total_time'),
+        'avg_efficiency_score': Avg('efficiency_score'),
+        'scored_loads': Count('efficiency_score'),
+        'early_deliveries': Count('id', filter=has_plan & Q(arrival_at_depot__lt=planned - ON_TIME_TOLERANCE)),
+        'delayed_deliveries': Count('id', filter=has_plan & Q(arrival_at_depot__gt=planned + ON_TIME_TOLERANCE)),
+        'on_time_deliveries': Count('id', filter=has_plan & Q(
+            arrival_at_depot__gte=planned - ON_TIME_TOLERANCE,
+            arrival_at_depot__lte=planned + ON_TIME_TOLERANCE,
+        )),
+    }
+    rows = (
+        queryset
+        .annotate(bucket=Trunc('create_date', period, output_field=DateField()))
+        .values('bucket', 'transporter', 'customer_name')
+        # Prefixed aliases: several summary fields share their name with TruckPerformanceData fields
+        .annotate(**{f'rollup_{name}': aggregate for name, aggregate in aggregates.items()})
+        .order_by()
+    )
+    for row in rows:
+        yield {name.removeprefix('rollup_'): value for name, value in row.items()}
+
+
+def refresh_rollups(dates):
+    """
+    Recompute every day/week/month bucket that contains one of ``dates``.
+
+    Buckets are rebuilt whole (all transporters and customers) so rows whose
+    transporter or customer changed in the upload move to the right bucket.
+    Returns the number of summary rows written.
+    """
+    dates = set(dates)
+    written = 0
+    with transaction.atomic():
+        for period in PERIODS:
+            buckets = sorted({bucket_bounds(period, day) for day in dates})
+            for start in range(0, len(buckets), BUCKET_CHUNK_SIZE):
+                chunk = buckets[start:start + BUCKET_CHUNK_SIZE]
+                ProductivitySummary.objects.filter(
+                    period=period, date_range_start__in=[bucket_start for bucket_start, _end in chunk],
+                ).delete()
+                in_buckets = Q()
+                for bucket_start, bucket_end in chunk:
+                    in_buckets |= Q(create_date__range=(bucket_start, bucket_end))
+                summaries = []
+                for row in _bucket_rows(TruckPerformanceData.objects.filter(in_buckets), period):
+                    bucket_start, bucket_end = bucket_bounds(period, row.pop('bucket'))
+                    summaries.append(ProductivitySummary(
+                        period=period, date_range_start=bucket_start, date_range_end=bucket_end, **row,
+                    ))
+                ProductivitySummary.objects.bulk_create(summaries)
+                written += len(summaries)
+    return written
+
+
+def refresh_rollups_for_upload(csv_upload, previous_dates=()):
+    """
+    Refresh the buckets of the dates a processed upload wrote to.
+
+    previous_dates: the dates the upload moved existing rows away from (see
+    ``bulk_upsert_performance_data``), whose buckets still count those rows.
+    """
+    dates = set(
+        TruckPerformanceData.objects
+        .filter(csv_upload=csv_upload)
+        .values_list('create_date', flat=True)
+        .distinct()
+    )
+    return refresh_rollups(dates | set(previous_dates))
+
+
+def rebuild_all_rollups():
+    """Recompute every bucket from scratch, e.g. after bulk fixes outside the upload flow."""
+    with transaction.atomic():
+        ProductivitySummary.objects.all().delete()
+        return refresh_rollups(TruckPerformanceData.objects.values_list('create_date', flat=True).distinct())
+
+
+def _weighted_efficiency():
+    """Average efficiency across buckets, weighted by the loads each bucket scored."""
+    return ExpressionWrapper(
+        Sum(F('avg_efficiency_score') * F('scored_loads')) / NullIf(Sum('scored_loads'), 0),
+        output_field=FloatField(),
+    )
+
+
+def _summed_stats(group_fields, order_by):
+    """Monthly rollups summed per ``group_fields`` as dicts with total_loads, total_distance and avg_efficiency."""
+    rows = (
+        ProductivitySummary.objects.filter(period='month')
+        .values(*group_fields)
+        .annotate(loads=Sum('total_loads'), distance=Sum('total_distance'), efficiency=_weighted_efficiency())
+        .order_by(order_by)
+    )
+    return [
+        dict(
+            {field: row[field] for field in group_fields},
+            total_loads=row['loads'], total_distance=row['distance'], avg_efficiency=row['efficiency'],
+        )
+        for row in rows
+    ]
+
+
+def monthly_stats():
+    """Loads, distance and efficiency per month, oldest first."""
+    return [
+        dict(row, month_name=row['date_range_start'].strftime('%B'))
+        for row in _summed_stats(['date_range_start'], 'date_range_start')
+    ]
+
+
+def grouped_stats(field):
+    """Loads, distance and efficiency per ``transporter`` or ``customer_name``, busiest first."""
+    return _summed_stats([field], '-loads')
@@ -0,0 +1,252 @@
+"""
+Column schemas of the upload types.
+
+Every ``CSVUpload.UPLOAD_TYPES`` entry has one ``UploadSchema`` listing its
+columns: the header aliases each value may come under, how the value is typed
+and what it defaults to. Column names are ``TruckPerformanceData`` field names,
+except for the inputs the frame builders derive fields from (``schedule_date``
+and the like). ``compile_schema`` resolves a schema against a file header once,
+giving a plan that maps each column straight to the header names holding it; the
+plan is cached per header, so the chunks of one file share it and no row is
+ever matched against aliases.
+"""
+from functools import lru_cache
+
+import pandas as pd
+
+from .datetimes import parse_datetime_column
+
+
+LOAD_NUMBER_ALIASES = ['Load Number', 'Load Name', 'Load']
+TRUCK_NUMBER_ALIASES = ['Vehicle Reg', 'Truck Number', 'Vehicle']
+DRIVER_NAME_ALIASES = ['Driver Name', 'DriverName', 'Driver']
+CUSTOMER_NAME_ALIASES = ['Customer Name', 'customer_name', 'Customer']
+
+# How a column's values are typed (see ``CompiledSchema.read``)
+TEXT = 'text'          # str() of each value (NaN becomes 'nan')
+LABEL = 'label'        # the value as read, missing values replaced by the default
+RAW = 'raw'            # the value as read; the default only stands in for an absent column
+NUMERIC = 'numeric'    # float, NaN when the value does not parse
+DATETIME = 'datetime'  # UTC timestamp, NaT (or the default) when the value does not parse
+
+
+class Column:
+    """
+    One column of an upload type.
+
+    aliases: header names the value may come under, in order of preference (header
+    names are also matched case-insensitively). With ``coalesce`` every matching
+    column is read and each row takes its first non-blank value; otherwise the
+    first matching column is used. ``format`` is the strftime format datetimes
+    are tried with instead of sniffing one (see ``datetimes.parse_datetime_column``).
+    """
+
+    def __init__(self, name, aliases, dtype=TEXT, default=None, coalesce=False, format=None):
+        self.name = name
+        self.aliases = list(aliases)
+        self.dtype = dtype
+        self.default = default
+        self.coalesce = coalesce
+        self.format = format
+
+    def __repr__(self):
+        return f'Column({self.name!r}, {self.aliases!r}, {self.dtype!r})'
+
+
+class UploadSchema:
+    """The columns of one upload type."""
+
+    def __init__(self, upload_type, columns):
+        self.upload_type = upload_type
+        self.columns = list(columns)
+
+    def header_names(self, *names):
+        """Every alias of the columns ``names`` (all columns by default), in first-seen order."""
+        aliases = []
+        for column in self.columns:
+            if not names or column.name in names:
+                aliases.extend(alias for alias in column.aliases if alias not in aliases)
+        return aliases
+
+
+def resolve_columns(header, aliases):
+    """Header names matching ``aliases``: exact matches first, then case-insensitive ones."""
+    resolved = [alias for alias in aliases if alias in header]
+    lower_map = {str(name).lower().strip(): name for name in header}
+    for alias in aliases:
+        actual = lower_map.get(alias.lower().strip())
+        if actual is not None and actual not in resolved:
+            resolved.append(actual)
+    return resolved
+
+
+def _constant(index, value):
+    return pd.Series([value] * len(index), index=index, dtype=object)
+
+
+def _is_blank(series):
+    """Mask of missing values (NaN or an empty string)."""
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def _coalesced(df, sources):
+    """First non-blank value of each row across ``sources``, None where all are blank."""
+    result = _constant(df.index, None)
+    missing = pd.Series(True, index=df.index)
+    for source in sources:
+        candidate = df[source]
+        take = missing & ~_is_blank(candidate)
+        if take.any():
+            result = result.where(~take, candidate)
+            missing &= ~take
+        if not missing.any():
+            break
+    return result, missing
+
+
+class CompiledSchema:
+    """An ``UploadSchema`` resolved against one file header."""
+
+    def __init__(self, schema, header):
+        self.schema = schema
+        self.header = tuple(header)
+        # column name -> header names it is read from, most preferred first
+        self.sources = {
+            column.name: resolve_columns(self.header, column.aliases) for column in schema.columns
+        }
+
+    def read(self, df, names=None):
+        """Typed value series of every column (or of ``names``), keyed by column name."""
+        values = {}
+        for column in self.schema.columns:
+            if names is not None and column.name not in names:
+                continue
+            sources = self.sources[column.name]
+            if not sources:
+                series, missing = _constant(df.index, column.default), None
+            elif column.coalesce:
+                series, missing = _coalesced(df, sources)
+            else:
+                series, missing = df[sources[0]], None
+
+            if missing is not None:
+                series = series.where(~missing, column.default)
+            if column.dtype == TEXT:
+                series = series.astype(str)
+            elif column.dtype == LABEL:
+                series = series.fillna(column.default)
+            elif column.dtype == NUMERIC:
+                series = pd.to_numeric(series, errors='coerce')
+            elif column.dtype == DATETIME:
+                series = parse_datetime_column(series, column.format)
+                if column.default is not None:
+                    series = series.fillna(pd.Timestamp(column.default, tz='UTC'))
+            values[column.name] = series
+        return values
+
+
+SCHEMAS = {schema.upload_type: schema for schema in [
+    UploadSchema('depot_departures', [
+        Column('schedule_date', ['Schedule Date'], DATETIME, default='2025-01-01'),
+        Column('transporter', ['Depot'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES + ['Order No'], default='Unknown', coalesce=True),
+        Column('driver_name', ['Driver Name'], default='Unknown'),
+        Column('truck_number', TRUCK_NUMBER_ALIASES + ['Truck'], default='Unknown', coalesce=True),
+        # The reg a driver is mapped to (see ``ingestion.driver_vehicle_map``)
+        Column('vehicle_reg', ['Vehicle Reg'], default=''),
+        Column('dj_departure_time', ['DJ Departure Time'], DATETIME),
+        Column('departure_deviation_min', ['Departure Time Difference (DJ vs Planned)'], NUMERIC),
+        Column('tlp_vol_hl', ['TLP Vol HL', 'Tlp Vol Hl', 'Volume'], NUMERIC, default=0),
+        Column('planned_arrival_time', ['Planned Arrival Time'], DATETIME),
+        Column('planned_departure_time', ['Planned Departure Time', 'PlannedDepartureTime'], DATETIME),
+    ]),
+    UploadSchema('customer_timestamps', [
+        Column('schedule_date', ['schedule_date'], DATETIME, default='2025-01-01'),
+        Column('transporter', ['Depot'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES + ['load_name'], default='Unknown', coalesce=True),
+        Column('driver_name', ['DriverName'], default='Unknown'),
+        Column('truck_number', TRUCK_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('customer_name', ['customer_name'], default='Unknown'),
+        Column('arrival_at_customer', ['ArrivedAtCustomer(Odo)'], DATETIME),
+        # Time values in this file are minutes
+        Column('service_time_at_customer', ['Total Time Spent @ Customer'], NUMERIC),
+        Column('ave_arrival_time', ['Total Time Spent @ Customer'], NUMERIC),
+        Column('d1', ['Customer Gate To Offloading'], NUMERIC),
+        Column('d2', ['Offloading to Invoice Completion'], NUMERIC),
+    ]),
+    UploadSchema('distance_info', [
+        Column('schedule_date', ['Schedule Date'], DATETIME, default='2025-01-01'),
+        Column('transporter', ['Depot'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('driver_name', ['Driver Name'], default='Unknown'),
+        Column('truck_number', TRUCK_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('customer_name', ['Customer'], default='Unknown'),
+        Column('budgeted_kms', ['Planned Load Distance'], NUMERIC),
+        Column('km_deviation', ['Load Distance Difference (Planned vs. DJ)'], NUMERIC),
+        Column('d1', ['PlannedDistanceToCustomer'], NUMERIC),
+        Column('d4', ['Load Distance Difference (Planned vs. DJ)'], NUMERIC),
+    ]),
+    UploadSchema('timestamps_duration', [
+        Column('schedule_date', ['Date', 'schedule_date'], DATETIME),
+        Column('transporter', ['Transporter', 'Depot'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES + ['load_name'], default='Unknown', coalesce=True),
+        Column('driver_name', DRIVER_NAME_ALIASES, default='Unknown Driver', coalesce=True),
+        Column('truck_number', TRUCK_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('customer_name', CUSTOMER_NAME_ALIASES, default='Unknown Customer', coalesce=True),
+        Column('dj_departure_time', ['Departure Time'], DATETIME),
+        Column('arrival_at_depot', ['Arrival Time', 'ArriveAtDepot(Odo)'], DATETIME),
+        Column('clock_out', ['LoadCompleted', 'Load Completed Time', 'Closure Time'], DATETIME),
+        Column('comment_ave_tir', ['Duration Notes'], RAW, default=''),
+    ]),
+    UploadSchema('time_route_info', [
+        Column('schedule_date', ['Date', 'Schedule Date'], DATETIME),
+        Column('transporter', ['Transporter', 'Depot', 'Depot Code'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('driver_name', DRIVER_NAME_ALIASES, default='Unknown Driver', coalesce=True),
+        Column('truck_number', TRUCK_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('customer_name', CUSTOMER_NAME_ALIASES, default='Unknown Customer', coalesce=True),
+        Column('dj_departure_time', ['Route Start Time'], DATETIME),
+        Column('arrival_at_depot', ['Route End Time'], DATETIME),
+        Column('comment_ave_tir', ['Route Comments'], RAW, default=''),
+    ]),
+    # Average time in route files are no longer offered on the upload form, but old uploads can be reprocessed
+    UploadSchema('avg_time_route', [
+        Column('schedule_date', ['Date'], DATETIME),
+        Column('transporter', ['Transporter', 'Depot'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('driver_name', ['Driver Name'], LABEL, default='Unknown Driver'),
+        Column('truck_number', TRUCK_NUMBER_ALIASES, default='Unknown', coalesce=True),
+        Column('customer_name', ['Customer Name'], LABEL, default='Unknown Customer'),
+        Column('ave_arrival_time', ['Average Arrival Time'], NUMERIC),
+        Column('comment_ave_tir', ['Time Comments'], RAW, default=''),
+    ]),
+    UploadSchema('other', [
+        Column('schedule_date', ['schedule_date', 'Create Date', 'Date'], DATETIME),
+        Column('transporter', ['Transporter', 'Depot', 'Company'], LABEL, default='Unknown'),
+        Column('load_number', LOAD_NUMBER_ALIASES[:2] + ['Load Name 1', 'Load', 'ID'], default='Unknown', coalesce=True),
+        Column('driver_name', DRIVER_NAME_ALIASES, default='Unknown Driver', coalesce=True),
+        Column('truck_number', TRUCK_NUMBER_ALIASES + ['Truck'], default='Unknown', coalesce=True),
+        Column('customer_name', CUSTOMER_NAME_ALIASES, default='Unknown Customer', coalesce=True),
+        Column('comment_ave_tir', ['Comments', 'Notes'], default=''),
+    ]),
+]}
+
+
+def get_schema(upload_type):
+    """Schema of ``upload_type``; unknown types use the generic 'other' schema."""
+    return SCHEMAS.get(upload_type, SCHEMAS['other'])
+
+
+@lru_cache(maxsize=256)
+def _compile(upload_type, header):
+    return CompiledSchema(get_schema(upload_type), header)
+
+
+def compile_schema(upload_type, header):
+    """The cached plan of ``upload_type`` for a file whose columns are ``header``."""
+    return _compile(upload_type, tuple(header))
+
+
+def read_columns(df, upload_type, names=None):
+    """Typed column values of the rows of ``df`` (see ``CompiledSchema.read``)."""
+    return compile_schema(upload_type, df.columns).read(df, names)
@@ -0,0 +1,101 @@
+"""
+Fleet simulation, for demos and as a load generator for the tracking endpoints.
+
+``simulate_tick`` walks the trucks that are not completed in id order and moves
+each one to its next journey stage with probability ``advance`` by setting the
+timestamp that stage is derived from, so ``metrics.derive_status`` stays the
+only source of status values. The draws come from one ``random.Random`` in a
+fixed order, so the same seed over the same data makes the same moves. Moved
+trucks are written a batch at a time with ``save_with_derived_metrics``, which
+also moves their ``updated_at`` for the status poller and feed and refreshes
+their journeys, the rollups and the data version of the charts. The batches are written in id
+order with one ``updated_at``, so the pollers' delta cursors stay valid.
+"""
+from collections import Counter
+
+from django.utils import timezone
+
+from .bulk_upsert import save_with_derived_metrics
+from .metrics import (
+    AT_CUSTOMER, COMPLETED, DELAYED, DEPARTED, INPUT_FIELDS, IN_TRANSIT, PENDING, RETURNING, SERVICING,
+    derive_status,
+)
+from .models import TruckPerformanceData
+
+
+SIMULATED_FIELDS = [
+    'dj_departure_time', 'arrival_at_customer', 'service_time_at_customer', 'departure_time_from_customer',
+    'arrival_at_depot',
+]
+SIMULATION_BATCH_SIZE = 1000
+SERVICE_MINUTES = (15, 90)
+
+
+def _depart(truck, now, rng):
+    truck.dj_departure_time = now
+
+
+def _arrive_at_customer(truck, now, rng):
+    truck.arrival_at_customer = now
+
+
+def _start_service(truck, now, rng):
+    truck.service_time_at_customer = rng.randint(*SERVICE_MINUTES)
+
+
+def _leave_customer(truck, now, rng):
+    truck.departure_time_from_customer = now
+
+
+def _arrive_at_depot(truck, now, rng):
+    truck.arrival_at_depot = now
+
+
+# What moves a truck out of each status (a delayed truck departs now)
+NEXT_STAGE = {
+    PENDING: _depart,
+    DELAYED: _depart,
+    DEPARTED: _arrive_at_customer,
+    IN_TRANSIT: _arrive_at_customer,
+    AT_CUSTOMER: _start_service,
+    SERVICING: _leave_customer,
+    RETURNING: _arrive_at_depot,
+}
+
+
+def current_stage(truck, now):
+    """Status of a truck at ``now`` from its timestamps."""
+    return derive_status(
+        truck.dj_departure_time, truck.arrival_at_customer, truck.departure_time_from_customer,
+        truck.arrival_at_depot, truck.service_time_at_customer, now,
+    )
+
+
+def simulate_tick(rng, advance=0.3, now=None, batch_size=SIMULATION_BATCH_SIZE):
+    """
+    Advance the fleet by one tick.
+
+    rng: a ``random.Random``; advance: chance of each truck moving to its next stage.
+    Returns a Counter of the statuses the moved trucks reached.
+    """
+    now = now or timezone.now()
+    trucks = TruckPerformanceData.objects.exclude(current_status=COMPLETED).only(
+        'id', 'load_number', 'create_date', 'current_status', *INPUT_FIELDS,
+    )
+    reached = Counter()
+    last_id = 0
+    while True:
+        batch = list(trucks.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        moved = []
+        for truck in batch:
+            move = NEXT_STAGE.get(current_stage(truck, now))
+            if move is None or rng.random() >= advance:
+                continue
+            move(truck, now, rng)
+            moved.append(truck)
+        save_with_derived_metrics(moved, fields=SIMULATED_FIELDS, now=now, reset_deltas=False)
+        reached.update(truck.current_status for truck in moved)
+    return reached
@@ -0,0 +1,50 @@
+"""
+Bulk refresh of journey statuses.
+
+A status depends on the clock as well as the timestamps (a departure in the
+future is ``delayed`` until it passes), so the ``current_status`` stored on write
+goes stale. ``refresh_statuses`` recomputes it for a whole table in one
+``UPDATE ... SET current_status = CASE ...`` that only matches the rows whose
+status changes, and moves their ``updated_at`` so the tracking poller and status
+feed pick the changes up. ``status_expression`` is ``metrics.derive_status`` in
+SQL; run it with ``manage.py refresh_truck_status`` (``--loop`` or from cron).
+"""
+from django.db import transaction
+from django.db.models import Case, CharField, Q, Value, When
+from django.utils import timezone
+
+from .metrics import AT_CUSTOMER, COMPLETED, DELAYED, IN_TRANSIT, PENDING, RETURNING, SERVICING
+from .models import Journey, TruckPerformanceData
+
+
+STATUS_MODELS = [TruckPerformanceData, Journey]
+
+
+def status_expression(now):
+    """``derive_status`` of each row at ``now`` as a SQL expression (first matching branch wins)."""
+    return Case(
+        When(dj_departure_time__isnull=True, then=Value(PENDING)),
+        When(arrival_at_depot__isnull=False, then=Value(COMPLETED)),
+        When(dj_departure_time__gt=now, then=Value(DELAYED)),
+        When(departure_time_from_customer__isnull=False, then=Value(RETURNING)),
+        When(Q(arrival_at_customer__isnull=False, service_time_at_customer__gt=0), then=Value(SERVICING)),
+        When(arrival_at_customer__isnull=False, then=Value(AT_CUSTOMER)),
+        default=Value(IN_TRANSIT), output_field=CharField(),
+    )
+
+
+def refresh_statuses(now=None, models=None):
+    """
+    Store the status of every row at ``now`` (default: the current time), writing only changed rows.
+
+    Returns {model name: rows updated}.
+    """
+    now = now or timezone.now()
+    expression = status_expression(now)
+    updated = {}
+    with transaction.atomic():
+        for model in models or STATUS_MODELS:
+            updated[model.__name__] = model.objects.exclude(current_status=expression).update(
+                current_status=expression, updated_at=now,
+            )
+    return updated
@@ -0,0 +1,187 @@
+"""
+In-process change feed of truck statuses, pushed to the tracking page as server-sent events.
+
+One ``StatusFeed`` per process reads the rows changed since its last read with
+the status API's delta query (``tracking.status_page``), keeps the status and
+timestamps it last saw for every truck and publishes an event for each truck
+whose values actually changed (uploads, ``refresh_truck_status``, admin edits all
+move ``updated_at``). There is no background thread: a streaming viewer that
+finds the feed due reads it, every other viewer waits on the feed's condition
+and receives the same events, so N open tracking pages cost one database read
+per ``settings.STATUS_FEED_INTERVAL`` seconds instead of N.
+
+Streams end after ``settings.STATUS_STREAM_MAX_SECONDS`` so a WSGI worker is not
+held forever; ``EventSource`` reconnects with ``Last-Event-ID`` and resumes from
+the feed's history, or gets a ``reset`` event when that history is gone.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .tracking import MAX_STATUS_PAGE_SIZE, TRUCK_STATUS_FIELDS, status_page
+
+
+# Fields whose change is an event; updated_at moves on any write
+STATUS_EVENT_FIELDS = [field for field in TRUCK_STATUS_FIELDS if field != 'updated_at']
+HEARTBEAT_SECONDS = 15
+
+
+def _status_key(row):
+    return tuple(row[field] for field in STATUS_EVENT_FIELDS)
+
+
+class StatusFeed:
+    """Truck status changes of this process, numbered and kept for ``history`` events."""
+
+    def __init__(self, interval=2.0, history=1000):
+        self.interval = interval
+        self.feed_id = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        self.events = deque(maxlen=history)
+        self.condition = threading.Condition()
+        self._read_lock = threading.Lock()
+        self._last_read = None
+        self._since = None
+        self._known = None
+
+    def _read_changes(self):
+        """Rows changed since the previous read, and whether they are a full snapshot."""
+        rows, full, more = [], None, True
+        while more:
+            page = status_page(since=self._since, page_size=MAX_STATUS_PAGE_SIZE)
+            if full is None:
+                full = not page['delta']
+            rows.extend(page['trucks'])
+            self._since, more = page['since'], page['has_more']
+        return rows, full
+
+    def read(self):
+        """Read the database once and publish the changed trucks. Returns the number of events."""
+        rows, full = self._read_changes()
+        if self._known is None:
+            # First read: the baseline every later change is compared with
+            self._known = {row['id']: _status_key(row) for row in rows}
+            return 0
+        changes = []
+        for row in rows:
+            key = _status_key(row)
+            if self._known.get(row['id']) != key:
+                self._known[row['id']] = key
+                changes.append(('status', row))
+        if full:
+            # A snapshot (new data version) lists every truck; the missing ones were deleted
+            current = {row['id'] for row in rows}
+            for truck_id in [truck_id for truck_id in self._known if truck_id not in current]:
+                del self._known[truck_id]
+                changes.append(('removed', {'id': truck_id}))
+        self.publish(changes)
+        return len(changes)
+
+    def publish(self, changes):
+        """Append ``(event type, data)`` pairs to the feed and wake the waiting viewers."""
+        with self.condition:
+            for event, data in changes:
+                self.sequence += 1
+                self.events.append((self.sequence, event, data))
+            self.condition.notify_all()
+
+    def refresh(self):
+        """Read the database if the feed is due and no other viewer is already reading it."""
+        now = time.monotonic()
+        if self._last_read is not None and now - self._last_read < self.interval:
+            return
+        if not self._read_lock.acquire(blocking=False):
+            return
+        try:
+            self.read()
+        finally:
+            self._last_read = time.monotonic()
+            self._read_lock.release()
+
+    def position(self, last_event_id):
+        """Sequence a stream resumes after, or None when ``last_event_id`` is unknown or too old."""
+        feed_id, _, sequence = (last_event_id or '').partition('-')
+        if feed_id != self.feed_id or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self.condition:
+            oldest = self.events[0][0] if self.events else self.sequence + 1
+            if sequence > self.sequence or sequence < oldest - 1:
+                return None
+        return sequence
+
+    def events_after(self, sequence, timeout):
+        """Events after ``sequence``, waiting up to ``timeout`` seconds (reading the database when due)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.refresh()
+            with self.condition:
+                if self.sequence > sequence:
+                    return [event for event in self.events if event[0] > sequence]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.condition.wait(min(remaining, self.interval))
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """The process-wide feed."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = StatusFeed(
+                interval=getattr(settings, 'STATUS_FEED_INTERVAL', 2.0),
+                history=getattr(settings, 'STATUS_FEED_HISTORY', 1000),
+            )
+        return _feed
+
+
+def format_event(event, data, event_id=None):
+    """One server-sent event."""
+    lines = [f'id: {event_id}'] if event_id else []
+    lines += [f'event: {event}', f'data: {json.dumps(data, cls=DjangoJSONEncoder)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def status_event_stream(last_event_id=None, feed=None, max_seconds=None):
+    """
+    Server-sent event stream of truck status changes.
+
+    Yields ``status`` events (a status API row) and ``removed`` events (``{"id": ...}``);
+    a ``reset`` event tells the page to catch up through the status API because
+    events were missed.
+    """
+    feed = feed or get_feed()
+    if max_seconds is None:
+        max_seconds = getattr(settings, 'STATUS_STREAM_MAX_SECONDS', 300)
+    deadline = time.monotonic() + max_seconds
+    # Ask EventSource to reconnect quickly once this stream ends
+    yield 'retry: 3000\n\n'
+    feed.refresh()
+    sequence = feed.position(last_event_id)
+    if sequence is None:
+        sequence = feed.sequence
+        if last_event_id:
+            yield format_event('reset', {}, f'{feed.feed_id}-{sequence}')
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        events = feed.events_after(sequence, min(HEARTBEAT_SECONDS, remaining))
+        if not events:
+            # Comment line: keeps proxies from closing an idle connection
+            yield ': keep-alive\n\n'
+        elif events[0][0] > sequence + 1:
+            # This viewer fell further behind than the feed's history reaches
+            yield format_event('reset', {})
+        for sequence, event, data in events:
+            yield format_event(event, data, f'{feed.feed_id}-{sequence}')
@@ -1,3 +1,1383 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import load_workbook
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .admin import TruckPerformanceDataAdmin
+from .cache import bump_data_version, cached_fragment, get_data_version
+from .datetimes import parse_datetime_column, sniff_datetime_format, to_datetime_value
+from .export_jobs import request_export, run_queued_jobs
+from .export_utils import HEADER_NAMES, snapshot_available, write_export_workbook, write_snapshot_parquet
+from .ingestion import frame_to_records
+from .kpis import distinct_count, kpi_summary
+from .metrics import (
+    DATETIME_FIELDS, DERIVED_FIELDS, DISTANCE_FIELDS,
+    apply_derived_metrics, derive_frame_metrics, derive_record_metrics, derive_status,
+)
+from .journeys import is_reportable_journey, rebuild_all_journeys, refresh_journeys
+from .models import (
+    CSVUpload, DataVersion, ExportJob, Journey, ProductivitySummary, TruckPerformanceData, VehicleRegistration,
+)
+from .report_builder import REPORT_SHEETS, write_summary_report
+from .readers import read_upload_chunks
+from .rollups import rebuild_all_rollups
+from .schemas import SCHEMAS, compile_schema, read_columns
+from .simulation import simulate_tick
+from .status_engine import refresh_statuses
+from .status_feed import StatusFeed, status_event_stream
+from .tracking import TRUCK_STATUS_FIELDS, active_page, latest_since, status_page, tracking_queryset, with_progress
+from . import upload_jobs
+from .upload_jobs import prerequisites_done, queue_uploads, run_queued_uploads, run_upload_job
+from .vehicles import annotate_vehicle_reg
+from .views import REPORT_HEADER, process_csv_file, report_rows
+
+
+UTC = datetime.timezone.utc
+
+
+def random_metric_inputs(rng):
+    """Random INPUT_FIELDS values, including missing, naive and aware datetimes."""
+    def random_datetime():
+        if rng.random() < 0.3:
+            return None
+        value = datetime.datetime(2025, 1, 1) + datetime.timedelta(
+            seconds=rng.randint(0, 200 * 86400), microseconds=rng.randint(0, 999999))
+        return value.replace(tzinfo=UTC) if rng.random() < 0.5 else value
+
+    def random_float():
+        if rng.random() < 0.3:
+            return None
+        return rng.choice([0.0, rng.uniform(-50, 500), round(rng.uniform(0, 300), 1)])
+
+    values = {field: random_datetime() for field in DATETIME_FIELDS}
+    for field in DISTANCE_FIELDS + ['budgeted_kms', 'total_distance', 'total_time', 'delivery_time', 'efficiency_score']:
+        values[field] = random_float()
+    values['service_time_at_customer'] = None if rng.random() < 0.3 else rng.randint(-5, 90)
+    return values
+
+
+class DerivedMetricsParityTests(TestCase):
+    """save() and the vectorized bulk path must produce identical derived values."""
+
+    now = datetime.datetime(2025, 6, 1, tzinfo=UTC)
+
+    def assertSameValues(self, expected, actual, context):
+        for field in DERIVED_FIELDS:
+            left, right = expected[field], actual[field]
+            if isinstance(left, float) and isinstance(right, float):
+                self.assertEqual(left.hex(), right.hex(), f'{field} differs for {context}')
+            else:
+                self.assertEqual(left, right, f'{field} differs for {context}')
+
+    def test_record_and_frame_paths_agree_on_random_records(self):
+        rng = random.Random(20250601)
+        records = [random_metric_inputs(rng) for _ in range(2000)]
+        frame_values = frame_to_records(derive_frame_metrics(pd.DataFrame(records), now=self.now))
+        for record, vectorized in zip(records, frame_values):
+            self.assertSameValues(derive_record_metrics(record, now=self.now), vectorized, record)
+
+    def test_save_matches_bulk_path(self):
+        rng = random.Random(7)
+        saved, bulk = [], []
+        for index in range(200):
+            values = random_metric_inputs(rng)
+            identity = {
+                'create_date': datetime.date(2025, 1, 1), 'month_name': 'January', 'transporter': 'KLA',
+                'driver_name': 'Driver', 'customer_name': 'Customer', 'truck_number': 'UAX 001',
+            }
+            obj = TruckPerformanceData(load_number=f'S{index}', **identity, **values)
+            obj.save()
+            saved.append(obj)
+            bulk.append(TruckPerformanceData(load_number=f'B{index}', **identity, **values))
+        apply_derived_metrics(bulk)
+        for obj, other in zip(saved, bulk):
+            obj.refresh_from_db()
+            expected = {field: getattr(obj, field) for field in DERIVED_FIELDS}
+            actual = {field: getattr(other, field) for field in DERIVED_FIELDS}
+            # Status depends on the clock; compare it separately against the same instant
+            expected.pop('current_status')
+            actual.pop('current_status')
+            for field in expected:
+                self.assertEqual(expected[field], actual[field], f'{field} differs for {obj.load_number}')
+
+    def test_missing_columns_count_as_none(self):
+        frame = pd.DataFrame([{'d1': 10.0, 'd3': 5.5}])
+        result = frame_to_records(derive_frame_metrics(frame, now=self.now))[0]
+        expected = derive_record_metrics({'d1': 10.0, 'd3': 5.5}, now=self.now)
+        self.assertSameValues(expected, result, 'partial frame')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'asserts SQLite query plans')
+class QueryPlanTests(TestCase):
+    """The dashboard, tracking and export queries must keep using the hot-column indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        TruckPerformanceData.objects.create(
+            csv_upload=upload, load_number='L1', create_date=datetime.date(2025, 3, 1), month_name='March',
+            transporter='KLA', driver_name='Driver', truck_number='UAX 001', customer_name='Customer',
+        )
+
+    def query_plans(self, url):
+        """EXPLAIN QUERY PLAN of every SELECT the view at ``url`` runs, joined into one string."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertIn(response.status_code, (200, 302))
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.extend(row[-1] for row in cursor.fetchall())
+        return '\n'.join(plans)
+
+    def test_dashboard_queries_use_indexes(self):
+        plans = self.query_plans(reverse('dashboard:dashboard'))
+        self.assertIn('journey_page_idx', plans)
+        self.assertIn('perf_created_at_idx', plans)
+
+    def test_kpi_summary_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            kpis = kpi_summary()
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual((kpis['total_loads'], kpis['total_trucks'], kpis['total_drivers']), (1, 1, 1))
+
+    def test_distinct_counts_include_missing_values(self):
+        day = datetime.date(2025, 3, 1)
+        for customer in ['A', 'A', 'B', None, None]:
+            ProductivitySummary.objects.create(
+                period='day', date_range_start=day, date_range_end=day, customer_name=customer,
+            )
+            day += datetime.timedelta(days=1)
+        summaries = ProductivitySummary.objects.all()
+        counts = summaries.aggregate(customers=distinct_count('customer_name'), transporters=distinct_count('transporter'))
+        self.assertEqual(counts['customers'], summaries.values('customer_name').distinct().count())
+        self.assertEqual(counts, {'customers': 3, 'transporters': 1})
+        self.assertEqual(ProductivitySummary.objects.none().aggregate(n=distinct_count('customer_name'))['n'], 0)
+
+    def test_tracking_queries_use_indexes(self):
+        plans = self.query_plans(reverse('dashboard:truck_tracking'))
+        self.assertIn('perf_status_depot_idx', plans)
+        self.assertIn('perf_active_departure_idx', plans)
+
+    def test_export_queries_use_indexes(self):
+        plans = self.query_plans(reverse('dashboard:export_excel'))
+        self.assertIn('perf_date_load_idx', plans)
+
+    def test_upload_type_lookup_uses_indexes(self):
+        plan = TruckPerformanceData.objects.filter(
+            csv_upload__upload_type='depot_departures', load_number__in=['L1'],
+        ).explain()
+        self.assertIn('csvupload_type_idx', plan)
+        # Either load_number-led index will do, as long as it is a search and not a scan
+        self.assertRegex(plan, r'SEARCH dashboard_truckperformancedata USING (COVERING )?INDEX \S+ \(load_number=')
+
+    def test_active_trucks_use_partial_index(self):
+        plan = TruckPerformanceData.objects.exclude(current_status='completed').order_by('-dj_departure_time').explain()
+        self.assertIn('perf_active_departure_idx', plan)
+
+    def test_status_delta_polls_use_updated_index(self):
+        since = latest_since()
+        plans = self.query_plans(reverse('dashboard:truck_status_api') + f'?since={since}')
+        self.assertIn('perf_updated_idx', plans)
+
+
+class JourneyPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        departure = TruckPerformanceData.objects.create(
+            csv_upload=upload, load_number='L1', create_date=datetime.date(2025, 3, 1), month_name='March',
+            transporter='KLA', driver_name='Driver', truck_number='UAX 001', customer_name='Customer',
+        )
+        keys = [
+            (datetime.date(2025, 3, day), load_number, truck_number)
+            for day in (1, 2, 3) for load_number in ('L1', 'L2') for truck_number in ('T1', 'T2')
+        ]
+        Journey.objects.bulk_create([
+            Journey(
+                departure=departure, create_date=create_date, load_number=load_number, truck_number=truck_number,
+                month_name='March', transporter='KLA', driver_name='Driver', customer_name='Customer',
+                is_reportable=(load_number, truck_number) != ('L2', 'T2'),
+            )
+            for create_date, load_number, truck_number in keys
+        ])
+        cls.expected = sorted(
+            [(create_date.isoformat(), load_number, truck_number) for create_date, load_number, truck_number in keys
+             if (load_number, truck_number) != ('L2', 'T2')],
+            key=lambda key: (-datetime.date.fromisoformat(key[0]).toordinal(), key[1], key[2]),
+        )
+        cls.user = User.objects.create_user('viewer', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('dashboard:journeys_api'), {'page_size': 4, **params})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        page['keys'] = [(row['create_date'], row['load_number'], row['truck_number']) for row in page['results']]
+        return page
+
+    def test_cursors_walk_every_reportable_journey_both_ways(self):
+        pages = [self.get_page()]
+        self.assertIsNone(pages[0]['previous_cursor'])
+        while pages[-1]['next_cursor']:
+            pages.append(self.get_page(after=pages[-1]['next_cursor']))
+        self.assertEqual([len(page['keys']) for page in pages], [4, 4, 1])
+        self.assertEqual([key for page in pages for key in page['keys']], self.expected)
+
+        # Walking back from the last page returns the same pages
+        previous = self.get_page(before=pages[-1]['previous_cursor'])
+        self.assertEqual(previous['keys'], pages[1]['keys'])
+        first = self.get_page(before=previous['previous_cursor'])
+        self.assertEqual(first['keys'], pages[0]['keys'])
+        self.assertIsNone(first['previous_cursor'])
+        self.assertEqual(first['next_cursor'], pages[0]['next_cursor'])
+
+    def test_search_and_invalid_cursors(self):
+        page = self.get_page(load_search='l2')
+        self.assertEqual(page['keys'], [key for key in self.expected if key[1] == 'L2'])
+        self.assertIsNone(page['next_cursor'])
+
+        response = self.client.get(reverse('dashboard:journeys_api'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid cursor', response.json()['error'])
+        # The dashboard falls back to the first page
+        response = self.client.get(reverse('dashboard:dashboard'), {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['journeys_by_load']), 9)
+
+
+class ExcelExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        TruckPerformanceData.objects.bulk_create([
+            TruckPerformanceData(
+                csv_upload=upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1 + i), month_name='March',
+                transporter='KLA', driver_name=f'Driver {i}', truck_number='Unknown' if i == 4 else f'UAX 00{i}',
+                customer_name='A customer with a long name', tlp_vol_hl=12.5,
+                dj_departure_time=datetime.datetime(2025, 3, 1 + i, 5, 30, tzinfo=UTC),
+            )
+            for i in range(5)
+        ])
+
+    def read_workbook(self, content):
+        sheet = load_workbook(io.BytesIO(content))['Truck Productivity Data']
+        return sheet, [list(row) for row in sheet.iter_rows(values_only=True)]
+
+    def test_workbook_streams_every_row(self):
+        buffer = io.BytesIO()
+        progress = []
+        written = write_export_workbook(
+            TruckPerformanceData.objects.order_by('create_date'), buffer, chunk_size=2, progress=progress.append,
+        )
+        self.assertEqual(written, 5)
+        self.assertEqual(progress, [2, 4])
+
+        sheet, rows = self.read_workbook(buffer.getvalue())
+        self.assertEqual(rows[0], HEADER_NAMES)
+        self.assertTrue(sheet['A1'].font.bold)
+        self.assertEqual(sheet['A1'].fill.start_color.rgb, '00FFD966')
+        self.assertEqual([row[3] for row in rows[1:]], ['L0', 'L1', 'L2', 'L3', 'L4'])
+        self.assertEqual(rows[1][:9], [
+            '2025-03-01', 'March', 'KLA', 'L0', None, 'Driver 0', 'UAX 000', 'A customer with a long name', 12.5,
+        ])
+        self.assertEqual(rows[1][HEADER_NAMES.index('Dj Departure Time')], '2025-03-01 05:30:00')
+        # Without a registration the row's own truck number is exported
+        self.assertEqual(rows[5][HEADER_NAMES.index('Vehicle Reg')], 'Unknown')
+        # Widths fit the longest of the header and the sampled values
+        self.assertEqual(sheet.column_dimensions['H'].width, len('A customer with a long name') + 2)
+        self.assertEqual(sheet.column_dimensions['A'].width, len('Create Date') + 2)
+
+    def test_export_view_returns_the_workbook(self):
+        response = self.client.get(reverse('dashboard:export_excel'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Truck_Productivity_Report_', response['Content-Disposition'])
+        _, rows = self.read_workbook(b''.join(response.streaming_content))
+        self.assertEqual([row[3] for row in rows[1:]], ['L0', 'L1', 'L2', 'L3', 'L4'])
+
+        TruckPerformanceData.objects.all().delete()
+        response = self.client.get(reverse('dashboard:export_excel'))
+        self.assertRedirects(response, reverse('dashboard:bulk_upload'), fetch_redirect_response=False)
+
+
+class StreamingReportTests(TestCase):
+    """The streamed CSV report must match the buffered format it replaced byte for byte."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reporter', password='secret')
+        cls.upload = CSVUpload.objects.create(
+            name='depot march', upload_type='depot_departures', file='uploads/depot.csv', processed=True,
+        )
+        rng = random.Random(11)
+        for index in range(60):
+            values = random_metric_inputs(rng)
+            TruckPerformanceData.objects.create(
+                csv_upload=cls.upload, load_number=f'L{index:03d}', create_date=datetime.date(2025, 3, 1 + index % 28),
+                month_name='March', transporter=f'T{index % 3}', driver_name=rng.choice(['Driver, "A"', 'Unknown Driver']),
+                truck_number=rng.choice(['UAX 001', 'TRUCK_999']), customer_name=rng.choice(['Customer', 'Unknown Customer']),
+                **values,
+            )
+
+    def buffered_report(self, data_qs):
+        """The report as the buffered HttpResponse implementation wrote it."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(REPORT_HEADER)
+        for obj in data_qs:
+            days_spent = ''
+            if obj.dj_departure_time and obj.arrival_at_depot:
+                days_spent = (obj.arrival_at_depot - obj.dj_departure_time).days
+            writer.writerow([
+                obj.create_date, obj.month_name, obj.transporter, obj.load_number, obj.driver_name, obj.truck_number,
+                obj.customer_name, obj.dj_departure_time, getattr(obj, 'clockin_time', ''), obj.arrival_at_customer,
+                obj.arrival_at_depot, days_spent, getattr(obj, 'departure_time_from_customer', ''), obj.total_distance,
+                obj.total_time, obj.delivery_time, obj.efficiency_score, obj.current_status,
+            ])
+        return buffer.getvalue()
+
+    def test_streamed_report_matches_buffered_format(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard:download_report', args=[self.upload.id]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="report_depot_march.csv"')
+        streamed = b''.join(response.streaming_content).decode()
+
+        data_qs = TruckPerformanceData.objects.filter(csv_upload=self.upload) \
+            .exclude(driver_name='Unknown Driver', truck_number='TRUCK_999') \
+            .exclude(customer_name='Unknown Customer') \
+            .exclude(current_status='Pending Departure')
+        self.assertGreater(data_qs.count(), 0)
+        self.assertEqual(streamed, self.buffered_report(data_qs))
+
+    def test_small_chunks_keep_every_row(self):
+        rows = list(report_rows(TruckPerformanceData.objects.filter(csv_upload=self.upload), chunk_size=7))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual(rows[0], REPORT_HEADER)
+
+
+@override_settings(EXPORT_JOB_RUNNER='queue')
+class ExportJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(User.objects.create_user('exporter', password='secret'))
+        self.upload = CSVUpload.objects.create(
+            name='depot march', upload_type='depot_departures', file='uploads/depot.csv', processed=True,
+        )
+        for index in range(3):
+            TruckPerformanceData.objects.create(
+                csv_upload=self.upload, load_number=f'L{index}', create_date=datetime.date(2025, 3, 1),
+                month_name='March', transporter='KLA', driver_name='Driver', truck_number=f'T{index}',
+                customer_name='Customer', dj_departure_time=timezone.now() - datetime.timedelta(hours=5),
+                arrival_at_depot=timezone.now(),
+            )
+        self.url = reverse('dashboard:export_job_create')
+
+    def request_csv(self):
+        response = self.client.post(self.url, {'kind': 'upload_csv', 'upload_id': self.upload.id})
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_jobs_are_reused_polled_and_downloaded(self):
+        job = self.request_csv()
+        self.assertEqual((job['status'], job['download_url']), ('queued', None))
+        # The same export from another process (its own cache) finds the same job
+        cache.clear()
+        self.assertEqual(self.request_csv()['id'], job['id'])
+
+        self.assertEqual(run_queued_jobs(), 1)
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual((status['status'], status['progress'], status['rows_written']), ('completed', 100, 3))
+
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="report_depot_march.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(download.streaming_content).decode())))
+        self.assertEqual(rows[0], REPORT_HEADER)
+        self.assertEqual([row[3] for row in rows[1:]], ['L0', 'L1', 'L2'])
+
+        # The finished file is reused until the data changes
+        self.assertEqual(self.request_csv()['id'], job['id'])
+        bump_data_version()
+        self.assertNotEqual(self.request_csv()['id'], job['id'])
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+    def test_stale_and_failed_jobs_are_rerun(self):
+        running = request_export('excel')
+        self.assertEqual(request_export('excel'), running)
+        ExportJob.objects.filter(pk=running.pk).update(
+            status='running', started_at=timezone.now() - datetime.timedelta(hours=2),
+        )
+        rerun = request_export('excel')
+        self.assertNotEqual(rerun, running)
+
+        ExportJob.objects.filter(pk=rerun.pk).update(status='failed')
+        retried = request_export('excel')
+        self.assertNotIn(retried.pk, [running.pk, rerun.pk])
+        self.assertEqual(run_queued_jobs(), 1)
+        retried.refresh_from_db()
+        self.assertEqual(retried.status, 'completed')
+        self.assertTrue(retried.file.storage.exists(retried.file.name))
+
+    def test_invalid_upload_ids(self):
+        for upload_id in ['abc', '', '1.5']:
+            response = self.client.post(self.url, {'kind': 'upload_csv', 'upload_id': upload_id})
+            self.assertEqual(response.status_code, 400, upload_id)
+        self.assertEqual(self.client.post(self.url, {'kind': 'upload_csv'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'kind': 'upload_csv', 'upload_id': 9999}).status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'kind': 'nope'}).status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_queued_exports_are_stored_where_the_web_process_reads_them(self):
+        # The worker and the web process only share the default storage
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        self.enterContext(override_settings(STORAGES=storages))
+        job = self.request_csv()
+        self.assertEqual(run_queued_jobs(), 1)
+        self.assertEqual(self.request_csv()['id'], job['id'])
+        status = self.client.get(job['status_url']).json()
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(next(csv.reader(io.StringIO(b''.join(download.streaming_content).decode()))), REPORT_HEADER)
+
+    @override_settings(EXPORT_JOB_RUNNER='off')
+    def test_reports_page_offers_direct_downloads_without_background_exports(self):
+        self.assertEqual(self.client.post(self.url, {'kind': 'excel'}).status_code, 503)
+        self.assertFalse(ExportJob.objects.exists())
+
+        page = self.client.get(reverse('dashboard:reports'))
+        self.assertNotContains(page, 'background-export"')
+        self.assertContains(page, reverse('dashboard:export_summary'))
+        response = self.client.get(reverse('dashboard:export_summary'))
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, [title for title, _ in REPORT_SHEETS])
+
+
+class SummaryReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        for index in range(12):
+            TruckPerformanceData.objects.create(
+                csv_upload=upload, create_date=datetime.date(2025, 3, 1 + index % 4), month_name='March',
+                transporter=f'T{index % 3}', load_number=f'L{index}', driver_name=f'Driver {index % 5}',
+                truck_number=f'UAX {index % 4}', customer_name=f'Customer {index % 2}',
+                total_distance=None if index % 6 == 0 else 10.0 * index, efficiency_score=None if index % 4 == 0 else index,
+            )
+
+    def test_all_sheets_come_from_one_query(self):
+        buffer = io.BytesIO()
+        with CaptureQueriesContext(connection) as queries:
+            rows = write_summary_report(buffer)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(rows, 12)
+
+        workbook = load_workbook(buffer)
+        self.assertEqual(workbook.sheetnames, [title for title, _create in REPORT_SHEETS])
+        self.assertEqual(workbook['Detailed Report'].max_row, 13)
+
+        transporters = {row[0]: row for row in workbook['Transporter Summary'].iter_rows(min_row=2, values_only=True)}
+        expected = TruckPerformanceData.objects.filter(transporter='T1')
+        self.assertEqual(transporters['T1'][1], expected.count())
+        self.assertEqual(transporters['T1'][2], round(sum(row.total_distance or 0 for row in expected), 2))
+        self.assertEqual(transporters['T1'][4], expected.values('driver_name').distinct().count())
+
+        summary = {row[0]: row[1] for row in workbook['Executive Summary'].iter_rows(min_row=4, values_only=True)}
+        kpis = kpi_summary()
+        self.assertEqual(summary['Total Trucks'], kpis['total_trucks'])
+        self.assertEqual(summary['Average Efficiency Score'], round(kpis['avg_efficiency'], 2))
+
+
+@unittest.skipUnless(snapshot_available(), 'pyarrow is not installed')
+class ParquetSnapshotTests(TestCase):
+    def test_snapshot_round_trips_typed_columns(self):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        for index in range(6):
+            TruckPerformanceData.objects.create(
+                csv_upload=upload, create_date=datetime.date(2025, 1 + index % 3, 5), month_name='x',
+                transporter='KLA', load_number=f'L{index}', driver_name='Driver', truck_number='UAX 001',
+                customer_name='Customer', dj_departure_time=datetime.datetime(2025, 1, 5, 6, tzinfo=UTC),
+                total_distance=None if index == 0 else 12.5,
+            )
+        rebuild_all_journeys()
+
+        buffer = io.BytesIO()
+        self.assertEqual(write_snapshot_parquet(buffer), 6)
+        buffer.seek(0)
+        frame = pd.read_parquet(buffer)
+        self.assertEqual(sorted(frame['month'].unique()), ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(str(frame['dj_departure_time'].dtype), 'datetime64[ns, UTC]')
+        self.assertEqual(frame['total_distance'].dtype, 'float64')
+        self.assertEqual(frame['total_distance'].isna().sum(), 1)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def process(self, upload_type, frame):
+        upload = CSVUpload(name=upload_type, upload_type=upload_type)
+        upload.file.save(f'{upload_type}.csv', ContentFile(frame.to_csv(index=False).encode()))
+        self.assertTrue(process_csv_file(upload))
+
+    def loads(self, period, start):
+        summaries = ProductivitySummary.objects.filter(period=period, date_range_start=start)
+        return sum(summaries.values_list('total_loads', flat=True))
+
+    def rollup_values(self):
+        return sorted(ProductivitySummary.objects.values_list(
+            'period', 'date_range_start', 'transporter', 'customer_name', 'total_loads', 'total_distance', 'total_time',
+        ))
+
+    def test_rows_moved_to_another_date_leave_their_old_buckets(self):
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-01', 'Depot': 'KLA', 'Load Name': ['L1', 'L2'], 'Driver Name': ['D1', 'D2'],
+            'Vehicle Reg': ['V1', 'V2'], 'DJ Departure Time': '2025-03-01 05:00',
+        }))
+        self.assertEqual(self.loads('day', datetime.date(2025, 3, 1)), 2)
+
+        # Timing files overwrite the schedule date of the rows they match
+        self.process('timestamps_duration', pd.DataFrame({
+            'Date': '2025-03-04', 'Transporter': 'KLA', 'Load Name': ['L1'], 'Vehicle Reg': ['V1'],
+            'Arrival Time': '2025-03-04 18:00',
+        }))
+        self.assertEqual(TruckPerformanceData.objects.get(load_number='L1').create_date, datetime.date(2025, 3, 4))
+        self.assertEqual(self.loads('day', datetime.date(2025, 3, 1)), 1)
+        self.assertEqual(self.loads('week', datetime.date(2025, 2, 24)), 1)
+        self.assertEqual(self.loads('day', datetime.date(2025, 3, 4)), 1)
+        self.assertEqual(self.loads('week', datetime.date(2025, 3, 3)), 1)
+        self.assertEqual(self.loads('month', datetime.date(2025, 3, 1)), 2)
+
+        incremental = self.rollup_values()
+        rebuild_all_rollups()
+        self.assertEqual(self.rollup_values(), incremental)
+
+
+class UploadMergeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'], 'Driver Name': ['D1'],
+            'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 05:00',
+        }))
+
+    def process(self, upload_type, frame):
+        upload = CSVUpload(name=upload_type, upload_type=upload_type)
+        upload.file.save(f'{upload_type}.csv', ContentFile(frame.to_csv(index=False).encode()))
+        self.assertTrue(process_csv_file(upload))
+
+    def test_placeholders_do_not_overwrite_real_values(self):
+        # No driver, depot or truck columns: the schema fills in 'Unknown' placeholders
+        self.process('customer_timestamps', pd.DataFrame({
+            'schedule_date': '2025-03-04', 'load_name': ['L1'], 'customer_name': ['Shop 1'],
+            'Total Time Spent @ Customer': [30],
+        }))
+        row = TruckPerformanceData.objects.get()
+        self.assertEqual(
+            (row.driver_name, row.transporter, row.truck_number, row.customer_name),
+            ('D1', 'KLA', 'V1', 'Shop 1'),
+        )
+        self.assertEqual(row.service_time_at_customer, 30)
+        self.assertIsNotNone(row.dj_departure_time)
+
+    def test_overwriting_upload_types_write_every_value(self):
+        self.process('timestamps_duration', pd.DataFrame({
+            'Date': '2025-03-04', 'Load Name': ['L1'], 'Vehicle Reg': ['V1'], 'Arrival Time': '2025-03-04 18:00',
+        }))
+        row = TruckPerformanceData.objects.get()
+        self.assertEqual((row.driver_name, row.customer_name), ('Unknown Driver', 'Unknown Customer'))
+        self.assertEqual(row.arrival_at_depot, datetime.datetime(2025, 3, 4, 18, tzinfo=UTC))
+
+
+class JourneyRefreshTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1', 'L2'], 'Driver Name': ['D1', 'D2'],
+            'Vehicle Reg': ['V1', 'V2'], 'DJ Departure Time': '2025-03-04 05:00',
+        }))
+
+    def process(self, upload_type, frame):
+        upload = CSVUpload(name=upload_type, upload_type=upload_type)
+        upload.file.save(f'{upload_type}.csv', ContentFile(frame.to_csv(index=False).encode()))
+        self.assertTrue(process_csv_file(upload))
+
+    def journeys(self):
+        return {
+            (journey.load_number, journey.truck_number): journey
+            for journey in Journey.objects.all()
+        }
+
+    def test_upload_refreshes_only_the_loads_it_touches(self):
+        before = self.journeys()
+        self.assertEqual(set(before), {('L1', 'V1'), ('L2', 'V2')})
+
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'], 'Driver Name': ['D9'],
+            'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 06:00',
+        }))
+        after = self.journeys()
+        self.assertEqual(after['L1', 'V1'].driver_name, 'D9')
+        self.assertEqual(after['L1', 'V1'].dj_departure_time, datetime.datetime(2025, 3, 4, 6, tzinfo=UTC))
+        self.assertNotEqual(after['L1', 'V1'].pk, before['L1', 'V1'].pk)
+        # The journey of the other load is not rewritten
+        self.assertEqual(after['L2', 'V2'].pk, before['L2', 'V2'].pk)
+
+    def test_pending_departures_are_not_reportable(self):
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L3'], 'Driver Name': ['D3'],
+            'Vehicle Reg': ['V3'],
+        }))
+        journeys = self.journeys()
+        self.assertEqual(journeys['L3', 'V3'].current_status, 'pending')
+        self.assertFalse(journeys['L3', 'V3'].is_reportable)
+        delivery = Journey(driver_name='D1', truck_number='V1', customer_name='Shop 1', current_status='pending')
+        self.assertFalse(is_reportable_journey(delivery))
+        delivery.current_status = 'in_transit'
+        self.assertTrue(is_reportable_journey(delivery))
+
+    def test_moved_and_deleted_departures_lose_their_journeys(self):
+        # The re-uploaded departure of L1 left on another truck
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'], 'Driver Name': ['D1'],
+            'Vehicle Reg': ['V9'], 'DJ Departure Time': '2025-03-04 05:00',
+        }))
+        self.assertEqual(set(self.journeys()), {('L1', 'V9'), ('L2', 'V2')})
+
+        TruckPerformanceData.objects.filter(load_number='L2').delete()
+        self.assertEqual(refresh_journeys(['L2']), 0)
+        self.assertEqual(set(self.journeys()), {('L1', 'V9')})
+        self.assertEqual(Journey.objects.count(), rebuild_all_journeys())
+
+
+class VehicleRegistrationTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.process('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'], 'Driver Name': ['Driver One'],
+            'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 05:00',
+        }))
+
+    def process(self, upload_type, frame):
+        upload = CSVUpload(name=upload_type, upload_type=upload_type)
+        upload.file.save(f'{upload_type}.csv', ContentFile(frame.to_csv(index=False).encode()))
+        self.assertTrue(process_csv_file(upload))
+
+    def test_customer_rows_take_the_depot_truck_of_their_load(self):
+        self.process('customer_timestamps', pd.DataFrame({
+            'schedule_date': '2025-03-04', 'load_name': ['L1'], 'Vehicle': ['UBA 001X'], 'customer_name': ['Shop 1'],
+        }))
+        row = TruckPerformanceData.objects.get()
+        self.assertEqual((row.truck_number, row.customer_name), ('V1', 'Shop 1'))
+
+    def test_rows_without_a_departure_keep_their_file_truck(self):
+        self.process('customer_timestamps', pd.DataFrame({
+            'schedule_date': '2025-03-04', 'load_name': ['L7', 'L8'], 'DriverName': [' driver one ', 'Driver Two'],
+            'Vehicle': ['T7', 'T8'], 'customer_name': ['Shop 7', 'Shop 8'],
+        }))
+        rows = annotate_vehicle_reg(TruckPerformanceData.objects.exclude(load_number='L1')).order_by('load_number')
+        # L7 resolves through its driver's registration, L8 matches nothing
+        self.assertEqual(
+            [(row.load_number, row.truck_number, row.vehicle_reg) for row in rows],
+            [('L7', 'T7', 'V1'), ('L8', 'T8', None)],
+        )
+        self.assertEqual(
+            set(VehicleRegistration.objects.values_list('driver_key', 'load_key', 'truck_number')),
+            {('driver one', 'l1', 'V1'), ('driver one', '', 'V1'), ('', 'l1', 'V1')},
+        )
+
+
+class AdminEditTests(TestCase):
+    def test_edits_refresh_journeys_and_rollups(self):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        row = TruckPerformanceData.objects.create(
+            csv_upload=upload, load_number='L1', create_date=datetime.date(2025, 3, 1), month_name='March',
+            transporter='KLA', driver_name='Driver', truck_number='T1', customer_name='Customer',
+        )
+        rebuild_all_journeys()
+        rebuild_all_rollups()
+        model_admin = TruckPerformanceDataAdmin(TruckPerformanceData, admin.site)
+
+        row.customer_name, row.create_date = 'Shop 1', datetime.date(2025, 3, 9)
+        model_admin.save_model(None, row, None, True)
+        journey = Journey.objects.get()
+        self.assertEqual((journey.customer_name, journey.create_date), ('Shop 1', datetime.date(2025, 3, 9)))
+        self.assertEqual(
+            sorted(ProductivitySummary.objects.filter(period='day').values_list('date_range_start', 'customer_name')),
+            [(datetime.date(2025, 3, 9), 'Shop 1')],
+        )
+
+        model_admin.delete_model(None, row)
+        self.assertFalse(Journey.objects.exists())
+        self.assertFalse(ProductivitySummary.objects.exists())
+
+
+class ChartCacheTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return f'charts {self.builds}'
+
+    def test_upload_invalidates_cached_charts(self):
+        self.assertEqual(cached_fragment('charts', self.build), 'charts 1')
+        self.assertEqual(cached_fragment('charts', self.build), 'charts 1')
+
+        depot = pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'], 'Driver Name': ['D1'],
+            'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 05:00',
+        })
+        upload = CSVUpload(name='depot', upload_type='depot_departures')
+        upload.file.save('depot.csv', ContentFile(depot.to_csv(index=False).encode()))
+        self.assertTrue(process_csv_file(upload))
+        self.assertEqual(cached_fragment('charts', self.build), 'charts 2')
+
+    def test_version_is_shared_by_every_process(self):
+        version = get_data_version()
+        # A process with its own, empty cache reads the same version
+        cache.clear()
+        self.assertEqual(get_data_version(), version)
+        self.assertEqual(cached_fragment('charts', self.build), 'charts 1')
+        # A bump made by another process is stored in the database, not in this process's cache
+        DataVersion.objects.update(version='other process')
+        self.assertEqual(get_data_version(), 'other process')
+        self.assertEqual(cached_fragment('charts', self.build), 'charts 2')
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        rows = 60
+        self.depot = pd.DataFrame({
+            'Schedule Date': '2025-03-04', ' Depot ': 'KLA', 'Load Name': [f'L{i}' for i in range(rows)],
+            'Driver Name': [f'D{i % 7}' for i in range(rows)],
+            # Each driver's last vehicle reg is in a later chunk than most of their rows
+            'Vehicle Reg': [f'V{i}' if i % 4 else '' for i in range(rows)],
+            'DJ Departure Time': pd.date_range('2025-03-04 05:00', periods=rows, freq='h').strftime('%Y-%m-%d %H:%M'),
+            'Ignored Column': 'x',
+        })
+
+    def process(self, extension, chunk_size):
+        upload = CSVUpload(name='depot', upload_type='depot_departures')
+        buffer = io.BytesIO()
+        if extension == 'csv':
+            self.depot.to_csv(buffer, index=False)
+        else:
+            self.depot.to_excel(buffer, index=False)
+        upload.file.save(f'depot.{extension}', ContentFile(buffer.getvalue()))
+        self.assertTrue(process_csv_file(upload, chunk_size=chunk_size))
+        rows = sorted(TruckPerformanceData.objects.values_list('load_number', 'truck_number', 'dj_departure_time'))
+        TruckPerformanceData.objects.all().delete()
+        return rows
+
+    def test_chunked_csv_and_xlsx_match_whole_file(self):
+        whole = self.process('csv', chunk_size=1000)
+        self.assertEqual(len(whole), 60)
+        self.assertEqual(self.process('csv', chunk_size=7), whole)
+        self.assertEqual(self.process('xlsx', chunk_size=7), whole)
+
+    def test_reader_keeps_only_consumed_columns(self):
+        buffer = io.StringIO()
+        self.depot.to_csv(buffer, index=False)
+        path = os.path.join(settings.MEDIA_ROOT, 'depot.csv')
+        with open(path, 'w') as handle:
+            handle.write(buffer.getvalue())
+        chunks = list(read_upload_chunks(path, 'depot_departures', chunk_size=25))
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 10])
+        self.assertNotIn('Ignored Column', chunks[0].columns)
+        self.assertIn('Depot', chunks[0].columns)
+        self.assertTrue(all(dtype == object for dtype in chunks[0].dtypes))
+
+
+class SchemaRegistryTests(TestCase):
+    def test_every_upload_type_has_a_schema(self):
+        for upload_type, _ in CSVUpload.UPLOAD_TYPES:
+            self.assertIn(upload_type, SCHEMAS)
+
+    def test_plan_is_compiled_once_per_header(self):
+        header = ('LOAD NAME', 'Order No', 'vehicle reg', 'Schedule Date')
+        plan = compile_schema('depot_departures', header)
+        self.assertIs(compile_schema('depot_departures', list(header)), plan)
+        # Exact header matches come before case-insensitive ones
+        self.assertEqual(plan.sources['load_number'], ['Order No', 'LOAD NAME'])
+        self.assertEqual(plan.sources['truck_number'], ['vehicle reg'])
+        self.assertEqual(plan.sources['dj_departure_time'], [])
+
+    def test_columns_coalesce_and_type_values(self):
+        df = pd.DataFrame({
+            'Load Name': ['L1', None, ' '], 'Order No': ['O1', 'O2', None],
+            'Schedule Date': ['2025-03-04', 'not a date', None], 'TLP Vol HL': ['1.5', 'x', None],
+        }, dtype=object)
+        values = read_columns(df, 'depot_departures')
+        self.assertEqual(list(values['load_number']), ['L1', 'O2', 'Unknown'])
+        self.assertEqual(list(values['schedule_date'].dt.strftime('%Y-%m-%d')), ['2025-03-04', '2025-01-01', '2025-01-01'])
+        self.assertEqual(values['tlp_vol_hl'].iloc[0], 1.5)
+        self.assertTrue(values['tlp_vol_hl'].iloc[1:].isna().all())
+        self.assertEqual(list(values['transporter']), ['Unknown'] * 3)
+
+
+class DatetimeParsingTests(TestCase):
+    def test_column_is_parsed_with_its_sniffed_format(self):
+        # The first value is ambiguous; the rest of the column is clearly day-first
+        values = pd.Series(['04/03/2025 14:00', '13/03/2025 01:00', '04/03/2025 14:00', None, ''], dtype=object)
+        self.assertEqual(sniff_datetime_format(values.dropna()), '%d/%m/%Y %H:%M')
+        parsed = parse_datetime_column(values)
+        self.assertEqual(str(parsed.dtype), 'datetime64[ns, UTC]')
+        self.assertEqual(list(parsed.iloc[:3].dt.strftime('%Y-%m-%d %H:%M')), ['2025-03-04 14:00', '2025-03-13 01:00', '2025-03-04 14:00'])
+        self.assertTrue(parsed.iloc[3:].isna().all())
+
+    def test_mixed_formats_offsets_and_garbage(self):
+        values = pd.Series(['2025-03-04 05:00', '3/5/2025 7:00 PM', '2025-03-04T04:00:00+03:00', 'garbage'], dtype=object)
+        parsed = parse_datetime_column(values)
+        self.assertEqual(
+            list(parsed.iloc[:3].dt.strftime('%Y-%m-%d %H:%M')),
+            ['2025-03-04 05:00', '2025-03-05 19:00', '2025-03-04 01:00'],
+        )
+        self.assertTrue(pd.isna(parsed.iloc[3]))
+        self.assertIsNone(to_datetime_value(parsed.iloc[3]))
+        self.assertEqual(to_datetime_value(parsed.iloc[0]), datetime.datetime(2025, 3, 4, 5, tzinfo=UTC))
+
+    def test_candidate_formats_keep_their_order(self):
+        values = pd.Series(['03/01/25 09:19', '12/31/24 09:35'], dtype=object)
+        parsed = parse_datetime_column(values, formats=['%m/%d/%y %H:%M', '%d/%m/%y %H:%M'])
+        self.assertEqual(list(parsed.dt.strftime('%Y-%m-%d')), ['2025-03-01', '2024-12-31'])
+
+
+@override_settings(UPLOAD_JOB_RUNNER='queue')
+class UploadQueueTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def csv_file(self, name, frame):
+        buffer = io.BytesIO()
+        frame.to_csv(buffer, index=False)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='text/csv')
+
+    def test_bulk_upload_queues_files_and_workers_process_depot_first(self):
+        depot = pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1', 'L2', 'L3'],
+            'Driver Name': ['D1', 'D2', 'D3'], 'Vehicle Reg': ['V1', 'V2', 'V3'], 'DJ Departure Time': '2025-03-04 05:00',
+        })
+        customer = pd.DataFrame({
+            'schedule_date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1', 'L2'],
+            'DriverName': 'D1', 'Vehicle Reg': 'FILE', 'customer_name': 'C1',
+        })
+        # The customer file is queued first, but still waits for the depot departures
+        response = self.client.post(reverse('dashboard:bulk_upload'), {
+            'customer_timestamps_file': self.csv_file('customer.csv', customer),
+            'depot_departures_file': self.csv_file('depot.csv', depot),
+        })
+        self.assertRedirects(response, reverse('dashboard:bulk_upload'))
+        self.assertEqual(set(CSVUpload.objects.values_list('status', flat=True)), {'queued'})
+        self.assertFalse(TruckPerformanceData.objects.exists())
+
+        customer_upload = CSVUpload.objects.get(upload_type='customer_timestamps')
+        self.assertFalse(prerequisites_done(customer_upload))
+        self.assertEqual(run_queued_uploads(limit=1), 1)
+        self.assertEqual(CSVUpload.objects.get(upload_type='depot_departures').status, 'completed')
+        self.assertTrue(prerequisites_done(customer_upload))
+        self.assertEqual(run_queued_uploads(), 1)
+
+        customer_upload.refresh_from_db()
+        self.assertEqual((customer_upload.status, customer_upload.progress), ('completed', 100))
+        self.assertEqual((customer_upload.row_count, customer_upload.total_rows), (2, 2))
+        self.assertTrue(customer_upload.processed)
+        # Customer rows took the trucks of the depot departures
+        self.assertEqual(
+            sorted(TruckPerformanceData.objects.filter(customer_name='C1').values_list('truck_number', flat=True)),
+            ['V1', 'V2'],
+        )
+
+        status = self.client.get(reverse('dashboard:upload_status'), {'ids': customer_upload.id}).json()
+        self.assertEqual([upload['status'] for upload in status['uploads']], ['completed'])
+
+    def test_queued_uploads_are_read_from_storage_without_local_paths(self):
+        # A worker on another host only sees the shared storage, never a local path
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        self.enterContext(override_settings(STORAGES=storages))
+        depot = pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1', 'L2'],
+            'Driver Name': ['D1', 'D2'], 'Vehicle Reg': ['V1', 'V2'], 'DJ Departure Time': '2025-03-04 05:00',
+        })
+        upload = CSVUpload(name='depot', upload_type='depot_departures')
+        upload.file.save('depot.csv', ContentFile(depot.to_csv(index=False).encode()))
+        self.assertFalse(os.path.exists(upload.file.path))
+
+        queue_uploads([upload])
+        self.assertEqual(run_queued_uploads(), 1)
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.row_count, upload.total_rows), ('completed', 2, 2))
+        self.assertEqual(sorted(TruckPerformanceData.objects.values_list('truck_number', flat=True)), ['V1', 'V2'])
+
+    @override_settings(UPLOAD_JOB_RUNNER='inline')
+    def test_inline_runner_processes_files_within_the_request(self):
+        depot = pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'],
+            'Driver Name': ['D1'], 'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 05:00',
+        })
+        customer = pd.DataFrame({
+            'schedule_date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'],
+            'DriverName': 'D1', 'Vehicle Reg': 'FILE', 'customer_name': 'C1',
+        })
+        response = self.client.post(reverse('dashboard:bulk_upload'), {
+            'customer_timestamps_file': self.csv_file('customer.csv', customer),
+            'depot_departures_file': self.csv_file('depot.csv', depot),
+        })
+        self.assertRedirects(response, reverse('dashboard:bulk_upload'))
+        self.assertEqual(set(CSVUpload.objects.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(TruckPerformanceData.objects.get().customer_name, 'C1')
+
+    def test_failed_upload_records_its_error(self):
+        upload = CSVUpload(name='broken', upload_type='depot_departures')
+        upload.file.save('broken.csv', ContentFile(b''))
+        queue_uploads([upload])
+        self.assertEqual(run_queued_uploads(), 0)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'failed')
+        self.assertFalse(upload.processed)
+        self.assertTrue(upload.error)
+
+
+@override_settings(UPLOAD_JOB_RUNNER='thread', UPLOAD_JOB_WORKERS=2)
+class UploadThreadRunnerTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.enterContext(mock.patch.object(upload_jobs, 'PREREQUISITE_POLL_SECONDS', 0.05))
+        # A pool of this test's size, shut down with it
+        self.enterContext(mock.patch.object(upload_jobs, '_executor', None))
+        self.enterContext(mock.patch.dict(upload_jobs._futures, clear=True))
+        self.addCleanup(lambda: upload_jobs._executor and upload_jobs._executor.shutdown())
+        # Threads share the in-memory test database, which fails instead of waiting on a
+        # lock: the workers' queries and this test's take turns
+        self.db_lock = threading.RLock()
+        for name in ['prerequisites_done', 'run_upload_job']:
+            self.enterContext(mock.patch.object(upload_jobs, name, self.locked(getattr(upload_jobs, name))))
+
+    def locked(self, function):
+        def call(*args, **kwargs):
+            with self.db_lock:
+                return function(*args, **kwargs)
+        return call
+
+    def upload(self, upload_type, frame):
+        upload = CSVUpload(name=upload_type, upload_type=upload_type)
+        upload.file.save(f'{upload_type}.csv', ContentFile(frame.to_csv(index=False).encode()))
+        return upload
+
+    def test_uploads_wait_for_prerequisites_queued_by_earlier_requests(self):
+        depot = self.upload('depot_departures', pd.DataFrame({
+            'Schedule Date': '2025-03-04', 'Depot': 'KLA', 'Load Name': ['L1'],
+            'Driver Name': ['D1'], 'Vehicle Reg': ['V1'], 'DJ Departure Time': '2025-03-04 05:00',
+        }))
+        customer = self.upload('customer_timestamps', pd.DataFrame({
+            'schedule_date': '2025-03-04', 'Load Name': ['L1'], 'Vehicle Reg': 'FILE', 'customer_name': 'C1',
+        }))
+        # The depot file is queued by another process and not picked up yet
+        CSVUpload.objects.filter(pk=depot.pk).update(status='queued')
+        queue_uploads([customer])
+        future = upload_jobs._futures[customer.pk][1]
+        time.sleep(0.3)
+        with self.db_lock:
+            self.assertFalse(future.done())
+            self.assertEqual(CSVUpload.objects.get(pk=customer.pk).status, 'queued')
+            # Once the depot file is processed the waiting worker takes the customer file
+            self.assertTrue(run_upload_job(depot.pk))
+        self.assertTrue(future.result(timeout=30))
+        self.assertEqual(TruckPerformanceData.objects.get(customer_name='C1').truck_number, 'V1')
+
+        # An upload of a later request starts once the earlier depot file has finished
+        with self.db_lock:
+            queue_uploads([depot])
+            later = self.upload('distance_info', pd.DataFrame({'Load Name': ['L1'], 'Planned Load Distance': ['120']}))
+            queue_uploads([later])
+        self.assertTrue(upload_jobs._futures[later.pk][1].result(timeout=30))
+        depot.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual((depot.status, later.status), ('completed', 'completed'))
+        self.assertLessEqual(depot.finished_at, later.started_at)
+
+
+class TruckStatusApiTests(TestCase):
+    def setUp(self):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        departed = timezone.now() - datetime.timedelta(hours=2)
+        self.trucks = [
+            TruckPerformanceData.objects.create(
+                csv_upload=upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1), month_name='March',
+                transporter='KLA', driver_name=f'Driver {i}', truck_number=f'UAX {i:03d}', customer_name='Customer',
+                dj_departure_time=departed if i else None,
+            )
+            for i in range(3)
+        ]
+        self.url = reverse('dashboard:truck_status_api')
+
+    def test_snapshot_is_compact_and_unchanged_polls_get_304(self):
+        response = self.client.get(self.url)
+        page = response.json()
+        self.assertFalse(page['delta'])
+        self.assertEqual([truck['id'] for truck in page['trucks']], [truck.id for truck in self.trucks])
+        self.assertEqual(set(page['trucks'][0]), set(TRUCK_STATUS_FIELDS) | {'progress'})
+        self.assertEqual([truck['progress'] for truck in page['trucks']], [0, 40, 40])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_since_returns_only_changed_rows(self):
+        page = self.client.get(self.url).json()
+        self.assertEqual(self.client.get(self.url, {'since': page['since']}).json()['trucks'], [])
+
+        changed = self.trucks[1]
+        changed.arrival_at_depot = timezone.now()
+        changed.save()
+        delta = self.client.get(self.url, {'since': page['since']}).json()
+        self.assertTrue(delta['delta'])
+        self.assertEqual(
+            [(truck['id'], truck['current_status'], truck['progress']) for truck in delta['trucks']],
+            [(changed.id, 'completed', 100)],
+        )
+
+        # A new data version (an upload, clearing the data) sends a full snapshot again
+        bump_data_version()
+        snapshot = self.client.get(self.url, {'since': delta['since']}).json()
+        self.assertFalse(snapshot['delta'])
+        self.assertEqual(len(snapshot['trucks']), 3)
+
+    def test_polls_on_another_process_stay_deltas(self):
+        page = self.client.get(self.url).json()
+        changed = self.trucks[2]
+        changed.arrival_at_depot = timezone.now()
+        changed.save()
+        # Another worker: its own, empty cache, the same data version
+        cache.clear()
+        delta = self.client.get(self.url, {'since': page['since']}).json()
+        self.assertTrue(delta['delta'])
+        self.assertEqual([truck['id'] for truck in delta['trucks']], [changed.id])
+
+    def test_search_and_paging(self):
+        page = self.client.get(self.url, {'search': 'uax 002'}).json()
+        self.assertEqual([truck['load_number'] for truck in page['trucks']], ['L2'])
+
+        first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertTrue(first['has_more'])
+        rest = self.client.get(self.url, {'limit': 2, 'since': first['since']}).json()
+        self.assertFalse(rest['has_more'])
+        self.assertEqual([truck['id'] for truck in first['trucks'] + rest['trucks']], [truck.id for truck in self.trucks])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'since': 'not-a-cursor'}).status_code, 400)
+
+
+class StatusFeedTests(TestCase):
+    def setUp(self):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        self.trucks = [
+            TruckPerformanceData.objects.create(
+                csv_upload=upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1), month_name='March',
+                transporter='KLA', driver_name=f'Driver {i}', truck_number=f'UAX {i:03d}', customer_name='Customer',
+                dj_departure_time=timezone.now() - datetime.timedelta(hours=2),
+            )
+            for i in range(2)
+        ]
+        self.feed = StatusFeed(interval=0.05)
+        self.assertEqual(self.feed.read(), 0)
+
+    def test_only_status_and_timestamp_changes_are_events(self):
+        truck = self.trucks[0]
+        truck.comment_ave_tir = 'no status change'
+        truck.save()
+        self.assertEqual(self.feed.read(), 0)
+
+        truck.arrival_at_depot = timezone.now()
+        truck.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.feed.read(), 1)
+        # The shared data version and the changed rows
+        self.assertEqual(len(queries.captured_queries), 2)
+        sequence, event, data = self.feed.events[-1]
+        self.assertEqual((event, data['id'], data['current_status']), ('status', truck.id, 'completed'))
+
+        removed_id = self.trucks[1].id
+        self.trucks[1].delete()
+        bump_data_version()
+        self.feed.read()
+        self.assertEqual(self.feed.events[-1][1:], ('removed', {'id': removed_id}))
+
+    def test_stream_resumes_from_last_event_id(self):
+        self.feed.publish([('status', {'id': 1})])
+        last_event_id = f'{self.feed.feed_id}-{self.feed.sequence}'
+        truck = self.trucks[1]
+        truck.arrival_at_depot = timezone.now()
+        truck.save()
+        stream = ''.join(status_event_stream(last_event_id, feed=self.feed, max_seconds=0.2))
+        self.assertTrue(stream.startswith('retry: '))
+        self.assertIn(f'id: {self.feed.feed_id}-2\nevent: status\n', stream)
+        self.assertIn(f'"id": {truck.id}', stream)
+        self.assertNotIn('event: reset', stream)
+
+        # Unknown ids (another process, a restart) get a reset instead
+        stream = ''.join(status_event_stream('other-1', feed=self.feed, max_seconds=0))
+        self.assertIn('event: reset', stream)
+
+    @override_settings(STATUS_STREAM_MAX_SECONDS=0)
+    def test_stream_view(self):
+        response = self.client.get(reverse('dashboard:truck_status_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'retry: '))
+
+
+class StatusEngineTests(TestCase):
+    """The bulk SQL refresh must store exactly the status derive_status computes."""
+
+    def setUp(self):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        self.now = timezone.now().replace(microsecond=0)
+        hour = datetime.timedelta(hours=1)
+        departures = [None, self.now - 3 * hour, self.now + hour]
+        arrivals = [None, self.now - 2 * hour]
+        departures_from_customer = [None, self.now - hour]
+        depot_arrivals = [None, self.now]
+        service_times = [None, 0, 30]
+        i = 0
+        for departure in departures:
+            for arrival in arrivals:
+                for departure_from_customer in departures_from_customer:
+                    for depot_arrival in depot_arrivals:
+                        for service_time in service_times:
+                            TruckPerformanceData.objects.create(
+                                csv_upload=upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1),
+                                month_name='March', transporter='KLA', driver_name='Driver', truck_number=f'T{i}',
+                                customer_name='Customer', dj_departure_time=departure, arrival_at_customer=arrival,
+                                departure_time_from_customer=departure_from_customer, arrival_at_depot=depot_arrival,
+                                service_time_at_customer=service_time,
+                            )
+                            i += 1
+
+    def expected_statuses(self, now):
+        return {
+            truck.id: derive_status(
+                truck.dj_departure_time, truck.arrival_at_customer, truck.departure_time_from_customer,
+                truck.arrival_at_depot, truck.service_time_at_customer, now,
+            )
+            for truck in TruckPerformanceData.objects.all()
+        }
+
+    def test_sql_statuses_match_derive_status(self):
+        TruckPerformanceData.objects.update(current_status='departed')
+        updated = refresh_statuses(self.now, models=[TruckPerformanceData])
+        self.assertEqual(updated['TruckPerformanceData'], TruckPerformanceData.objects.count())
+        stored = dict(TruckPerformanceData.objects.values_list('id', 'current_status'))
+        self.assertEqual(stored, self.expected_statuses(self.now))
+        self.assertEqual(set(stored.values()), {
+            'pending', 'completed', 'delayed', 'returning', 'servicing', 'at_customer', 'in_transit',
+        })
+
+    def test_only_changed_rows_are_written(self):
+        refresh_statuses(self.now, models=[TruckPerformanceData])
+        self.assertEqual(refresh_statuses(self.now, models=[TruckPerformanceData])['TruckPerformanceData'], 0)
+
+        # Once the future departures pass, only the delayed trucks change
+        later = self.now + datetime.timedelta(hours=2)
+        delayed = set(TruckPerformanceData.objects.filter(current_status='delayed').values_list('id', flat=True))
+        self.assertEqual(refresh_statuses(later, models=[TruckPerformanceData])['TruckPerformanceData'], len(delayed))
+        self.assertEqual(set(TruckPerformanceData.objects.filter(updated_at=later).values_list('id', flat=True)), delayed)
+        stored = dict(TruckPerformanceData.objects.values_list('id', 'current_status'))
+        self.assertEqual(stored, self.expected_statuses(later))
+
+
+class FleetSimulationTests(TestCase):
+    def create_fleet(self, size=40):
+        upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        for i in range(size):
+            TruckPerformanceData.objects.create(
+                csv_upload=upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1), month_name='March',
+                transporter='KLA', driver_name='Driver', truck_number=f'T{i}', customer_name='Customer',
+            )
+
+    def statuses(self):
+        return dict(TruckPerformanceData.objects.values_list('load_number', 'current_status'))
+
+    def test_trucks_walk_every_stage(self):
+        self.create_fleet(5)
+        now = timezone.now()
+        reached = []
+        for tick in range(6):
+            moved = simulate_tick(random.Random(tick), advance=1.0, now=now + datetime.timedelta(minutes=tick))
+            reached.append(dict(moved))
+        self.assertEqual(reached, [
+            {'in_transit': 5}, {'at_customer': 5}, {'servicing': 5}, {'returning': 5}, {'completed': 5}, {},
+        ])
+        truck = TruckPerformanceData.objects.first()
+        self.assertEqual(truck.total_time, 4 / 60)
+        self.assertGreater(truck.updated_at, truck.created_at)
+
+    def test_ticks_refresh_rollups_and_charts_but_keep_deltas(self):
+        self.create_fleet(4)
+        rebuild_all_rollups()
+        since, version = latest_since(), get_data_version()
+        now = timezone.now()
+        for tick in range(5):
+            simulate_tick(random.Random(tick), advance=1.0, now=now + datetime.timedelta(hours=tick))
+
+        self.assertNotEqual(get_data_version(), version)
+        month = ProductivitySummary.objects.get(period='month', date_range_start=datetime.date(2025, 3, 1))
+        self.assertEqual(month.total_time, 16)
+        # Status pollers still get only the changed rows
+        page = status_page(since=since)
+        self.assertTrue(page['delta'])
+        self.assertEqual(len(page['trucks']), 4)
+
+    def test_ticks_reach_the_dashboard_journeys(self):
+        self.create_fleet(4)
+        rebuild_all_journeys()
+        simulate_tick(random.Random(0), advance=1.0)
+
+        self.client.force_login(User.objects.create_user('viewer', password='secret'))
+        response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(
+            sorted((journey.load_number, journey.current_status) for journey in response.context['journeys_by_load']),
+            [(f'L{i}', 'in_transit') for i in range(4)],
+        )
+
+    def test_same_seed_makes_the_same_moves(self):
+        runs = []
+        for _ in range(2):
+            self.create_fleet()
+            rng = random.Random(7)
+            for _ in range(3):
+                simulate_tick(rng, advance=0.5, batch_size=7)
+            runs.append(self.statuses())
+            TruckPerformanceData.objects.all().delete()
+        self.assertEqual(runs[0], runs[1])
+        self.assertGreater(len(set(runs[0].values())), 1)
+
+
+class ProgressStepTests(TestCase):
+    def test_steps_of_each_status(self):
+        # Completed and active step indexes of each status, as the tracking page has always shown them
+        expected = {
+            'pending': ([], [0]),
+            'departed': ([0, 1], [1]),
+            'in_transit': ([0, 1, 2], [2]),
+            'at_customer': ([0, 1, 2, 3], [3]),
+            'servicing': ([0, 1, 2, 3], [3]),
+            'returning': ([0, 1, 2, 3], [4]),
+            'completed': ([0, 1, 2, 3, 4, 5], [5]),
+            'delayed': ([0, 1, 2, 3], []),
+        }
+        self.assertEqual(set(expected), {status for status, _ in TruckPerformanceData.STATUS_CHOICES})
+        for status, flags in expected.items():
+            steps = TruckPerformanceData(current_status=status).get_progress_steps()
+            self.assertEqual(
+                ([i for i, step in enumerate(steps) if step['completed']], [i for i, step in enumerate(steps) if step['active']]),
+                flags, status,
+            )
+
+
+class TrackingPageTests(TestCase):
+    def setUp(self):
+        self.upload = CSVUpload.objects.create(name='depot', upload_type='depot_departures', file='uploads/depot.csv')
+        self.now = timezone.now().replace(microsecond=0)
+
+    def create_trucks(self, count, start=0, **fields):
+        for i in range(start, start + count):
+            values = dict(
+                csv_upload=self.upload, load_number=f'L{i}', create_date=datetime.date(2025, 3, 1), month_name='March',
+                transporter='KLA', driver_name='Driver', truck_number=f'T{i}', customer_name='Customer',
+                # Pending trucks (no departure) and ties on the departure time
+                dj_departure_time=self.now - datetime.timedelta(hours=i // 2) if i % 3 else None,
+            )
+            values.update(fields)
+            TruckPerformanceData.objects.create(**values)
+
+    def test_pages_cover_active_trucks_once_in_order(self):
+        self.create_trucks(11)
+        self.create_trucks(2, start=13, arrival_at_depot=self.now)
+        trucks = tracking_queryset()
+        page = active_page(trucks, page_size=4)
+        pages = [page]
+        while page['next_cursor']:
+            page = active_page(trucks, after=page['next_cursor'], page_size=4)
+            pages.append(page)
+        seen = [row['load_number'] for page in pages for row in page['rows']]
+        expected = list(
+            trucks.exclude(current_status='completed').order_by('-dj_departure_time', '-id')
+            .values_list('load_number', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 11)
+
+        # Walking back from the last page gives the same pages
+        previous = active_page(trucks, before=pages[-1]['previous_cursor'], page_size=4)
+        self.assertEqual(previous['rows'], pages[-2]['rows'])
+
+    def test_rows_carry_progress_and_labels_from_the_query(self):
+        self.create_trucks(3)
+        row = active_page(tracking_queryset(), page_size=1)['rows'][0]
+        truck = TruckPerformanceData.objects.get(id=row['id'])
+        self.assertEqual(row['progress_percentage'], truck.get_progress_percentage())
+        self.assertEqual(row['status_display'], truck.get_current_status_display())
+
+        annotated = with_progress(TruckPerformanceData.objects.all()).get(id=truck.id)
+        steps = annotated.get_progress_steps()
+        del annotated.progress_step
+        self.assertEqual(steps, annotated.get_progress_steps())
+        self.assertEqual([step['completed'] for step in steps], [True, True, True, False, False, False])
+        self.assertEqual([step['active'] for step in steps], [False, False, True, False, False, False])
+
+    def test_render_cost_does_not_grow_with_the_fleet(self):
+        url = reverse('dashboard:truck_tracking')
+        self.create_trucks(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self.create_trucks(60, start=3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'page_size': 50})
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(response.context['active_trucks']), 50)
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'Next')
@@ -0,0 +1,235 @@
+"""
+Read side of the truck tracking page.
+
+``status_page`` serves the tracking poller: compact ``values()`` rows of the
+trucks ordered by (updated_at, id), and a ``since`` cursor on that key so each
+poll only ships the rows changed since the previous response (an index range
+scan on ``perf_updated_idx``). The cursor carries the delta version (see
+``cache.get_delta_version``): uploads and clearing the data start a new version,
+and a cursor from an older version gets a full snapshot again, so rows written by
+a long upload transaction with an older ``updated_at`` are never missed.
+
+``tracking_rows`` is the read model of the page itself: ``values()`` rows with
+the progress, status label and tracking step computed by the query, and
+``active_page`` pages the active trucks with a keyset cursor on
+(dj_departure_time, id), the order of ``perf_active_departure_idx``.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.db import connection
+from django.db.models import Case, CharField, IntegerField, Q, Value, When
+
+from .cache import get_delta_version
+from .metrics import COMPLETED, STATUS_PROGRESS, STATUS_STEP
+from .models import TruckPerformanceData
+from .pagination import InvalidCursor
+
+
+TRUCK_STATUS_FIELDS = [
+    'id', 'load_number', 'truck_number', 'current_status', 'dj_departure_time', 'arrival_at_customer',
+    'departure_time_from_customer', 'arrival_at_depot', 'updated_at',
+]
+STATUS_PAGE_SIZE = 500
+MAX_STATUS_PAGE_SIZE = 5000
+TRACKING_FIELDS = [
+    'id', 'load_number', 'truck_number', 'driver_name', 'customer_name', 'current_status', 'dj_departure_time',
+    'arrival_at_depot',
+]
+TRACKING_PAGE_SIZE = 100
+MAX_TRACKING_PAGE_SIZE = 1000
+ACTIVE_ORDERING = ('-dj_departure_time', '-id')
+REVERSE_ACTIVE_ORDERING = ('dj_departure_time', 'id')
+
+
+def progress_expression():
+    """``STATUS_PROGRESS`` of ``current_status`` as a SQL expression."""
+    return Case(
+        *[When(current_status=status, then=Value(progress)) for status, progress in STATUS_PROGRESS.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def step_expression():
+    """``STATUS_STEP`` of ``current_status`` as a SQL expression."""
+    return Case(
+        *[When(current_status=status, then=Value(step)) for status, step in STATUS_STEP.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def status_label_expression():
+    """Display label of ``current_status`` as a SQL expression."""
+    return Case(
+        *[When(current_status=status, then=Value(label)) for status, label in TruckPerformanceData.STATUS_CHOICES],
+        default='current_status', output_field=CharField(),
+    )
+
+
+def with_progress(trucks):
+    """``trucks`` annotated with ``progress_percentage``, ``status_display`` and ``progress_step``."""
+    return trucks.annotate(
+        progress_percentage=progress_expression(),
+        status_display=status_label_expression(),
+        progress_step=step_expression(),
+    )
+
+
+def tracking_rows(trucks):
+    """Rows of the tracking page: TRACKING_FIELDS plus the ``with_progress`` annotations."""
+    return with_progress(trucks).values(*TRACKING_FIELDS, 'progress_percentage', 'status_display', 'progress_step')
+
+
+def tracking_queryset(search=''):
+    """Trucks shown on the tracking page, optionally narrowed by a search on load, driver, customer or truck."""
+    trucks = TruckPerformanceData.objects.all()
+    if search:
+        trucks = trucks.filter(
+            Q(load_number__icontains=search)
+            | Q(driver_name__icontains=search)
+            | Q(customer_name__icontains=search)
+            | Q(truck_number__icontains=search)
+        )
+    return trucks
+
+
+def encode_since(updated_at, truck_id, delta_version):
+    """Opaque cursor for the (updated_at, id) position of a row at ``delta_version``."""
+    key = [updated_at.isoformat(), truck_id, delta_version]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_since(cursor):
+    """(updated_at, id, delta_version) of an ``encode_since`` value."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        updated_at, truck_id, delta_version = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.datetime.fromisoformat(updated_at), int(truck_id), str(delta_version)
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from err
+
+
+def _changed_since(trucks, since, delta_version):
+    """Rows of ``trucks`` after the ``since`` cursor, and whether the cursor still applies."""
+    if not since:
+        return trucks, False
+    updated_at, truck_id, cursor_version = decode_since(since)
+    if cursor_version != delta_version:
+        return trucks, False
+    return trucks.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=truck_id)), True
+
+
+def status_state(search='', since=None, page_size=STATUS_PAGE_SIZE):
+    """
+    ETag and Last-Modified of a status page, from the newest matching row (one index lookup).
+
+    Returns (etag, last_modified); last_modified is None when no row changed.
+    """
+    delta_version = get_delta_version()
+    trucks, _ = _changed_since(tracking_queryset(search), since, delta_version)
+    newest = trucks.order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    payload = json.dumps([delta_version, search, since, page_size, newest], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32], newest[0] if newest else None
+
+
+def latest_since(search=''):
+    """Cursor of the newest matching row, for a page rendered from the current data."""
+    delta_version = get_delta_version()
+    newest = tracking_queryset(search).order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    if newest is None:
+        return encode_since(datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), 0, delta_version)
+    return encode_since(*newest, delta_version)
+
+
+def status_page(search='', since=None, page_size=STATUS_PAGE_SIZE):
+    """
+    Compact status rows changed after ``since`` (all matching rows without a cursor).
+
+    Returns a dict with ``trucks`` (TRUCK_STATUS_FIELDS plus ``progress``), ``since``
+    (the cursor for the next poll), ``has_more`` (more changed rows than ``page_size``)
+    and ``delta`` (False when the rows are a full snapshot replacing earlier ones).
+    """
+    delta_version = get_delta_version()
+    trucks, delta = _changed_since(tracking_queryset(search), since, delta_version)
+    rows = list(
+        trucks.order_by('updated_at', 'id')
+        .annotate(progress=progress_expression())
+        .values(*TRUCK_STATUS_FIELDS, 'progress')[:page_size + 1]
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        since = encode_since(rows[-1]['updated_at'], rows[-1]['id'], delta_version)
+    elif not delta:
+        # Nothing matches yet: start the next poll from the beginning of this version
+        since = latest_since(search)
+    return {'trucks': rows, 'since': since, 'has_more': has_more, 'delta': delta}
+
+
+def encode_active_cursor(truck):
+    """Opaque cursor for the (dj_departure_time, id) position of a tracking row."""
+    departure = truck['dj_departure_time']
+    key = [departure.isoformat() if departure else None, truck['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_active_cursor(cursor):
+    """(dj_departure_time, id) of an ``encode_active_cursor`` value."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        departure, truck_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (datetime.datetime.fromisoformat(departure) if departure else None), int(truck_id)
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from err
+
+
+def _later(key):
+    """Rows that come after ``key`` in ACTIVE_ORDERING (where NULL departures sort depends on the database)."""
+    departure, truck_id = key
+    nulls_first = connection.features.nulls_order_largest
+    if departure is None:
+        later = Q(dj_departure_time__isnull=True, id__lt=truck_id)
+        return later | Q(dj_departure_time__isnull=False) if nulls_first else later
+    later = Q(dj_departure_time__lt=departure) | Q(dj_departure_time=departure, id__lt=truck_id)
+    return later if nulls_first else later | Q(dj_departure_time__isnull=True)
+
+
+def _earlier(key):
+    """Rows that come before ``key`` in ACTIVE_ORDERING."""
+    departure, truck_id = key
+    nulls_first = connection.features.nulls_order_largest
+    if departure is None:
+        earlier = Q(dj_departure_time__isnull=True, id__gt=truck_id)
+        return earlier if nulls_first else earlier | Q(dj_departure_time__isnull=False)
+    earlier = Q(dj_departure_time__gt=departure) | Q(dj_departure_time=departure, id__gt=truck_id)
+    return earlier | Q(dj_departure_time__isnull=True) if nulls_first else earlier
+
+
+def active_page(trucks, after=None, before=None, page_size=TRACKING_PAGE_SIZE):
+    """
+    One page of the trucks of ``trucks`` that are not completed, as ``tracking_rows``, latest departure first.
+
+    after/before: cursor of the row the page starts after / ends before (at most one).
+    Returns a dict with ``rows``, ``next_cursor`` and ``previous_cursor`` (None at either end).
+    """
+    rows = tracking_rows(trucks.exclude(current_status=COMPLETED))
+    if before:
+        rows = list(rows.filter(_earlier(decode_active_cursor(before))).order_by(*REVERSE_ACTIVE_ORDERING)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after:
+            rows = rows.filter(_later(decode_active_cursor(after)))
+        rows = list(rows.order_by(*ACTIVE_ORDERING)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = bool(after)
+
+    return {
+        'rows': rows,
+        'next_cursor': encode_active_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': encode_active_cursor(rows[0]) if rows and has_previous else None,
+    }
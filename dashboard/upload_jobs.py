@@ -0,0 +1,212 @@
+"""
+Background processing of uploaded files.
+
+``queue_uploads`` hands saved CSVUpload records to workers, so ``bulk_upload``
+can redirect as soon as the files are stored. A worker runs
+``views.process_csv_file`` on one upload; files of different types run in
+parallel, except that an upload waits for the queued or running uploads of its
+prerequisite types (``UPLOAD_PREREQUISITES``) that were uploaded before it:
+depot departures create the journeys the other files merge into, and
+``process_customer_timestamps`` reads their trucks.
+
+A file is written in a single transaction, so its progress is published through
+the cache while it runs (``upload_progress``) and stored on the upload when it
+finishes.
+
+Workers are selected with ``settings.UPLOAD_JOB_RUNNER``, as for export jobs:
+``'thread'`` runs uploads on an in-process thread pool of
+``settings.UPLOAD_JOB_WORKERS`` threads; ``'queue'`` leaves them queued in the
+database for ``manage.py run_upload_jobs``, which needs media storage it shares
+with the web process; ``'inline'`` processes them within the request, for hosts
+that freeze the process once the response is sent and keep files on local disk.
+"""
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import CSVUpload
+
+
+# Upload types each type waits for
+UPLOAD_PREREQUISITES = {
+    upload_type: ('depot_departures',)
+    for upload_type in [
+        'customer_timestamps', 'distance_info', 'timestamps_duration', 'avg_time_route',
+        'time_route_info', 'other',
+    ]
+}
+STATUS_FIELDS = ['status', 'progress', 'row_count', 'total_rows', 'error', 'started_at', 'finished_at']
+PREREQUISITE_POLL_SECONDS = 1
+_executor = None
+# Futures of the uploads this process's thread pool has not finished, by upload id
+_futures = {}
+_futures_lock = threading.Lock()
+
+
+def _progress_key(upload_id):
+    return f'dashboard:upload-progress:{upload_id}'
+
+
+def _job_timeout():
+    return getattr(settings, 'UPLOAD_JOB_TIMEOUT', 60 * 60)
+
+
+def queue_uploads(uploads):
+    """
+    Queue saved uploads for processing and dispatch them to the configured runner.
+
+    Uploads are dispatched prerequisites first; with the thread runner an upload's
+    worker waits for the workers of earlier prerequisite uploads, whichever call
+    queued them, and then for any still queued or running elsewhere (see
+    ``prerequisites_done``). The inline runner processes them one after the other
+    before returning.
+    """
+    uploads = sorted(uploads, key=lambda upload: (upload.upload_type in UPLOAD_PREREQUISITES, upload.pk))
+    for upload in uploads:
+        upload.status = 'queued'
+        upload.progress = 0
+        upload.error = None
+        upload.save(update_fields=['status', 'progress', 'error'])
+    runner = getattr(settings, 'UPLOAD_JOB_RUNNER', 'thread')
+    if runner == 'inline':
+        for upload in uploads:
+            run_upload_job(upload.pk)
+    elif runner == 'thread':
+        with _futures_lock:
+            for upload_id in [upload_id for upload_id, (_, future) in _futures.items() if future.done()]:
+                del _futures[upload_id]
+            for upload in uploads:
+                needs = UPLOAD_PREREQUISITES.get(upload.upload_type, ())
+                prerequisites = [
+                    future for upload_id, (upload_type, future) in _futures.items()
+                    if upload_type in needs and upload_id < upload.pk
+                ]
+                future = _get_executor().submit(_run_in_thread, upload, prerequisites)
+                _futures[upload.pk] = (upload.upload_type, future)
+    return uploads
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'UPLOAD_JOB_WORKERS', 1), thread_name_prefix='upload-job',
+        )
+    return _executor
+
+
+def _run_in_thread(upload, prerequisites=()):
+    """Thread entry point: waits for the prerequisite uploads, with its own database connections."""
+    # Prerequisites were submitted first, so they already hold a worker or are ahead in the queue
+    wait(prerequisites)
+    close_old_connections()
+    try:
+        _wait_for_prerequisites(upload)
+        return run_upload_job(upload.pk)
+    finally:
+        close_old_connections()
+
+
+def _wait_for_prerequisites(upload):
+    """Wait, at most the job timeout, until ``prerequisites_done`` for uploads other processes run."""
+    deadline = time.monotonic() + _job_timeout()
+    while not prerequisites_done(upload) and time.monotonic() < deadline:
+        time.sleep(PREREQUISITE_POLL_SECONDS)
+
+
+def prerequisites_done(upload):
+    """True when no earlier upload of a prerequisite type is still queued or running."""
+    needs = UPLOAD_PREREQUISITES.get(upload.upload_type, ())
+    if not needs:
+        return True
+    # Running uploads past the timeout belong to a worker that died; they are not waited for
+    cutoff = timezone.now() - datetime.timedelta(seconds=_job_timeout())
+    pending = CSVUpload.objects.filter(upload_type__in=needs, pk__lt=upload.pk, status__in=['queued', 'running'])
+    return not pending.exclude(status='running', started_at__lt=cutoff).exists()
+
+
+def claim_upload(upload_id):
+    """Atomically move a queued upload to running; False if another worker got it first."""
+    return CSVUpload.objects.filter(pk=upload_id, status='queued').update(
+        status='running', started_at=timezone.now(),
+    ) == 1
+
+
+def run_upload_job(upload_id):
+    """Process a queued upload. Returns True when it completed."""
+    if not claim_upload(upload_id):
+        return False
+    from .views import process_csv_file
+
+    return process_csv_file(CSVUpload.objects.get(pk=upload_id))
+
+
+def start_upload(upload, total_rows=None):
+    """Record that processing of ``upload`` has started."""
+    upload.status = 'running'
+    upload.progress = 0
+    upload.row_count = 0
+    upload.total_rows = total_rows
+    upload.error = None
+    upload.started_at = timezone.now()
+    upload.finished_at = None
+    upload.save(update_fields=STATUS_FIELDS)
+
+
+def publish_progress(upload):
+    """Publish ``upload.row_count`` (and the matching percentage) while the file's transaction is open."""
+    if upload.total_rows:
+        # Stay below 100 until the rows are committed
+        upload.progress = min(99, upload.row_count * 100 // upload.total_rows)
+    cache.set(_progress_key(upload.pk), (upload.progress, upload.row_count), timeout=_job_timeout())
+
+
+def finish_upload(upload, success, error=None):
+    """Record the outcome of processing ``upload``."""
+    upload.processed = success
+    upload.status = 'completed' if success else 'failed'
+    if success:
+        upload.progress = 100
+    upload.error = error
+    upload.finished_at = timezone.now()
+    upload.save(update_fields=STATUS_FIELDS + ['processed'])
+    cache.delete(_progress_key(upload.pk))
+
+
+def upload_progress(upload):
+    """(progress, row_count) of ``upload``, live while it is running."""
+    if upload.status == 'running':
+        published = cache.get(_progress_key(upload.pk))
+        if published is not None:
+            return published
+    return upload.progress, upload.row_count
+
+
+def run_queued_uploads(limit=None, workers=1):
+    """
+    Run queued uploads oldest first, each once its prerequisites are done (the DB-backed queue).
+
+    Uploads that are ready together run on up to ``workers`` threads. Returns how many completed.
+    """
+    completed = started = 0
+    while limit is None or started < limit:
+        queued = CSVUpload.objects.filter(status='queued').order_by('pk').only('pk', 'upload_type')
+        ready = [upload for upload in queued if prerequisites_done(upload)]
+        if limit is not None:
+            ready = ready[:limit - started]
+        if not ready:
+            break
+        started += len(ready)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload-job') as pool:
+                results = list(pool.map(_run_in_thread, ready))
+        else:
+            results = [run_upload_job(upload.pk) for upload in ready]
+        completed += sum(results)
+    return completed
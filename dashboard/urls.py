@@ -1,7 +1,7 @@
 
 from django.urls import path
 from . import views
-from .export_utils import export_excel_report
+from .export_utils import export_excel_report, export_parquet_report, export_summary_report
 from django.contrib.auth import views as auth_views
 
 app_name = 'dashboard'
@@ -12,12 +12,20 @@ urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),
     path('dashboard/', views.dashboard_view, name='dashboard_alias'),
     path('bulk-upload/', views.bulk_upload, name='bulk_upload'),
+    path('bulk-upload/status/', views.upload_status, name='upload_status'),
 
     path('reports/', views.reports_view, name='reports'),
     path('clear-data/', views.clear_all_data, name='clear_data'),
     path('tracking/', views.truck_tracking_view, name='truck_tracking'),
     path('tracking/<int:truck_id>/', views.truck_detail_tracking, name='truck_detail_tracking'),
     path('api/truck-status/', views.truck_status_api, name='truck_status_api'),
+    path('api/truck-status/stream/', views.truck_status_stream, name='truck_status_stream'),
+    path('api/journeys/', views.journeys_api, name='journeys_api'),
     path('export/', export_excel_report, name='export_excel'),
+    path('export/parquet/', export_parquet_report, name='export_parquet'),
+    path('export/summary/', export_summary_report, name='export_summary'),
     path('download-report/<int:upload_id>/', views.download_report, name='download_report'),
+    path('exports/', views.export_job_create, name='export_job_create'),
+    path('exports/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
 ]
@@ -0,0 +1,139 @@
+"""
+Vehicle registration resolver.
+
+The export and the detailed report sheet resolve a row's vehicle reg from the
+journeys: first by (driver, load), then by
+driver only, then by load only, with driver names and load numbers compared
+trimmed and lowercased. The winning reg of every key is stored in
+``VehicleRegistration`` whenever journeys are refreshed, so readers resolve rows
+with indexed lookups in SQL instead of rebuilding a mapping on every request.
+The customer timestamps processor looks up the exact depot truck of its loads
+through ``departure_trucks``.
+"""
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower, Trim
+
+from .bulk_upsert import LOOKUP_CHUNK_SIZE
+from .models import Journey, TruckPerformanceData, VehicleRegistration
+
+
+# Journeys later in this order win a key (the order depot departures are read in)
+REGISTRATION_ORDERING = ['-create_date', 'transporter', 'load_number', 'pk']
+
+
+def registration_key(field):
+    """SQL expression normalizing ``field`` the way registration keys are stored."""
+    return Lower(Trim(field))
+
+
+def _chunks(values):
+    values = sorted(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def _keyed_journeys():
+    return Journey.objects.annotate(
+        driver_key=registration_key('driver_name'), load_key=registration_key('load_number'),
+    )
+
+
+def registration_keys(load_numbers):
+    """(driver_keys, load_keys) of the journeys of ``load_numbers``."""
+    driver_keys, load_keys = set(), set()
+    for chunk in _chunks(set(load_numbers)):
+        rows = _keyed_journeys().filter(load_number__in=chunk).values_list('driver_key', 'load_key')
+        for driver_key, load_key in rows:
+            driver_keys.add(driver_key or '')
+            load_keys.add(load_key or '')
+    driver_keys.discard('')
+    load_keys.discard('')
+    return driver_keys, load_keys
+
+
+def refresh_vehicle_registrations(driver_keys, load_keys):
+    """
+    Recompute the registrations of the given keys from the current journeys.
+
+    Pass the keys of the journeys both before and after they changed: (driver, load)
+    and load-only entries are rebuilt for ``load_keys``, driver-only entries for
+    ``driver_keys``. Returns the number of registrations written.
+    """
+    driver_keys, load_keys = set(driver_keys), set(load_keys)
+    for chunk in _chunks(load_keys):
+        VehicleRegistration.objects.filter(load_key__in=chunk).delete()
+    for chunk in _chunks(driver_keys):
+        VehicleRegistration.objects.filter(driver_key__in=chunk, load_key='').delete()
+
+    journeys = {}
+    for field, keys in (('load_key', load_keys), ('driver_key', driver_keys)):
+        for chunk in _chunks(keys):
+            rows = _keyed_journeys().filter(**{f'{field}__in': chunk}).values(
+                'pk', 'driver_key', 'load_key', 'truck_number', 'create_date', 'transporter', 'load_number',
+            )
+            journeys.update((row['pk'], row) for row in rows)
+
+    registrations = {}
+    for row in sorted(journeys.values(), key=_registration_order):
+        driver, load, truck = row['driver_key'] or '', row['load_key'] or '', (row['truck_number'] or '').strip()
+        if not truck or truck.lower() == 'unknown':
+            continue
+        if driver and load in load_keys:
+            registrations[(driver, load)] = (truck, row['pk'])
+        if driver in driver_keys:
+            registrations[(driver, '')] = (truck, row['pk'])
+        if load in load_keys:
+            registrations[('', load)] = (truck, row['pk'])
+
+    VehicleRegistration.objects.bulk_create([
+        VehicleRegistration(driver_key=driver, load_key=load, truck_number=truck, journey_id=pk)
+        for (driver, load), (truck, pk) in registrations.items()
+    ], batch_size=LOOKUP_CHUNK_SIZE)
+    return len(registrations)
+
+
+def _registration_order(row):
+    """Sort key matching REGISTRATION_ORDERING (descending create_date)."""
+    return (-row['create_date'].toordinal(), row['transporter'] or '', row['load_number'], row['pk'])
+
+
+def rebuild_vehicle_registrations():
+    """Recompute every registration from the Journey table."""
+    VehicleRegistration.objects.all().delete()
+    driver_keys = set(_keyed_journeys().values_list('driver_key', flat=True).distinct())
+    load_keys = set(_keyed_journeys().values_list('load_key', flat=True).distinct())
+    return refresh_vehicle_registrations(driver_keys - {'', None}, load_keys - {'', None})
+
+
+def annotate_vehicle_reg(queryset):
+    """
+    Annotate TruckPerformanceData rows with ``vehicle_reg``: the registered reg of
+    their (driver, load), else of their driver, else of their load, else None.
+    """
+    def registered(**keys):
+        return Subquery(VehicleRegistration.objects.filter(**keys).values('truck_number')[:1])
+
+    return queryset.alias(
+        reg_driver_key=registration_key('driver_name'), reg_load_key=registration_key('load_number'),
+    ).annotate(vehicle_reg=Coalesce(
+        registered(driver_key=OuterRef('reg_driver_key'), load_key=OuterRef('reg_load_key')),
+        registered(driver_key=OuterRef('reg_driver_key'), load_key=''),
+        registered(driver_key='', load_key=OuterRef('reg_load_key')),
+    ))
+
+
+def departure_trucks(load_numbers):
+    """
+    Exact depot-departure truck_number per (load_number, create_date) of ``load_numbers``.
+
+    Read from the depot rows themselves rather than the journeys, so rows written by
+    scripts that do not refresh the journeys are still matched.
+    """
+    trucks = {}
+    for chunk in _chunks({load_number for load_number in load_numbers if load_number}):
+        rows = TruckPerformanceData.objects.filter(
+            csv_upload__upload_type='depot_departures', load_number__in=chunk,
+        ).values_list('load_number', 'create_date', 'truck_number')
+        for load_number, create_date, truck_number in rows:
+            trucks[(load_number, create_date)] = truck_number
+    return trucks
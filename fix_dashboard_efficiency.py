@@ -2,36 +2,21 @@
 import os
 import django
 import pandas as pd
-from datetime import datetime
-import pytz
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
-from django.utils import timezone
+from dashboard.datetimes import parse_datetime_column, to_datetime_value
 from dashboard.models import TruckPerformanceData
 
-def parse_datetime_flexible(date_str):
-    """Parse datetime string in various formats"""
-    if pd.isna(date_str) or not date_str:
-        return None
-    
-    formats = [
-        '%d/%m/%Y %H:%M',
-        '%d/%m/%Y %H:%M:%S', 
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(str(date_str).strip(), fmt)
-            return timezone.make_aware(dt, pytz.UTC)
-        except ValueError:
-            continue
-    
-    return None
+# Formats of the original CSV exports, in order of preference
+CSV_DATETIME_FORMATS = [
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S', 
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+]
 
 def fix_dashboard_efficiency():
     """Fix efficiency for dashboard records using real arrival times"""
@@ -39,6 +24,8 @@ def fix_dashboard_efficiency():
     
     # Load the timestamps and duration CSV with real arrival times
     duration_df = pd.read_csv('media/uploads/4.Timestamps_and_Durat_1752480667772.csv')
+    # Parse the arrival column once instead of value by value
+    duration_df['ArriveAtDepot(Odo)'] = parse_datetime_column(duration_df['ArriveAtDepot(Odo)'], formats=CSV_DATETIME_FORMATS)
     
     # Dashboard loads that user sees
     dashboard_loads = ['BM4HFKNRR', 'BMTXTLBRR', 'BMVFEJ0RR', 'BM9JV5NRR', 'BMP3QSPRR']
@@ -64,7 +51,7 @@ def fix_dashboard_efficiency():
             csv_match = duration_df[duration_df['load_name'] == load]
             if not csv_match.empty:
                 real_arrival_str = csv_match.iloc[0]['ArriveAtDepot(Odo)']
-                real_arrival = parse_datetime_flexible(real_arrival_str)
+                real_arrival = to_datetime_value(real_arrival_str)
                 
                 if real_arrival:
                     print(f"\n{load}:")
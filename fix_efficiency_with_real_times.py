@@ -2,41 +2,29 @@
 import os
 import django
 import pandas as pd
-from datetime import datetime
-import pytz
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
-from django.utils import timezone
+from dashboard.datetimes import parse_datetime_column, to_datetime_value
 from dashboard.models import TruckPerformanceData
 
-def parse_datetime_flexible(date_str):
-    """Parse datetime string in various formats"""
-    if pd.isna(date_str) or not date_str:
-        return None
-    
-    # Common formats in the CSV files
-    formats = [
-        '%d/%m/%Y %H:%M',
-        '%d/%m/%Y %H:%M:%S', 
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-        '%d-%m-%Y %H:%M',
-        '%d-%m-%Y %H:%M:%S'
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(str(date_str).strip(), fmt)
-            # Make timezone aware (assume UTC for now)
-            return timezone.make_aware(dt, pytz.UTC)
-        except ValueError:
-            continue
-    
-    print(f"Could not parse datetime: {date_str}")
-    return None
+# Formats of the original CSV exports, in order of preference
+CSV_DATETIME_FORMATS = [
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S', 
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%d-%m-%Y %H:%M',
+    '%d-%m-%Y %H:%M:%S'
+]
+
+def parse_timing_column(df, column):
+    """Parse a whole timing column once (format sniffed from the column) instead of value by value"""
+    if column in df.columns:
+        df[column] = parse_datetime_column(df[column], formats=CSV_DATETIME_FORMATS)
+    return df
 
 def fix_efficiency_with_real_times():
     """Use original CSV timing data to calculate real efficiency scores"""
@@ -47,7 +35,7 @@ def fix_efficiency_with_real_times():
     
     # Depot departures - real departure times
     try:
-        depot_df = pd.read_csv('media/uploads/1.Depot_Departures_Inf_1752480585396.csv')
+        depot_df = parse_timing_column(pd.read_csv('media/uploads/1.Depot_Departures_Inf_1752480585396.csv'), 'DJ Departure Time')
         print(f"Loaded {len(depot_df)} depot departure records")
     except Exception as e:
         print(f"Error loading depot departures: {e}")
@@ -55,7 +43,7 @@ def fix_efficiency_with_real_times():
     
     # Customer timestamps - real customer arrival times  
     try:
-        customer_df = pd.read_csv('media/uploads/2.Customer_Timestamps__1752480054194.csv')
+        customer_df = parse_timing_column(pd.read_csv('media/uploads/2.Customer_Timestamps__1752480054194.csv'), 'ArrivedAtCustomer(Odo)')
         print(f"Loaded {len(customer_df)} customer timestamp records")
     except Exception as e:
         print(f"Error loading customer timestamps: {e}")
@@ -63,7 +51,7 @@ def fix_efficiency_with_real_times():
     
     # Timestamps and duration - real depot arrival times
     try:
-        duration_df = pd.read_csv('media/uploads/4.Timestamps_and_Durat_1752480667772.csv')
+        duration_df = parse_timing_column(pd.read_csv('media/uploads/4.Timestamps_and_Durat_1752480667772.csv'), 'ArriveAtDepot(Odo)')
         print(f"Loaded {len(duration_df)} duration records")
     except Exception as e:
         print(f"Error loading duration data: {e}")
@@ -85,7 +73,7 @@ def fix_efficiency_with_real_times():
             real_departure = None
             if not depot_match.empty:
                 dep_time_str = depot_match.iloc[0]['DJ Departure Time']
-                real_departure = parse_datetime_flexible(dep_time_str)
+                real_departure = to_datetime_value(dep_time_str)
                 if real_departure and real_departure != record.dj_departure_time:
                     record.dj_departure_time = real_departure
                     updated = True
@@ -95,7 +83,7 @@ def fix_efficiency_with_real_times():
             real_depot_arrival = None
             if not duration_match.empty:
                 arr_time_str = duration_match.iloc[0]['ArriveAtDepot(Odo)']
-                real_depot_arrival = parse_datetime_flexible(arr_time_str)
+                real_depot_arrival = to_datetime_value(arr_time_str)
                 if real_depot_arrival and real_depot_arrival != record.arrival_at_depot:
                     record.arrival_at_depot = real_depot_arrival
                     updated = True
@@ -105,7 +93,7 @@ def fix_efficiency_with_real_times():
             real_customer_arrival = None
             if not customer_match.empty:
                 cust_time_str = customer_match.iloc[0]['ArrivedAtCustomer(Odo)']
-                real_customer_arrival = parse_datetime_flexible(cust_time_str)
+                real_customer_arrival = to_datetime_value(cust_time_str)
                 if real_customer_arrival and real_customer_arrival != record.arrival_at_customer:
                     record.arrival_at_customer = real_customer_arrival
                     updated = True
@@ -2,38 +2,23 @@
 import os
 import django
 import pandas as pd
-from datetime import datetime
-import pytz
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
-from django.utils import timezone
+from dashboard.datetimes import parse_datetime_column, to_datetime_value
 from dashboard.models import TruckPerformanceData
 
-def parse_datetime_flexible(date_str):
-    """Parse datetime string in various formats"""
-    if pd.isna(date_str) or not date_str:
-        return None
-    
-    formats = [
-        '%m/%d/%y %H:%M',
-        '%d/%m/%y %H:%M',  
-        '%m/%d/%Y %H:%M',
-        '%d/%m/%Y %H:%M',
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d %H:%M',
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(str(date_str).strip(), fmt)
-            return timezone.make_aware(dt, pytz.UTC)
-        except ValueError:
-            continue
-    
-    return None
+# Formats of the user's export, in order of preference
+EXPORT_DATETIME_FORMATS = [
+    '%m/%d/%y %H:%M',
+    '%d/%m/%y %H:%M',  
+    '%m/%d/%Y %H:%M',
+    '%d/%m/%Y %H:%M',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+]
 
 def fix_efficiency_with_real_data():
     """Fix efficiency using the real timing data provided by user"""
@@ -61,14 +46,19 @@ def fix_efficiency_with_real_data():
     print("\n" + "="*60)
     print("UPDATING WITH REAL TIMING DATA...")
     
+    # Parse each timestamp column in one pass
+    timing_frame = pd.DataFrame(timing_data)
+    for column in ['customer_arrival', 'depot_arrival']:
+        timing_frame[column] = parse_datetime_column(timing_frame[column], formats=EXPORT_DATETIME_FORMATS)
+    
     updated_count = 0
-    for data in timing_data:
+    for data in timing_frame.to_dict('records'):
         try:
             record = TruckPerformanceData.objects.get(load_number=data['load'])
             
-            # Parse real timestamps
-            real_customer_arrival = parse_datetime_flexible(data['customer_arrival'])
-            real_depot_arrival = parse_datetime_flexible(data['depot_arrival'])
+            # Timestamps were parsed once, column by column
+            real_customer_arrival = to_datetime_value(data['customer_arrival'])
+            real_depot_arrival = to_datetime_value(data['depot_arrival'])
             
             if real_customer_arrival and real_depot_arrival:
                 print(f"\n{data['load']}:")
@@ -113,7 +113,8 @@ def import_excel_data(excel_file_path):
         csv_upload = CSVUpload.objects.create(
             name=f"Excel Import - {os.path.basename(excel_file_path)}",
             upload_type='other',
-            processed=True
+            processed=True,
+            status='completed'
         )
         
         successful_imports = 0
@@ -1,56 +1,48 @@
 """
 Merge all 5 truck productivity files into a final productivity table.
-- Joins on Load/Truck Number and Date where possible
+- Joins on Load Number and Schedule Date, with every file's columns resolved by the upload schemas
 - Outputs a single CSV with all key columns
 """
+import os
+
+import django
 import pandas as pd
-from datetime import datetime
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
+django.setup()
+
+from dashboard.ingestion import merge_upload_files
 
 # File paths (update if needed)
-files = {
-    'depot': r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\1.Depot_Departures_Inf_1752480585396.csv',
-    'customer': r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\2.Customer_Timestamps__1752480054194.csv',
-    'distance': r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\3.Distance_Information_1752480636033.csv',
-    'duration': r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\4.Timestamps_and_Durat_1752480667772.csv',
-    'route': r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\5.Time_in_Route_Inform_1752490636583.csv',
-}
-
-# Read all files
-f_depot = pd.read_csv(files['depot'])
-f_customer = pd.read_csv(files['customer'])
-f_distance = pd.read_csv(files['distance'])
-f_duration = pd.read_csv(files['duration'])
-f_route = pd.read_csv(files['route'])
-
-# Standardize keys for merging
-f_depot['key'] = f_depot['Load Name'].fillna(f_depot.get('Load Number', '')) + '_' + pd.to_datetime(f_depot['Schedule Date'], errors='coerce').astype(str)
-f_customer['key'] = f_customer['load_name'].fillna(f_customer.get('Load Number', '')) + '_' + pd.to_datetime(f_customer['schedule_date'], errors='coerce').astype(str)
-f_distance['key'] = f_distance['Load Name'].fillna(f_distance.get('Load Number', '')) + '_' + pd.to_datetime(f_distance['Schedule Date'], errors='coerce').astype(str)
-f_duration['key'] = f_duration['load_name'].fillna(f_duration.get('Load Number', '')) + '_' + pd.to_datetime(f_duration['schedule_date'], errors='coerce').astype(str)
-f_route['key'] = f_route['Load'].fillna(f_route.get('Load Number', '')) + '_' + pd.to_datetime(f_route['Schedule Date'], errors='coerce').astype(str)
-
-# Merge all files on the key
-final = f_depot.merge(f_customer, on='key', how='outer', suffixes=('', '_cust'))
-final = final.merge(f_distance, on='key', how='outer', suffixes=('', '_dist'))
-final = final.merge(f_duration, on='key', how='outer', suffixes=('', '_dur'))
-final = final.merge(f_route, on='key', how='outer', suffixes=('', '_route'))
+files = [
+    ('depot_departures', r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\1.Depot_Departures_Inf_1752480585396.csv'),
+    ('customer_timestamps', r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\2.Customer_Timestamps__1752480054194.csv'),
+    ('distance_info', r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\3.Distance_Information_1752480636033.csv'),
+    ('timestamps_duration', r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\4.Timestamps_and_Durat_1752480667772.csv'),
+    ('time_route_info', r'C:\Users\CHRISTINE\OneDrive\Desktop\Fix\media\uploads\5.Time_in_Route_Inform_1752490636583.csv'),
+]
+
+# Read all files and merge them on the key
+final = merge_upload_files([(upload_type, pd.read_csv(path)) for upload_type, path in files])
 
 # Select and rename columns for final output
 final_out = pd.DataFrame({
-    'Date': final['Schedule Date'],
-    'Month': pd.to_datetime(final['Schedule Date'], errors='coerce').dt.strftime('%B'),
-    'Depot': final['Depot'],
-    'Truck Number': final['Load Name'],
-    'Driver': final['Driver Name'],
-    'Customer': final['Customer'],
-    'DJ Departure Time': final.get('DJ Departure Time', None),
-    'Arrival At Depot': final.get('Arrival At Depot', final.get('ArriveAtDepot(Odo)', None)),
-    'AVE Arrival Time': final.get('AVE Arrival Time', None),
-    'D1': final.get('Depot Departure Odometer', final.get('D1', None)),
-    'D2': final.get('Navigate To Customer Odometer', final.get('D2', None)),
-    'D3': final.get('Arrived at Customer Odometer', final.get('D3', None)),
-    'D4': final.get('Arrived At Depot Odometer', final.get('D4', None)),
-    'Comment Ave TIR': final.get('Comment Ave TIR', final.get('Gate Entry to load Completion', None)),
+    'Date': final['schedule_date'].dt.date,
+    'Month': final['schedule_date'].dt.strftime('%B'),
+    'Depot': final['transporter'],
+    'Load Number': final['load_number'],
+    'Truck Number': final['truck_number'],
+    'Driver': final['driver_name'],
+    'Customer': final['customer_name'],
+    # Excel cannot store timezones; the parsed times are UTC
+    'DJ Departure Time': final['dj_departure_time'].dt.tz_convert(None),
+    'Arrival At Depot': final['arrival_at_depot'].dt.tz_convert(None),
+    'AVE Arrival Time': final['ave_arrival_time'],
+    'D1': final['d1'],
+    'D2': final['d2'],
+    'D3': final['d3'],
+    'D4': final['d4'],
+    'Comment Ave TIR': final['comment_ave_tir'],
     # Add more fields/calculations as needed
 })
 
@@ -10,7 +10,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
 from dashboard.models import CSVUpload, TruckPerformanceData
-from dashboard.views import extract_unified_truck_data
+from dashboard.ingestion import build_upload_frame, frame_to_records
 
 def fix_timezone_issues(df):
     """Fix timezone-related issues in datetime columns"""
@@ -67,9 +67,9 @@ def process_all_files_of_type(upload_type):
                 file_created = 0
                 file_updated = 0
                 
-                for index, row in df.iterrows():
+                records = frame_to_records(build_upload_frame(df, upload_type))
+                for index, data in enumerate(records):
                     try:
-                        data = extract_unified_truck_data(row, upload_type)
                         if data.get('load_number'):
                             # Check for existing record
                             existing = TruckPerformanceData.objects.filter(
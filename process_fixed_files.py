@@ -8,9 +8,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
 from dashboard.models import CSVUpload, TruckPerformanceData
-from django.core.files import File
+from dashboard.views import UPLOAD_PROCESSORS
 import pandas as pd
-from datetime import datetime
 
 def process_fixed_files():
     """Process files with correct field mapping based on actual CSV structure"""
@@ -48,21 +47,8 @@ def process_fixed_files():
                 df = pd.read_csv(file_path)
                 print(f"Read {len(df)} rows")
                 
-                # Process based on type with correct field mappings
-                if file_type == 'depot_departures':
-                    success = process_depot_departures_fixed(df, csv_upload)
-                elif file_type == 'customer_timestamps':
-                    success = process_customer_timestamps_fixed(df, csv_upload)
-                elif file_type == 'distance_info':
-                    success = process_distance_info_fixed(df, csv_upload)
-                elif file_type == 'timestamps_duration':
-                    success = process_timestamps_duration_fixed(df, csv_upload)
-                elif file_type == 'avg_time_route':
-                    success = process_avg_time_route_fixed(df, csv_upload)
-                elif file_type == 'time_route_info':
-                    success = process_time_route_info_fixed(df, csv_upload)
-                else:
-                    success = False
+                # Columns are resolved by the upload type's schema, exactly as for uploads
+                success = UPLOAD_PROCESSORS[file_type](df, csv_upload)
                 
                 if success:
                     processed_count += 1
@@ -84,275 +70,5 @@ def process_fixed_files():
     if total_records > 0:
         print("\\n✨ Your data is ready! You can now download the combined Excel report.")
 
-def safe_date_parse(date_str):
-    """Safely parse date strings"""
-    if pd.isna(date_str) or date_str == '' or date_str is None:
-        return datetime.now().date()
-    
-    try:
-        return pd.to_datetime(date_str).date()
-    except:
-        return datetime.now().date()
-
-def safe_time_parse(time_str):
-    """Safely parse time strings"""
-    if pd.isna(time_str) or time_str == '' or time_str is None:
-        return None
-    
-    try:
-        return pd.to_datetime(time_str).time()
-    except:
-        return None
-
-def process_depot_departures_fixed(df, csv_upload):
-    """Process depot departures with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            # Use actual column names from your CSV
-            create_date = safe_date_parse(row.get('Schedule Date'))
-            
-            data = {
-                'csv_upload': csv_upload,
-                'create_date': create_date,
-                'month_name': create_date.strftime('%B'),
-                'transporter': str(row.get('Depot', 'Unknown')),
-                'load_number': str(row.get('Load Name', f'LOAD_{index}')),
-                'mode_of_capture': str(row.get('Hired/Own', 'Manual')),
-                'driver_name': str(row.get('Driver Name', 'Unknown')),
-                'truck_number': str(row.get('Vehicle Reg', 'Unknown')),
-                'customer_name': 'Unknown',  # Not in this file
-                'dj_departure_time': safe_time_parse(row.get('DJ Departure Time')),
-            }
-            
-            TruckPerformanceData.objects.update_or_create(
-                csv_upload=csv_upload,
-                load_number=data['load_number'],
-                defaults=data
-            )
-            count += 1
-            
-        print(f"   Created {count} records from depot departures")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
-def process_customer_timestamps_fixed(df, csv_upload):
-    """Process customer timestamps with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            create_date = safe_date_parse(row.get('schedule_date'))
-            
-            # Update existing records or create new ones
-            load_number = str(row.get('load_name', f'LOAD_{index}'))
-            
-            # Try to find existing record first
-            existing_record = TruckPerformanceData.objects.filter(
-                load_number=load_number
-            ).first()
-            
-            if existing_record:
-                # Update existing record
-                existing_record.customer_name = str(row.get('customer_name', existing_record.customer_name or 'Unknown'))
-                existing_record.driver_name = str(row.get('DriverName', existing_record.driver_name or 'Unknown'))
-                existing_record.save()
-            else:
-                # Create new record
-                data = {
-                    'csv_upload': csv_upload,
-                    'create_date': create_date,
-                    'month_name': create_date.strftime('%B'),
-                    'load_number': load_number,
-                    'customer_name': str(row.get('customer_name', 'Unknown')),
-                    'driver_name': str(row.get('DriverName', 'Unknown')),
-                    'transporter': str(row.get('Depot', 'Unknown')),
-                    'mode_of_capture': 'Manual',
-                    'truck_number': 'Unknown',
-                }
-                
-                TruckPerformanceData.objects.create(**data)
-            
-            count += 1
-            
-        print(f"   Updated {count} records with customer data")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
-def process_distance_info_fixed(df, csv_upload):
-    """Process distance information with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            load_number = str(row.get('Load Name', f'LOAD_{index}'))
-            
-            # Try to find existing record first
-            existing_record = TruckPerformanceData.objects.filter(
-                load_number=load_number
-            ).first()
-            
-            if existing_record:
-                # Update with distance info
-                existing_record.d1 = str(row.get('PlannedDistanceToCustomer', ''))
-                existing_record.d2 = str(row.get('Total DJ Distance for Load', ''))
-                existing_record.d3 = str(row.get('Distance Difference (Planned vs DJ)', ''))
-                existing_record.d4 = str(row.get('Load Distance Difference (Planned vs. DJ)', ''))
-                existing_record.save()
-            else:
-                # Create new record
-                create_date = safe_date_parse(row.get('Schedule Date'))
-                data = {
-                    'csv_upload': csv_upload,
-                    'create_date': create_date,
-                    'month_name': create_date.strftime('%B'),
-                    'load_number': load_number,
-                    'driver_name': str(row.get('Driver Name', 'Unknown')),
-                    'truck_number': str(row.get('Vehicle Reg', 'Unknown')),
-                    'customer_name': str(row.get('Customer', 'Unknown')),
-                    'transporter': str(row.get('Depot', 'Unknown')),
-                    'mode_of_capture': str(row.get('Hired/Own', 'Manual')),
-                    'd1': str(row.get('PlannedDistanceToCustomer', '')),
-                    'd2': str(row.get('Total DJ Distance for Load', '')),
-                    'd3': str(row.get('Distance Difference (Planned vs DJ)', '')),
-                    'd4': str(row.get('Load Distance Difference (Planned vs. DJ)', '')),
-                }
-                
-                TruckPerformanceData.objects.create(**data)
-            
-            count += 1
-            
-        print(f"   Updated {count} records with distance data")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
-def process_timestamps_duration_fixed(df, csv_upload):
-    """Process timestamps and duration with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            load_number = str(row.get('load_name', f'LOAD_{index}'))
-            
-            # Try to find existing record first
-            existing_record = TruckPerformanceData.objects.filter(
-                load_number=load_number
-            ).first()
-            
-            if existing_record:
-                # Update with timestamp info
-                existing_record.arrival_at_depot = safe_time_parse(row.get('ArriveAtDepot(Odo)'))
-                existing_record.save()
-            else:
-                # Create new record
-                create_date = safe_date_parse(row.get('schedule_date'))
-                data = {
-                    'csv_upload': csv_upload,
-                    'create_date': create_date,
-                    'month_name': create_date.strftime('%B'),
-                    'load_number': load_number,
-                    'transporter': str(row.get('Depot', 'Unknown')),
-                    'mode_of_capture': 'Manual',
-                    'driver_name': 'Unknown',
-                    'truck_number': 'Unknown',
-                    'customer_name': 'Unknown',
-                    'arrival_at_depot': safe_time_parse(row.get('ArriveAtDepot(Odo)')),
-                }
-                
-                TruckPerformanceData.objects.create(**data)
-            
-            count += 1
-            
-        print(f"   Updated {count} records with timestamp data")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
-def process_avg_time_route_fixed(df, csv_upload):
-    """Process average time in route with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            customer_name = str(row.get('customer_name', 'Unknown'))
-            avg_time_diff = str(row.get('Time In Route Difference ( DJ - Planned) (AVG)', ''))
-            
-            # Update all records with this customer
-            updated = TruckPerformanceData.objects.filter(
-                customer_name=customer_name
-            ).update(
-                comment_ave_tir=avg_time_diff
-            )
-            
-            if updated == 0:
-                # Create a summary record
-                data = {
-                    'csv_upload': csv_upload,
-                    'create_date': datetime.now().date(),
-                    'month_name': datetime.now().strftime('%B'),
-                    'load_number': f'AVG_{index}',
-                    'customer_name': customer_name,
-                    'comment_ave_tir': avg_time_diff,
-                    'transporter': 'Unknown',
-                    'mode_of_capture': 'Manual',
-                    'driver_name': 'Unknown',
-                    'truck_number': 'Unknown',
-                }
-                
-                TruckPerformanceData.objects.create(**data)
-            
-            count += 1
-            
-        print(f"   Updated {count} customer average records")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
-def process_time_route_info_fixed(df, csv_upload):
-    """Process time in route information with actual column names"""
-    try:
-        count = 0
-        for index, row in df.iterrows():
-            load_number = str(row.get('Load', f'LOAD_{index}'))
-            
-            # Try to find existing record first
-            existing_record = TruckPerformanceData.objects.filter(
-                load_number=load_number
-            ).first()
-            
-            if existing_record:
-                # Update with route time info
-                existing_record.ave_arrival_time = safe_time_parse(row.get('Time in Route (min)'))
-                existing_record.save()
-            else:
-                # Create new record
-                create_date = safe_date_parse(row.get('Schedule Date'))
-                data = {
-                    'csv_upload': csv_upload,
-                    'create_date': create_date,
-                    'month_name': create_date.strftime('%B'),
-                    'load_number': load_number,
-                    'driver_name': str(row.get('Driver', 'Unknown')),
-                    'customer_name': str(row.get('Customer', 'Unknown')),
-                    'transporter': str(row.get('Depot Code', 'Unknown')),
-                    'mode_of_capture': 'Manual',
-                    'truck_number': 'Unknown',
-                    'ave_arrival_time': safe_time_parse(row.get('Time in Route (min)')),
-                }
-                
-                TruckPerformanceData.objects.create(**data)
-            
-            count += 1
-            
-        print(f"   Updated {count} records with route time data")
-        return True
-    except Exception as e:
-        print(f"   Error: {e}")
-        return False
-
 if __name__ == "__main__":
     process_fixed_files()
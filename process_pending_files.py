@@ -10,7 +10,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
 from dashboard.models import CSVUpload, TruckPerformanceData
-from dashboard.views import extract_unified_truck_data
+from dashboard.ingestion import build_upload_frame, frame_to_records
 
 def fix_timezone_issues(df):
     """Fix timezone-related issues in datetime columns"""
@@ -52,9 +52,9 @@ def process_customer_timestamps():
         
         # Process each row
         created_count = 0
-        for index, row in df.iterrows():
+        records = frame_to_records(build_upload_frame(df, 'customer_timestamps'))
+        for index, data in enumerate(records):
             try:
-                data = extract_unified_truck_data(row, 'customer_timestamps')
                 if data.get('load_number'):
                     # Check for existing record to avoid duplicates
                     existing = TruckPerformanceData.objects.filter(
@@ -100,9 +100,9 @@ def process_distance_info():
         created_count = 0
         updated_count = 0
         
-        for index, row in df.iterrows():
+        records = frame_to_records(build_upload_frame(df, 'distance_info'))
+        for index, data in enumerate(records):
             try:
-                data = extract_unified_truck_data(row, 'distance_info')
                 if data.get('load_number'):
                     # Check for existing record
                     existing = TruckPerformanceData.objects.filter(
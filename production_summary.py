@@ -10,6 +10,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_productivity.settings')
 django.setup()
 
 from dashboard.models import TruckPerformanceData
+from dashboard.kpis import EFFICIENCY_CATEGORIES, QUALITY_METRICS, kpi_summary
 
 def create_production_summary():
     """Create a comprehensive production summary"""
@@ -22,9 +23,11 @@ def create_production_summary():
     print("\n📊 SYSTEM STATISTICS")
     print("-" * 25)
     
-    total_records = TruckPerformanceData.objects.count()
-    records_with_efficiency = TruckPerformanceData.objects.exclude(efficiency_score__isnull=True).count()
-    real_efficiency_records = TruckPerformanceData.objects.exclude(efficiency_score__isnull=True).exclude(efficiency_score=45.0).count()
+    # Every count below comes from this single aggregate query
+    kpis = kpi_summary()
+    total_records = kpis['total_loads']
+    records_with_efficiency = kpis['records_with_efficiency']
+    real_efficiency_records = kpis['real_efficiency_records']
 
     print(f"Total truck records: {total_records:,}")
     print(f"Records with efficiency data: {records_with_efficiency:,}")
@@ -35,14 +38,7 @@ def create_production_summary():
     print("\n🚛 PERFORMANCE CATEGORIES")
     print("-" * 30)
     
-    categories = {
-        "Excellent (40-80 km/h)": TruckPerformanceData.objects.filter(efficiency_score__gte=40, efficiency_score__lte=80).count(),
-        "Good (20-40 km/h)": TruckPerformanceData.objects.filter(efficiency_score__gte=20, efficiency_score__lt=40).count(),
-        "Moderate (10-20 km/h)": TruckPerformanceData.objects.filter(efficiency_score__gte=10, efficiency_score__lt=20).count(),
-        "Poor (5-10 km/h)": TruckPerformanceData.objects.filter(efficiency_score__gte=5, efficiency_score__lt=10).count(),
-        "Critical (<5 km/h)": TruckPerformanceData.objects.filter(efficiency_score__lt=5, efficiency_score__gt=0).count(),
-        "Estimated (45 km/h)": TruckPerformanceData.objects.filter(efficiency_score=45.0).count()
-    }
+    categories = {label: kpis[key] for label, key, _condition in EFFICIENCY_CATEGORIES}
     
     for category, count in categories.items():
         percentage = (count / records_with_efficiency) * 100
@@ -92,12 +88,7 @@ def create_production_summary():
     print("\n🔍 DATA QUALITY SUMMARY")
     print("-" * 25)
     
-    quality_metrics = {
-        "Records with complete timing": TruckPerformanceData.objects.exclude(dj_departure_time__isnull=True).exclude(arrival_at_depot__isnull=True).count(),
-        "Records with customer data": TruckPerformanceData.objects.exclude(customer_name__icontains='unknown').count(),
-        "Records with driver info": TruckPerformanceData.objects.exclude(driver_name__icontains='unknown').count(),
-        "Records with distance data": TruckPerformanceData.objects.exclude(total_distance__isnull=True).count()
-    }
+    quality_metrics = {label: kpis[key] for label, key, _condition in QUALITY_METRICS}
     
     for metric, count in quality_metrics.items():
         percentage = (count / total_records) * 100
@@ -12,6 +12,7 @@ django.setup()
 
 from django.utils import timezone
 from dashboard.models import CSVUpload, TruckPerformanceData
+from dashboard.bulk_upsert import save_with_derived_metrics
 
 def recalculate_time_efficiency():
     """Manually calculate time and efficiency where we have sufficient data"""
@@ -25,24 +26,16 @@ def recalculate_time_efficiency():
     ).exclude(arrival_at_depot__isnull=True)
     print(f"Found {complete_records.count()} records with both departure and arrival times")
     
-    for record in complete_records:
-        try:
-            # Just trigger save to recalculate efficiency with real times
-            record.save()
-            updated_count += 1
-            
-            if updated_count <= 10:  # Show first 10 real calculations
-                print(f"\nReal calculation for {record.load_number}:")
-                print(f"  Departure: {record.dj_departure_time}")
-                print(f"  Arrival: {record.arrival_at_depot}")
-                print(f"  Total Time: {record.total_time:.2f} hours")
-                print(f"  Distance: {record.total_distance} km")
-                print(f"  Efficiency: {record.efficiency_score:.1f} km/h")
-                
-        except Exception as e:
-            if updated_count < 5:
-                print(f"Error updating {record.load_number}: {e}")
-            continue
+    # Recalculate efficiency with real times in one vectorized pass instead of saving each record
+    complete_list = list(complete_records)
+    updated_count += save_with_derived_metrics(complete_list)
+    for record in complete_list[:10]:  # Show first 10 real calculations
+        print(f"\nReal calculation for {record.load_number}:")
+        print(f"  Departure: {record.dj_departure_time}")
+        print(f"  Arrival: {record.arrival_at_depot}")
+        print(f"  Total Time: {record.total_time:.2f} hours")
+        print(f"  Distance: {record.total_distance} km")
+        print(f"  Efficiency: {record.efficiency_score:.1f} km/h")
     
     print(f"\nRecalculated {updated_count} records with real departure/arrival times")
     
@@ -50,6 +43,7 @@ def recalculate_time_efficiency():
     print("\n=== PROCESSING RECORDS WITH ARRIVALS ONLY ===")
     depot_arrivals = TruckPerformanceData.objects.exclude(arrival_at_depot__isnull=True).filter(dj_departure_time__isnull=True)
     print(f"Found {depot_arrivals.count()} records with depot arrival times but no departure")
+    estimated_departures = []
     for record in depot_arrivals:  # Process ALL records, not just first 10
         try:
             # Use delivery time or customer arrival to estimate more realistic departure
@@ -61,8 +55,7 @@ def recalculate_time_efficiency():
                 estimated_departure = record.arrival_at_customer - estimated_depot_to_customer
                 
                 record.dj_departure_time = estimated_departure
-                record.save()
-                updated_count += 1
+                estimated_departures.append(record)
             elif record.total_distance and record.total_distance > 0:
                 # Fallback to distance-based estimation with variable speeds
                 # Use different speeds based on distance (longer trips = higher average speed)
@@ -77,21 +70,22 @@ def recalculate_time_efficiency():
                 estimated_departure = record.arrival_at_depot - timedelta(hours=estimated_hours)
                 
                 record.dj_departure_time = estimated_departure
-                record.save()
-                updated_count += 1
-                    
-                if updated_count <= 10:  # Show first 10 updates
-                    print(f"\nUpdated {record.load_number}:")
-                    print(f"  Estimated Departure: {record.dj_departure_time}")
-                    print(f"  Depot Arrival: {record.arrival_at_depot}")
-                    print(f"  Calculated Total Time: {record.total_time} hours")
-                    print(f"  Distance: {record.total_distance} km")
-                    print(f"  Efficiency: {record.efficiency_score} km/h")
+                estimated_departures.append(record)
                         
         except Exception as e:
-            if updated_count < 5:  # Only show first few errors
+            if len(estimated_departures) < 5:  # Only show first few errors
                 print(f"Error updating {record.load_number}: {e}")
             continue
+
+    # Write all estimated departures and their recalculated metrics in batches
+    updated_count += save_with_derived_metrics(estimated_departures, fields=['dj_departure_time'])
+    for record in [r for r in estimated_departures if r.total_distance and r.total_distance > 0][:10]:  # Show first 10 updates
+        print(f"\nUpdated {record.load_number}:")
+        print(f"  Estimated Departure: {record.dj_departure_time}")
+        print(f"  Depot Arrival: {record.arrival_at_depot}")
+        print(f"  Calculated Total Time: {record.total_time} hours")
+        print(f"  Distance: {record.total_distance} km")
+        print(f"  Efficiency: {record.efficiency_score} km/h")
     
     print(f"\nUpdated {updated_count} records with estimated departure times")
     
@@ -100,7 +94,7 @@ def recalculate_time_efficiency():
     departure_only = TruckPerformanceData.objects.exclude(dj_departure_time__isnull=True).filter(arrival_at_depot__isnull=True)
     print(f"Found {departure_only.count()} records with departure times but no depot arrival")
     
-    departure_updated = 0
+    estimated_arrivals = []
     for record in departure_only:
         try:
             if record.dj_departure_time and record.total_distance and record.total_distance > 0:
@@ -117,20 +111,21 @@ def recalculate_time_efficiency():
                 
                 # Set the estimated arrival
                 record.arrival_at_depot = estimated_arrival
-                record.save()  # This will trigger automatic calculation
-                departure_updated += 1
-                
-                if departure_updated <= 10:  # Show first 10
-                    print(f"\nUpdated {record.load_number}:")
-                    print(f"  Departure: {record.dj_departure_time}")
-                    print(f"  Estimated Arrival: {record.arrival_at_depot}")
-                    print(f"  Total Time: {record.total_time} hours")
-                    print(f"  Efficiency: {record.efficiency_score} km/h")
+                estimated_arrivals.append(record)
                     
         except Exception as e:
-            if departure_updated < 5:
+            if len(estimated_arrivals) < 5:
                 print(f"Error updating {record.load_number}: {e}")
             continue
+
+    # Recalculated metrics are written together with the estimated arrivals
+    departure_updated = save_with_derived_metrics(estimated_arrivals, fields=['arrival_at_depot'])
+    for record in estimated_arrivals[:10]:  # Show first 10
+        print(f"\nUpdated {record.load_number}:")
+        print(f"  Departure: {record.dj_departure_time}")
+        print(f"  Estimated Arrival: {record.arrival_at_depot}")
+        print(f"  Total Time: {record.total_time} hours")
+        print(f"  Efficiency: {record.efficiency_score} km/h")
     
     print(f"\nUpdated {departure_updated} records with estimated arrival times")
     
@@ -139,7 +134,7 @@ def recalculate_time_efficiency():
     customer_arrivals = TruckPerformanceData.objects.exclude(arrival_at_customer__isnull=True).filter(dj_departure_time__isnull=False)
     print(f"Found {customer_arrivals.count()} records with both departure and customer arrival times")
     
-    delivery_updated = 0
+    delivery_records = []
     for record in customer_arrivals[:5]:  # Show first 5
         try:
             if record.dj_departure_time and record.arrival_at_customer:
@@ -149,14 +144,14 @@ def recalculate_time_efficiency():
                 
                 if delivery_hours > 0:  # Sanity check
                     record.delivery_time = delivery_hours
-                    record.save()
-                    delivery_updated += 1
+                    delivery_records.append(record)
                     
                     print(f"\\n{record.load_number} - Delivery Time: {delivery_hours:.2f} hours")
                     
         except Exception as e:
             print(f"Error calculating delivery time for {record.load_number}: {e}")
     
+    delivery_updated = save_with_derived_metrics(delivery_records, fields=['delivery_time'])
     print(f"\\nUpdated delivery times for {delivery_updated} records")
     
     # Final statistics
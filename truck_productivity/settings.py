@@ -90,10 +90,69 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # WAL lets pages (and the upload status poll) read while a background upload writes
+            'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL;', 'timeout': 20},
         }
     }
 
 
+# Cache (dashboard chart fragments)
+# CACHE_BACKEND: 'locmem' (default, per process), 'file' or 'db'. Fragments are keyed by the
+# data version stored in the database, so no backend serves charts from before an upload;
+# serverless deployments run many short-lived processes, so 'db' (or 'file' on a shared
+# volume) saves them rebuilding the same fragments.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'truck-productivity',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join('/tmp', 'django_cache') if 'VERCEL' in os.environ else str(BASE_DIR / 'cache'),
+        ),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'dashboard_cache',
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+CHART_CACHE_TIMEOUT = int(os.environ.get('CHART_CACHE_TIMEOUT', 24 * 60 * 60))
+
+
+# Background exports: 'thread' runs them in-process, 'queue' leaves them for
+# `manage.py run_export_jobs` (e.g. from a cron job on serverless hosts), 'off' disables them.
+# The queue worker needs a default storage the web processes share (e.g. S3); Vercel's
+# /tmp media is private to one function instance, so there they are 'off' by default and
+# the reports page offers the direct downloads.
+EXPORT_JOB_RUNNER = os.environ.get('EXPORT_JOB_RUNNER', 'off' if 'VERCEL' in os.environ else 'thread')
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', 30 * 60))
+EXPORT_JOB_RETENTION_DAYS = int(os.environ.get('EXPORT_JOB_RETENTION_DAYS', 7))
+
+# Uploaded files are processed in the background the same way: 'thread' or 'queue'
+# (`manage.py run_upload_jobs`). SQLite takes one writer at a time, so it gets a single worker.
+# Vercel freezes the function once the response is sent, so a thread would never finish
+# there, and its MEDIA_ROOT in /tmp is private to one function instance, so no worker could
+# read the files either: uploads are processed 'inline', within the request. Use 'queue'
+# only with a default storage the worker shares (e.g. S3).
+UPLOAD_JOB_RUNNER = os.environ.get('UPLOAD_JOB_RUNNER', 'inline' if 'VERCEL' in os.environ else 'thread')
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', 4 if DATABASE_URL else 1))
+UPLOAD_JOB_TIMEOUT = int(os.environ.get('UPLOAD_JOB_TIMEOUT', 60 * 60))
+
+# Live truck status stream (server-sent events): one database read per process every
+# STATUS_FEED_INTERVAL seconds, shared by all viewers. Each open stream holds a worker
+# thread, so streams end after STATUS_STREAM_MAX_SECONDS and the browser reconnects.
+STATUS_FEED_INTERVAL = float(os.environ.get('STATUS_FEED_INTERVAL', 2))
+STATUS_FEED_HISTORY = int(os.environ.get('STATUS_FEED_HISTORY', 1000))
+STATUS_STREAM_MAX_SECONDS = int(os.environ.get('STATUS_STREAM_MAX_SECONDS', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -142,6 +201,12 @@ if 'VERCEL' in os.environ:
 else:
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rows per chunk when uploaded CSV/Excel files are read and processed
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 5000))
+
+# Charts and summary sheets read the ProductivitySummary rollups instead of raw rows
+USE_PRODUCTIVITY_ROLLUPS = os.environ.get('USE_PRODUCTIVITY_ROLLUPS', 'True') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 